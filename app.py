@@ -36,8 +36,8 @@ login_manager.login_message = 'Faça login para acessar esta página.'
 # Configure user loader
 @login_manager.user_loader
 def load_user(user_id):
-    from models import User
-    return User.query.get(int(user_id))
+    from user_cache import load_cached_user
+    return load_cached_user(user_id)
 
 with app.app_context():
     try:
@@ -52,111 +52,12 @@ with app.app_context():
         import logging
         logging.info("Database connection successful!")
         
-        # Create tables if they don't exist
-        db.create_all()
-        logging.info("Tables created/verified successfully!")
-        
-        # Add new columns if they don't exist (for existing databases)
+        # Schema changes are versioned migrations; a normal boot only reads the version
         try:
-            from sqlalchemy import text
-            with db.engine.connect() as conn:
-                # Check if new columns exist, if not add them (PostgreSQL compatible)
-                try:
-                    conn.execute(text("ALTER TABLE classroom ADD COLUMN image_data BYTEA"))
-                except:
-                    pass  # Column already exists
-                try:
-                    conn.execute(text("ALTER TABLE classroom ADD COLUMN excel_data BYTEA"))
-                except:
-                    pass  # Column already exists
-                try:
-                    conn.execute(text("ALTER TABLE classroom ADD COLUMN image_mimetype VARCHAR(100)"))
-                except:
-                    pass  # Column already exists
-                try:
-                    conn.execute(text("ALTER TABLE classroom ADD COLUMN excel_mimetype VARCHAR(100)"))
-                except:
-                    pass  # Column already exists
-                try:
-                    conn.execute(text("ALTER TABLE incident ADD COLUMN is_resolved BOOLEAN DEFAULT FALSE"))
-                except:
-                    pass  # Column already exists
-                try:
-                    conn.execute(text("ALTER TABLE incident ADD COLUMN admin_response TEXT"))
-                except:
-                    pass  # Column already exists
-                try:
-                    conn.execute(text("ALTER TABLE incident ADD COLUMN response_date TIMESTAMP"))
-                except:
-                    pass  # Column already exists
-                # Add hidden_from_classroom column with better error handling
-                try:
-                    # Different checks for different database types
-                    db_url_str = str(db.engine.url)
-                    column_exists = False
-                    
-                    if 'postgresql' in db_url_str or 'postgres' in db_url_str:
-                        # PostgreSQL check
-                        try:
-                            result = conn.execute(text("SELECT column_name FROM information_schema.columns WHERE table_name='incident' AND column_name='hidden_from_classroom'"))
-                            column_exists = result.fetchone() is not None
-                        except:
-                            column_exists = False
-                    else:
-                        # SQLite check - try to select the column
-                        try:
-                            conn.execute(text("SELECT hidden_from_classroom FROM incident LIMIT 1"))
-                            column_exists = True
-                        except:
-                            column_exists = False
-                    
-                    if not column_exists:
-                        # Add the column
-                        conn.execute(text("ALTER TABLE incident ADD COLUMN hidden_from_classroom BOOLEAN DEFAULT FALSE"))
-                        conn.commit()
-                        logging.info("✅ Added hidden_from_classroom column")
-                    else:
-                        logging.info("✅ hidden_from_classroom column already exists")
-                        
-                except Exception as col_error:
-                    # Final fallback: ignore if column already exists error
-                    logging.warning(f"Column migration info: {col_error}")
-                    pass
-                
-                # Add schedule columns to class_group table
-                try:
-                    conn.execute(text("ALTER TABLE class_group ADD COLUMN shift VARCHAR(20) DEFAULT ''"))
-                except:
-                    pass  # Column already exists
-                try:
-                    conn.execute(text("ALTER TABLE class_group ADD COLUMN start_time VARCHAR(10) DEFAULT ''"))
-                except:
-                    pass  # Column already exists
-                try:
-                    conn.execute(text("ALTER TABLE class_group ADD COLUMN end_time VARCHAR(10) DEFAULT ''"))
-                except:
-                    pass  # Column already exists
-                try:
-                    conn.execute(text("ALTER TABLE class_group ADD COLUMN days_of_week TEXT DEFAULT ''"))
-                except:
-                    pass  # Column already exists
-                
-                # Add teacher_id column to class_group table
-                try:
-                    conn.execute(text("ALTER TABLE class_group ADD COLUMN teacher_id INTEGER REFERENCES \"user\"(id)"))
-                except:
-                    pass  # Column already exists
-                
-                # Add first_login column to user table
-                try:
-                    conn.execute(text("ALTER TABLE \"user\" ADD COLUMN first_login BOOLEAN DEFAULT TRUE"))
-                except:
-                    pass  # Column already exists
-                
-                conn.commit()
+            from migrations import check_schema_on_startup
+            check_schema_on_startup()
         except Exception as migration_error:
-            import logging
-            logging.warning(f"Database migration error (non-critical): {migration_error}")
+            logging.error(f"Database migration error: {migration_error}")
             import traceback
             traceback.print_exc()
         
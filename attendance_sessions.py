@@ -0,0 +1,134 @@
+"""
+Set-based creation of attendance sessions.
+
+A new session gets one AttendanceRecord per student of its class group,
+starting absent and placed at the student's assigned workstation. The records
+are created with a single INSERT ... SELECT joining students with their
+workstation assignments, so the rows never pass through Python.
+
+Sessions for every class group that meets on a given day can also be created
+ahead of time in one batch, e.g. from a scheduled job before the first shift:
+
+    flask --app main precreate-attendance [--date YYYY-MM-DD]
+"""
+import json
+import logging
+from datetime import datetime
+
+import click
+from sqlalchemy import and_, insert, literal, select
+
+from app import app, db
+from attendance_stats import add_session_records
+from models import AttendanceRecord, AttendanceSession, ClassGroup, Student, WorkstationAssignment
+
+PRECREATED_BY = 'Agendamento automático'
+
+
+def bootstrap_records(session_ids):
+    """Create the absent records (and their statistics) of every student for new sessions; returns the row count"""
+    if not session_ids:
+        return 0
+    now = datetime.utcnow()
+    students = (
+        select(
+            AttendanceSession.id,
+            Student.id,
+            WorkstationAssignment.workstation_id,
+            literal('absent'),
+            literal(''),
+            literal(now),
+            literal(now),
+            literal(0),
+        )
+        .select_from(AttendanceSession)
+        .join(Student, Student.class_group_id == AttendanceSession.class_group_id)
+        .outerjoin(WorkstationAssignment, and_(
+            WorkstationAssignment.student_id == Student.id,
+            WorkstationAssignment.class_group_id == Student.class_group_id,
+        ))
+        .where(AttendanceSession.id.in_(list(session_ids)))
+    )
+    columns = [AttendanceRecord.attendance_session_id, AttendanceRecord.student_id, AttendanceRecord.workstation_id,
+               AttendanceRecord.status, AttendanceRecord.notes, AttendanceRecord.created_at,
+               AttendanceRecord.updated_at, AttendanceRecord.version]
+    result = db.session.execute(insert(AttendanceRecord).from_select(columns, students))
+    add_session_records(session_ids)
+    return result.rowcount
+
+
+def start_session(classroom_id, class_group_id, session_date, created_by=''):
+    """The session of a group on a date, created with its records when missing; returns (session, created)"""
+    session = AttendanceSession.query.filter_by(
+        classroom_id=classroom_id,
+        class_group_id=class_group_id,
+        session_date=session_date
+    ).first()
+    if session:
+        return session, False
+
+    session = AttendanceSession(
+        classroom_id=classroom_id,
+        class_group_id=class_group_id,
+        session_date=session_date,
+        status='active',
+        created_by=created_by
+    )
+    db.session.add(session)
+    db.session.flush()
+    bootstrap_records([session.id])
+    return session, True
+
+
+def meets_on(days_of_week, day):
+    """Whether a ClassGroup.days_of_week value (JSON list, 0 = Monday) includes the date's weekday"""
+    try:
+        return day.weekday() in {int(d) for d in json.loads(days_of_week or '[]')}
+    except (TypeError, ValueError):
+        return False
+
+
+def precreate_sessions(day, created_by=PRECREATED_BY):
+    """Create the sessions (and records) of every group meeting on that day; returns (sessions, records) created"""
+    groups = db.session.query(ClassGroup.id, ClassGroup.classroom_id, ClassGroup.days_of_week).all()
+    meeting = {group_id: classroom_id for group_id, classroom_id, days in groups if meets_on(days, day)}
+    if not meeting:
+        return 0, 0
+
+    existing = {group_id for (group_id,) in db.session.query(AttendanceSession.class_group_id).filter(
+        AttendanceSession.session_date == day,
+        AttendanceSession.class_group_id.in_(list(meeting)))}
+    missing = [group_id for group_id in meeting if group_id not in existing]
+    if not missing:
+        return 0, 0
+
+    now = datetime.utcnow()
+    db.session.execute(insert(AttendanceSession), [{
+        'classroom_id': meeting[group_id],
+        'class_group_id': group_id,
+        'session_date': day,
+        'status': 'active',
+        'created_by': created_by,
+        'created_at': now,
+        'updated_at': now,
+        'version': 0,
+    } for group_id in missing])
+    session_ids = [session_id for (session_id,) in db.session.query(AttendanceSession.id).filter(
+        AttendanceSession.session_date == day,
+        AttendanceSession.class_group_id.in_(missing))]
+    records = bootstrap_records(session_ids)
+    db.session.commit()
+    logging.info(f"Pre-created {len(session_ids)} attendance sessions with {records} records for {day}")
+    return len(session_ids), records
+
+
+@app.cli.command('precreate-attendance')
+@click.option('--date', 'day', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+              help='Data das sessões (padrão: hoje, horário de Brasília)')
+def precreate_attendance_command(day):
+    """Create today's attendance sessions for every class group that meets today"""
+    if day is None:
+        from routes import get_brazil_time
+        day = get_brazil_time()
+    sessions, records = precreate_sessions(day.date())
+    click.echo(f"{sessions} sessões criadas, {records} registros de presença")
@@ -0,0 +1,302 @@
+"""
+Materialized attendance statistics.
+
+attendance_stat holds, per student, class group and month, the number of
+sessions, presences, absences and the last check-in. Rows are upserted in the
+same transaction that creates or changes attendance records, so reports read
+O(students x months) aggregate rows instead of scanning every record.
+
+Deleting sessions or records through the ORM (including cascades) recomputes
+the affected group/month rows after the flush; deleting a student or a class
+group drops its rows. If the table ever drifts (e.g. records edited by hand
+or removed with bulk Query.delete()), rebuild it with
+
+    flask --app main rebuild-attendance-stats
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+import click
+from sqlalchemy import Date, case, cast, delete, event, func, insert, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app import app, db
+from models import AttendanceRecord, AttendanceSession, AttendanceStat, ClassGroup, Student
+
+_CONFLICT_COLUMNS = ['student_id', 'class_group_id', 'month']
+_STAT_COLUMNS = ['student_id', 'class_group_id', 'month', 'sessions', 'presents', 'absences', 'last_check_in']
+
+_DELETED_KEY = 'attendance_stat_deleted'
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def next_month(month):
+    return month.replace(year=month.year + 1, month=1) if month.month == 12 else month.replace(month=month.month + 1)
+
+
+def _month_of(column, dialect_name):
+    """SQL expression for the first day of the month of a date column"""
+    if dialect_name == 'postgresql':
+        return cast(func.date_trunc('month', column), Date)
+    return func.date(column, 'start of month')
+
+
+def _upsert(dialect_name):
+    """INSERT into attendance_stat that adds to the counters of an existing row"""
+    dialect = postgresql if dialect_name == 'postgresql' else sqlite
+    stmt = dialect.insert(AttendanceStat)
+    table, excluded = AttendanceStat.__table__, stmt.excluded
+    latest_check_in = case(
+        (excluded.last_check_in.is_(None), table.c.last_check_in),
+        (table.c.last_check_in.is_(None), excluded.last_check_in),
+        (excluded.last_check_in > table.c.last_check_in, excluded.last_check_in),
+        else_=table.c.last_check_in,
+    )
+    return stmt, {
+        'sessions': table.c.sessions + excluded.sessions,
+        'presents': table.c.presents + excluded.presents,
+        'absences': table.c.absences + excluded.absences,
+        'last_check_in': latest_check_in,
+    }
+
+
+def _aggregate_records(dialect_name, *conditions):
+    """Per student/group/month totals computed from attendance_record"""
+    month = _month_of(AttendanceSession.session_date, dialect_name)
+    return (
+        select(
+            AttendanceRecord.student_id,
+            AttendanceSession.class_group_id,
+            month,
+            func.count(AttendanceRecord.id),
+            func.sum(case((AttendanceRecord.status == 'present', 1), else_=0)),
+            func.sum(case((AttendanceRecord.status == 'absent', 1), else_=0)),
+            func.max(AttendanceRecord.check_in_time),
+        )
+        .join(AttendanceSession, AttendanceSession.id == AttendanceRecord.attendance_session_id)
+        .join(Student, Student.id == AttendanceRecord.student_id)
+        .where(*conditions)
+        .group_by(AttendanceRecord.student_id, AttendanceSession.class_group_id, month)
+    )
+
+
+def add_session_records(session_ids):
+    """Count the freshly created records of new sessions; one INSERT ... SELECT upsert"""
+    if not session_ids:
+        return
+    dialect_name = db.session.get_bind().dialect.name
+    stmt, updates = _upsert(dialect_name)
+    source = _aggregate_records(dialect_name, AttendanceSession.id.in_(list(session_ids)))
+    db.session.execute(stmt.from_select(_STAT_COLUMNS, source).on_conflict_do_update(
+        index_elements=_CONFLICT_COLUMNS, set_=updates))
+
+
+class StatChanges:
+    """Counter deltas collected while records change, written with one upsert"""
+
+    def __init__(self):
+        self._deltas = defaultdict(lambda: {'sessions': 0, 'presents': 0, 'absences': 0, 'last_check_in': None})
+        # Keys where a check-in was undone; their last_check_in is recomputed from the records
+        self._recheck = set()
+
+    def status_changed(self, student_id, class_group_id, session_date, old_status, new_status, check_in_time=None):
+        key = (student_id, class_group_id, month_start(session_date))
+        delta = self._deltas[key]
+        if old_status == 'present' and new_status != 'present':
+            self._recheck.add(key)
+        delta['presents'] += (new_status == 'present') - (old_status == 'present')
+        delta['absences'] += (new_status == 'absent') - (old_status == 'absent')
+        if new_status == 'present' and check_in_time is not None:
+            if delta['last_check_in'] is None or check_in_time > delta['last_check_in']:
+                delta['last_check_in'] = check_in_time
+
+    def apply(self):
+        rows = [
+            dict(delta, student_id=student_id, class_group_id=class_group_id, month=month)
+            for (student_id, class_group_id, month), delta in self._deltas.items()
+            if delta['presents'] or delta['absences'] or delta['last_check_in'] is not None
+        ]
+        recheck, self._recheck = self._recheck, set()
+        self._deltas.clear()
+        if rows:
+            stmt, updates = _upsert(db.session.get_bind().dialect.name)
+            db.session.execute(stmt.on_conflict_do_update(index_elements=_CONFLICT_COLUMNS, set_=updates), rows)
+        if recheck:
+            db.session.flush()
+        for student_id, class_group_id, month in recheck:
+            latest = (
+                select(func.max(AttendanceRecord.check_in_time))
+                .join(AttendanceSession, AttendanceSession.id == AttendanceRecord.attendance_session_id)
+                .where(AttendanceRecord.student_id == student_id,
+                       AttendanceSession.class_group_id == class_group_id,
+                       AttendanceSession.session_date >= month,
+                       AttendanceSession.session_date < next_month(month))
+                .scalar_subquery()
+            )
+            db.session.query(AttendanceStat).filter_by(
+                student_id=student_id, class_group_id=class_group_id, month=month
+            ).update({AttendanceStat.last_check_in: latest}, synchronize_session=False)
+
+
+def rebuild_stats(conn):
+    """Recompute the whole table from attendance_record on a connection"""
+    conn.execute(AttendanceStat.__table__.delete())
+    conn.execute(insert(AttendanceStat).from_select(_STAT_COLUMNS, _aggregate_records(conn.dialect.name)))
+
+
+def period_totals(class_group_ids, start_date=None, end_date=None):
+    """
+    Record totals ({'total', 'present', 'absent'}) of the groups between two dates.
+    Whole months are summed from attendance_stat; only the partial months at
+    either end of the range are counted from attendance_record.
+    """
+    group_ids = list(class_group_ids)
+    totals = {'total': 0, 'present': 0, 'absent': 0}
+    if not group_ids:
+        return totals
+
+    # Whole months form [first, stop); None means unbounded
+    first = start_date if start_date is None or start_date.day == 1 else next_month(month_start(start_date))
+    if end_date is None:
+        stop = None
+    elif (end_date + timedelta(days=1)).day == 1:
+        stop = end_date + timedelta(days=1)
+    else:
+        stop = month_start(end_date)
+
+    raw_ranges = []
+    if first is not None and stop is not None and first >= stop:
+        raw_ranges.append((start_date, end_date))
+    else:
+        if start_date is not None and start_date < first:
+            raw_ranges.append((start_date, first - timedelta(days=1)))
+        if end_date is not None and stop <= end_date:
+            raw_ranges.append((stop, end_date))
+        query = db.session.query(
+            func.sum(AttendanceStat.sessions), func.sum(AttendanceStat.presents), func.sum(AttendanceStat.absences)
+        ).filter(AttendanceStat.class_group_id.in_(group_ids))
+        if first is not None:
+            query = query.filter(AttendanceStat.month >= first)
+        if stop is not None:
+            query = query.filter(AttendanceStat.month < stop)
+        _add_totals(totals, query.one())
+
+    for range_start, range_end in raw_ranges:
+        query = db.session.query(
+            func.count(AttendanceRecord.id),
+            func.sum(case((AttendanceRecord.status == 'present', 1), else_=0)),
+            func.sum(case((AttendanceRecord.status == 'absent', 1), else_=0)),
+        ).join(AttendanceSession, AttendanceSession.id == AttendanceRecord.attendance_session_id).join(
+            Student, Student.id == AttendanceRecord.student_id
+        ).filter(AttendanceSession.class_group_id.in_(group_ids))
+        if range_start is not None:
+            query = query.filter(AttendanceSession.session_date >= range_start)
+        if range_end is not None:
+            query = query.filter(AttendanceSession.session_date <= range_end)
+        _add_totals(totals, query.one())
+    return totals
+
+
+def _add_totals(totals, row):
+    total, present, absent = row
+    totals['total'] += total or 0
+    totals['present'] += present or 0
+    totals['absent'] += absent or 0
+
+
+def student_stats(class_group_ids, start_month=None, end_month=None):
+    """Totals per student over a month range, read from attendance_stat only"""
+    query = db.session.query(
+        AttendanceStat.student_id,
+        Student.name,
+        AttendanceStat.class_group_id,
+        func.sum(AttendanceStat.sessions),
+        func.sum(AttendanceStat.presents),
+        func.sum(AttendanceStat.absences),
+        func.max(AttendanceStat.last_check_in),
+    ).join(Student, Student.id == AttendanceStat.student_id).filter(
+        AttendanceStat.class_group_id.in_(list(class_group_ids)))
+    if start_month:
+        query = query.filter(AttendanceStat.month >= month_start(start_month))
+    if end_month:
+        query = query.filter(AttendanceStat.month <= month_start(end_month))
+    rows = query.group_by(AttendanceStat.student_id, Student.name, AttendanceStat.class_group_id).order_by(
+        AttendanceStat.class_group_id, Student.name).all()
+    return [{
+        'student_id': student_id,
+        'student_name': name,
+        'class_group_id': class_group_id,
+        'sessions': sessions or 0,
+        'presents': presents or 0,
+        'absences': absences or 0,
+        'attendance_rate': round(100.0 * (presents or 0) / sessions, 1) if sessions else None,
+        'last_check_in': last_check_in.isoformat() if last_check_in else None,
+    } for student_id, name, class_group_id, sessions, presents, absences, last_check_in in rows]
+
+
+def refresh_group_months(conn, group_months):
+    """Recompute the rows of the given (class_group_id, month) pairs from attendance_record"""
+    for class_group_id, month in group_months:
+        conn.execute(delete(AttendanceStat).where(AttendanceStat.class_group_id == class_group_id,
+                                                  AttendanceStat.month == month))
+        conn.execute(insert(AttendanceStat).from_select(_STAT_COLUMNS, _aggregate_records(
+            conn.dialect.name,
+            AttendanceSession.class_group_id == class_group_id,
+            AttendanceSession.session_date >= month,
+            AttendanceSession.session_date < next_month(month),
+        )))
+
+
+# Session hooks: deleted sessions/records refresh their group months after the flush
+
+@event.listens_for(Session, 'before_flush')
+def _collect_deleted_attendance(session, flush_context, instances):
+    deleted = None
+    for obj in session.deleted:
+        if isinstance(obj, AttendanceRecord):
+            parent = obj.session
+            key = ('month', parent.class_group_id, month_start(parent.session_date)) if parent else None
+        elif isinstance(obj, AttendanceSession):
+            key = ('month', obj.class_group_id, month_start(obj.session_date))
+        elif isinstance(obj, Student):
+            key = ('student', obj.id)
+        elif isinstance(obj, ClassGroup):
+            key = ('group', obj.id)
+        else:
+            continue
+        if key is not None:
+            if deleted is None:
+                deleted = session.info.setdefault(_DELETED_KEY, set())
+            deleted.add(key)
+
+
+@event.listens_for(Session, 'after_flush')
+def _refresh_deleted_attendance(session, flush_context):
+    deleted = session.info.pop(_DELETED_KEY, None)
+    if not deleted:
+        return
+    conn = session.connection()
+    students = [key[1] for key in deleted if key[0] == 'student']
+    groups = {key[1] for key in deleted if key[0] == 'group'}
+    if students:
+        conn.execute(delete(AttendanceStat).where(AttendanceStat.student_id.in_(students)))
+    if groups:
+        conn.execute(delete(AttendanceStat).where(AttendanceStat.class_group_id.in_(list(groups))))
+    refresh_group_months(conn, sorted({key[1:] for key in deleted if key[0] == 'month' and key[1] not in groups}))
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_deleted_attendance(session):
+    session.info.pop(_DELETED_KEY, None)
+
+
+@app.cli.command('rebuild-attendance-stats')
+def rebuild_attendance_stats_command():
+    """Recompute attendance statistics from every attendance record"""
+    with db.engine.begin() as conn:
+        rebuild_stats(conn)
+    click.echo(f"{AttendanceStat.query.count()} linhas de estatística recalculadas")
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the hot-path indexes declared in models.py (migration 8).
+
+Seeds a throwaway database with thousands of schedules, incidents and
+attendance rows, then runs the main filter queries with and without the
+indexes, printing timings and the query plans chosen by the database.
+
+    python bench_indexes.py                 # temporary SQLite database
+    BENCH_DATABASE_URL=postgresql://... python bench_indexes.py
+
+Never point BENCH_DATABASE_URL at a database holding real data: every table
+is dropped and recreated.
+"""
+import os
+import random
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+_tmpdir = tempfile.mkdtemp(prefix='bench_indexes_')
+os.environ['DATABASE_URL'] = os.environ.get('BENCH_DATABASE_URL', f"sqlite:///{os.path.join(_tmpdir, 'bench.db')}")
+os.environ.setdefault('AUTO_MIGRATE', '1')
+
+from sqlalchemy import select, text  # noqa: E402
+
+from app import app, db  # noqa: E402
+from models import (  # noqa: E402
+    AttendanceRecord, AttendanceSession, ClassGroup, Classroom, Incident, Schedule,
+    Student, WorkstationAssignment
+)
+from migrations import run_migrations  # noqa: E402
+
+CLASSROOMS = 60
+SCHEDULES = 6000
+INCIDENTS = 20000
+CLASS_GROUPS = 120
+STUDENTS_PER_GROUP = 30
+SESSIONS_PER_GROUP = 40
+REPEAT = 50
+
+SHIFTS = ['morning', 'afternoon', 'night', 'fullday']
+
+INDEX_NAMES = [
+    'ix_schedule_day_shift_active', 'ix_schedule_classroom_active_end',
+    'ix_incident_listing', 'ix_incident_classroom_created',
+    'ix_class_group_classroom', 'ix_student_class_group',
+    'ix_workstation_assignment_class_group',
+    'ix_attendance_session_classroom_group_date', 'ix_attendance_session_group_date',
+    'ix_attendance_record_session_student', 'ix_attendance_record_student',
+]
+
+
+def seed():
+    rnd = random.Random(42)
+    today = date.today()
+    now = datetime.utcnow()
+    db.session.bulk_insert_mappings(Classroom, [
+        {'id': i, 'name': f'Sala {i}', 'capacity': 30, 'block': f'Bloco {i % 4}'}
+        for i in range(1, CLASSROOMS + 1)
+    ])
+    db.session.bulk_insert_mappings(Schedule, [
+        {
+            'classroom_id': rnd.randint(1, CLASSROOMS), 'day_of_week': rnd.randint(0, 5),
+            'shift': rnd.choice(SHIFTS), 'course_name': f'Curso {i}', 'instructor': f'Instrutor {i % 80}',
+            'start_time': '08:00', 'end_time': '12:00',
+            'start_date': today - timedelta(days=rnd.randint(0, 400)),
+            'end_date': today + timedelta(days=rnd.randint(-200, 200)),
+            'is_active': rnd.random() < 0.7, 'created_at': now,
+        }
+        for i in range(SCHEDULES)
+    ])
+    db.session.bulk_insert_mappings(Incident, [
+        {
+            'classroom_id': rnd.randint(1, CLASSROOMS), 'reporter_name': f'Pessoa {i % 300}',
+            'reporter_email': 'bench@senai.br', 'description': 'Equipamento com defeito',
+            'created_at': now - timedelta(minutes=i), 'is_active': rnd.random() < 0.9,
+            'hidden_from_classroom': rnd.random() < 0.2, 'is_resolved': rnd.random() < 0.6,
+        }
+        for i in range(INCIDENTS)
+    ])
+    db.session.bulk_insert_mappings(ClassGroup, [
+        {'id': g, 'classroom_id': rnd.randint(1, CLASSROOMS), 'name': f'Turma {g}'}
+        for g in range(1, CLASS_GROUPS + 1)
+    ])
+    students = []
+    for g in range(1, CLASS_GROUPS + 1):
+        students.extend({'id': len(students) + 1, 'class_group_id': g, 'name': f'Aluno {len(students) + 1}'}
+                        for _ in range(STUDENTS_PER_GROUP))
+    db.session.bulk_insert_mappings(Student, students)
+    db.session.bulk_insert_mappings(WorkstationAssignment, [
+        {'workstation_id': s['id'], 'class_group_id': s['class_group_id'], 'student_id': s['id']}
+        for s in students
+    ])
+    sessions, records = [], []
+    for g in range(1, CLASS_GROUPS + 1):
+        for d in range(SESSIONS_PER_GROUP):
+            session_id = len(sessions) + 1
+            sessions.append({'id': session_id, 'classroom_id': (g % CLASSROOMS) + 1, 'class_group_id': g,
+                             'session_date': today - timedelta(days=d)})
+            first_student = (g - 1) * STUDENTS_PER_GROUP + 1
+            records.extend({'attendance_session_id': session_id, 'student_id': first_student + s,
+                            'status': rnd.choice(['present', 'absent'])}
+                           for s in range(STUDENTS_PER_GROUP))
+    db.session.bulk_insert_mappings(AttendanceSession, sessions)
+    db.session.bulk_insert_mappings(AttendanceRecord, records)
+    db.session.commit()
+
+
+def hot_queries():
+    today = date.today()
+    return [
+        ('schedule by day/shift', select(Schedule.id, Schedule.classroom_id).where(
+            Schedule.day_of_week == 2, Schedule.shift == 'morning', Schedule.is_active == True)),
+        ('schedule by classroom', select(Schedule).where(
+            Schedule.classroom_id == 7, Schedule.is_active == True,
+            (Schedule.end_date == None) | (Schedule.end_date >= today))),
+        ('incidents panel', select(Incident).where(
+            Incident.is_active == True, Incident.hidden_from_classroom == False,
+            Incident.is_resolved == False).order_by(Incident.created_at.desc()).limit(50)),
+        ('incidents of classroom', select(Incident).where(
+            Incident.classroom_id == 7).order_by(Incident.created_at.desc())),
+        ('class groups of classroom', select(ClassGroup.id).where(ClassGroup.classroom_id == 7)),
+        ('students of group', select(Student).where(Student.class_group_id == 11)),
+        ('assignments of group', select(WorkstationAssignment).where(WorkstationAssignment.class_group_id == 11)),
+        ('session of group today', select(AttendanceSession).where(
+            AttendanceSession.classroom_id == 12, AttendanceSession.class_group_id == 11,
+            AttendanceSession.session_date == today)),
+        ('record of student in session', select(AttendanceRecord).where(
+            AttendanceRecord.attendance_session_id == 401, AttendanceRecord.student_id == 301)),
+    ]
+
+
+def explain(conn, statement):
+    compiled = statement.compile(dialect=conn.dialect, compile_kwargs={'literal_binds': True})
+    prefix = 'EXPLAIN QUERY PLAN ' if conn.dialect.name == 'sqlite' else 'EXPLAIN '
+    rows = conn.execute(text(prefix + str(compiled))).fetchall()
+    return [row[-1] for row in rows]
+
+
+def measure(conn, statement):
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        conn.execute(statement).fetchall()
+    return (time.perf_counter() - start) / REPEAT * 1000
+
+
+def set_indexes(conn, enabled):
+    declared = {index.name: index for table in db.metadata.tables.values() for index in table.indexes}
+    for name in INDEX_NAMES:
+        if enabled:
+            declared[name].create(bind=conn, checkfirst=True)
+        else:
+            declared[name].drop(bind=conn, checkfirst=True)
+    if conn.dialect.name == 'sqlite':
+        conn.execute(text('ANALYZE'))
+
+
+def main():
+    with app.app_context():
+        db.drop_all()
+        db.session.execute(text('DROP TABLE IF EXISTS schema_version'))
+        db.session.commit()
+        run_migrations()
+        seed()
+        print(f"Seeded {SCHEDULES} schedules, {INCIDENTS} incidents, "
+              f"{CLASS_GROUPS * SESSIONS_PER_GROUP * STUDENTS_PER_GROUP} attendance records "
+              f"on {db.engine.dialect.name}\n")
+        results = {}
+        for enabled in (False, True):
+            with db.engine.begin() as conn:
+                set_indexes(conn, enabled)
+            with db.engine.connect() as conn:
+                for name, statement in hot_queries():
+                    results.setdefault(name, {})[enabled] = (measure(conn, statement), explain(conn, statement))
+        for name, by_mode in results.items():
+            (without_ms, _), (with_ms, plan) = by_mode[False], by_mode[True]
+            print(f"{name:32s} {without_ms:8.3f} ms -> {with_ms:8.3f} ms  ({without_ms / max(with_ms, 1e-6):5.1f}x)")
+            for line in plan:
+                print(f"    {line}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Login latency under a burst of concurrent logins (shift start).
+
+Every login verifies one password hash; this runs LOGINS verifications from
+CONCURRENCY threads for several hashing policies and prints p50/p95 latency and
+throughput, plus the cost of upgrading an outdated hash inside the request
+versus handing it to password_policy's background thread.
+
+    python bench_login_hash.py [logins] [concurrency]
+
+No database is needed. Compare the numbers against the worker/thread count of
+the deployment before changing PASSWORD_HASH_METHOD.
+"""
+import sys
+import time
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+import password_policy
+
+LOGINS = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+CONCURRENCY = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+PASSWORD = 'senai103'
+
+METHODS = ['scrypt:32768:8:1', 'scrypt:16384:8:1', 'pbkdf2:sha256:600000', 'pbkdf2:sha256:260000']
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def burst(login):
+    """(p50 ms, p95 ms, logins/s) of LOGINS calls to login() from CONCURRENCY threads"""
+    def timed(_):
+        start = time.perf_counter()
+        login()
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=CONCURRENCY) as pool:
+        samples = list(pool.map(timed, range(LOGINS)))
+    elapsed = time.perf_counter() - start
+    return statistics.median(samples) * 1000, percentile(samples, 0.95) * 1000, LOGINS / elapsed
+
+
+def report(label, result):
+    p50, p95, rate = result
+    print(f"{label:34s} {p50:9.1f} {p95:9.1f} {rate:10.1f}")
+
+
+def main():
+    print(f"{LOGINS} logins, {CONCURRENCY} concurrent\n")
+    print(f"{'':34s} {'p50 ms':>9s} {'p95 ms':>9s} {'logins/s':>10s}")
+    for method in METHODS:
+        stored = generate_password_hash(PASSWORD, method=method)
+        report(method, burst(lambda: check_password_hash(stored, PASSWORD)))
+
+    # Outdated hash: verify, then upgrade inline or on the background thread
+    legacy = generate_password_hash(PASSWORD, method='pbkdf2:sha256:260000')
+    policy = password_policy.PASSWORD_HASH_METHOD
+
+    def inline_rehash():
+        if check_password_hash(legacy, PASSWORD) and password_policy.needs_rehash(legacy):
+            password_policy.hash_password(PASSWORD)
+
+    executor = password_policy._get_rehash_executor()
+
+    def deferred_rehash():
+        if check_password_hash(legacy, PASSWORD) and password_policy.needs_rehash(legacy):
+            executor.submit(password_policy.hash_password, PASSWORD)
+
+    print(f"\nUpgrading pbkdf2:sha256:260000 hashes to {policy}:")
+    report('rehash inside the request', burst(inline_rehash))
+    report('rehash on background thread', burst(deferred_rehash))
+    executor.shutdown(wait=True)
+
+
+if __name__ == "__main__":
+    main()
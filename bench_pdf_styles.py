@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark for the shared ReportLab style registry in pdf_generator.py.
+
+Builds a general report for a synthetic 200-room campus twice: once with the
+module-level STYLES / TABLE_STYLES registry, and once with a stand-in that
+rebuilds the sample stylesheet, paragraph styles and TableStyle objects on
+every lookup, the way the generator used to for each header and classroom
+section. Prints build time, style objects created and traced memory per page.
+
+    python bench_pdf_styles.py [rooms]
+
+No database is needed: rooms and schedules are plain objects.
+"""
+import re
+import sys
+import time
+import random
+import tracemalloc
+from types import SimpleNamespace
+
+from reportlab.lib import styles as rl_styles
+from reportlab.platypus import tables as rl_tables
+
+import pdf_generator
+
+ROOMS = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+SCHEDULES_PER_ROOM = 8
+SHIFTS = ['morning', 'afternoon', 'night', 'fullday']
+
+
+def fake_rows(rooms):
+    rnd = random.Random(7)
+    classrooms = [
+        SimpleNamespace(id=i, name=f'Sala {i}', capacity=30, block=f'Bloco {i % 4}', has_computers=i % 2 == 0,
+                        software='Office, AutoCAD' if i % 3 == 0 else '', description='')
+        for i in range(1, rooms + 1)
+    ]
+    schedules = [
+        SimpleNamespace(classroom_id=room.id, day_of_week=rnd.randint(0, 5), shift=rnd.choice(SHIFTS),
+                        course_name=f'Curso Técnico {n}', instructor=f'Instrutor {n}',
+                        start_time='08:00', end_time='12:00')
+        for room in classrooms for n in range(SCHEDULES_PER_ROOM)
+    ]
+    return classrooms, schedules
+
+
+class FreshStyleSheet:
+    """One sample stylesheet per report, plus new ParagraphStyles for every custom-style use"""
+
+    def __init__(self, registry):
+        self.registry = registry
+        self.sheet = rl_styles.getSampleStyleSheet()
+
+    def __getitem__(self, name):
+        if name in self.sheet:
+            return self.sheet[name]
+        style = self.registry[name]
+        return rl_styles.ParagraphStyle(style.name, parent=self.sheet[style.parent.name], **{
+            attr: getattr(style, attr) for attr in ('fontSize', 'spaceAfter', 'alignment', 'textColor')
+        })
+
+
+class FreshTableStyles:
+    """Builds a new TableStyle per lookup, like the per-section command lists"""
+
+    def __init__(self, registry):
+        self.registry = registry
+
+    def __getitem__(self, name):
+        return rl_tables.TableStyle(list(self.registry[name].getCommands()))
+
+
+class CountingStyles:
+    """Counts ParagraphStyle / TableStyle / stylesheet constructions"""
+
+    def __enter__(self):
+        self.count = 0
+        self._originals = [(cls, cls.__init__) for cls in (
+            rl_styles.ParagraphStyle, rl_tables.TableStyle, rl_styles.StyleSheet1)]
+        for cls, init in self._originals:
+            def counted(obj, *args, _init=init, **kwargs):
+                self.count += 1
+                _init(obj, *args, **kwargs)
+            cls.__init__ = counted
+        return self
+
+    def __exit__(self, *exc):
+        for cls, init in self._originals:
+            cls.__init__ = init
+
+
+def build(classrooms, schedules):
+    """(seconds, style objects created, peak traced bytes, pages) of one general report"""
+    start = time.perf_counter()
+    pdf = pdf_generator.generate_general_report(classrooms, schedules).getvalue()
+    elapsed = time.perf_counter() - start
+    # Second, instrumented build: tracemalloc would distort the timing above
+    tracemalloc.start()
+    with CountingStyles() as counter:
+        pdf_generator.generate_general_report(classrooms, schedules)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    pages = len(re.findall(rb'/Type /Page\b', pdf))
+    return elapsed, counter.count, peak, pages
+
+
+def main():
+    classrooms, schedules = fake_rows(ROOMS)
+    pdf_generator.generate_general_report(classrooms, schedules)  # warm up font metrics and imports
+
+    shared = build(classrooms, schedules)
+
+    registry = pdf_generator.STYLES, pdf_generator.TABLE_STYLES
+    pdf_generator.STYLES, pdf_generator.TABLE_STYLES = FreshStyleSheet(registry[0]), FreshTableStyles(registry[1])
+    try:
+        fresh = build(classrooms, schedules)
+    finally:
+        pdf_generator.STYLES, pdf_generator.TABLE_STYLES = registry
+
+    print(f"General report: {ROOMS} rooms, {len(schedules)} schedules, {shared[3]} pages\n")
+    print(f"{'':22s} {'total ms':>10s} {'ms/page':>9s} {'styles/page':>12s} {'peak KiB':>10s}")
+    for label, (elapsed, created, peak, pages) in (('per-build styles', fresh), ('shared registry', shared)):
+        print(f"{label:22s} {elapsed * 1000:10.1f} {elapsed * 1000 / pages:9.2f} {created / pages:12.1f} {peak / 1024:10.0f}")
+
+
+if __name__ == "__main__":
+    main()
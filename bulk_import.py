@@ -0,0 +1,62 @@
+"""
+Bulk user import from Excel rosters.
+
+The workbook is streamed row by row (openpyxl read_only mode) and validated in
+memory; the caller then checks every username against the database with one
+IN query and inserts the new users in batches. Imported accounts share one
+hash of the default password (password_policy.shared_default_hash).
+"""
+import re
+from collections import namedtuple
+
+NIF_PATTERN = re.compile(r'^sn\d{6,8}$')
+
+RosterEntry = namedtuple('RosterEntry', ['row_num', 'username', 'name'])
+
+
+def read_user_roster(file):
+    """
+    Parse a roster with NIF in column A and name in column B (first row is the header).
+    Returns (entries, errors); errors are user-facing messages per skipped row.
+    """
+    import openpyxl
+
+    entries = []
+    errors = []
+    seen = set()
+    workbook = openpyxl.load_workbook(file, read_only=True, data_only=True)
+    try:
+        sheet = workbook.active
+        for row_num, row in enumerate(sheet.iter_rows(min_row=2, max_col=2, values_only=True), start=2):
+            if not row or len(row) < 2:
+                continue
+
+            nif = str(row[0]).strip() if row[0] else ''
+            name = str(row[1]).strip() if row[1] else ''
+
+            if not nif and not name:
+                continue  # Blank trailing rows reported by read-only sheets
+
+            if not nif or not name:
+                errors.append(f'Linha {row_num}: NIF ou nome vazio')
+                continue
+
+            username = nif.lower()
+            if not NIF_PATTERN.match(username):
+                errors.append(f'Linha {row_num}: NIF "{nif}" não está no formato correto (ex: sn1077416)')
+                continue
+
+            if username in seen:
+                errors.append(f'Linha {row_num}: NIF "{nif}" repetido na planilha')
+                continue
+            seen.add(username)
+
+            entries.append(RosterEntry(row_num, username, name))
+    finally:
+        workbook.close()
+    return entries, errors
+
+
+def chunked(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
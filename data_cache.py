@@ -0,0 +1,176 @@
+"""
+Versioned read-through caches for view models built from the database.
+
+Every tracked model has a data-version counter that is bumped after a commit
+that inserted, updated or deleted rows of that model (including bulk
+Query.update()/delete()). Cached entries remember the versions they were built
+from, so a lookup is a single dict access and stale entries are rebuilt on the
+next request after a change.
+
+The committing worker bumps its own counter at once and also increments the
+model's row in the data_version table. Every worker re-reads that table at most
+once per DATA_VERSION_POLL_SECONDS (default 1), so a change committed by another
+gunicorn worker is picked up within about a second. DATA_CACHE_TTL (seconds,
+default 300) remains as a backstop, e.g. for rows changed outside the app.
+"""
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict, namedtuple
+
+from sqlalchemy import event, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+DATA_CACHE_TTL = int(os.environ.get("DATA_CACHE_TTL", "300"))
+DATA_VERSION_POLL_SECONDS = float(os.environ.get("DATA_VERSION_POLL_SECONDS", "1"))
+
+_PENDING_KEY = 'data_cache_changed'
+
+_lock = threading.Lock()
+_versions = {}
+_shared_versions = {}
+_shared_read_at = None
+_tracked = {}
+
+
+def track_versions(*model_classes):
+    """Register models whose committed changes bump their data version"""
+    for model in model_classes:
+        _tracked[model] = model.__name__
+        _versions.setdefault(model.__name__, 0)
+
+
+def bump_version(*names):
+    with _lock:
+        for name in names:
+            _versions[name] = _versions.get(name, 0) + 1
+
+
+def data_version(*model_classes):
+    """Current version tuple for the given models, usable as part of a cache key"""
+    _refresh_shared_versions()
+    return tuple((_versions.get(model.__name__, 0), _shared_versions.get(model.__name__, 0))
+                 for model in model_classes)
+
+
+def _refresh_shared_versions():
+    """Re-read the data_version table when the last read is older than the poll interval"""
+    global _shared_read_at
+    now = time.monotonic()
+    with _lock:
+        if _shared_read_at is not None and now - _shared_read_at < DATA_VERSION_POLL_SECONDS:
+            return
+        _shared_read_at = now
+    try:
+        from app import db
+        from models import DataVersion
+        # Own connection, so a failure never aborts the request's transaction
+        with db.engine.connect() as conn:
+            rows = conn.execute(select(DataVersion.name, DataVersion.version)).all()
+    except Exception as e:
+        logging.warning(f"Could not read shared data versions: {e}")
+        return
+    with _lock:
+        _shared_versions.update(rows)
+
+
+def _bump_shared_versions(engine, names):
+    try:
+        from models import DataVersion
+        dialect = postgresql if engine.dialect.name == 'postgresql' else sqlite
+        stmt = dialect.insert(DataVersion).values([{'name': name, 'version': 1} for name in sorted(names)])
+        stmt = stmt.on_conflict_do_update(index_elements=['name'], set_={'version': DataVersion.version + 1})
+        with engine.begin() as conn:
+            conn.execute(stmt)
+    except Exception as e:
+        logging.error(f"Could not bump shared data versions {sorted(names)}: {e}")
+
+
+def snapshot(obj, fields, _types={}):
+    """Detached, immutable copy of the given attributes of an ORM object"""
+    fields = tuple(fields)
+    row_type = _types.get(fields)
+    if row_type is None:
+        row_type = _types[fields] = namedtuple('Snapshot', fields)
+    return row_type(*(getattr(obj, field) for field in fields))
+
+
+class VersionedCache:
+    """Small thread-safe LRU whose entries are tied to a data version"""
+
+    def __init__(self, max_entries=128, ttl=DATA_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, version):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            entry_version, built_at, value = entry
+            if entry_version != version or (self.ttl > 0 and time.monotonic() - built_at > self.ttl):
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, version, value):
+        with self._lock:
+            self._entries[key] = (version, time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_build(self, key, version, builder):
+        value = self.get(key, version)
+        if value is None:
+            value = builder()
+            self.set(key, version, value)
+        return value
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+
+# Session hooks: collect changed models on flush, bump their versions on commit
+
+def _mark(session, name):
+    session.info.setdefault(_PENDING_KEY, set()).add(name)
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_changed_models(session, flush_context):
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        name = _tracked.get(type(obj))
+        if name is not None:
+            _mark(session, name)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _collect_bulk_changes(orm_execute_state):
+    if orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert:
+        mapper = orm_execute_state.bind_mapper
+        name = _tracked.get(mapper.class_) if mapper is not None else None
+        if name is not None:
+            _mark(orm_execute_state.session, name)
+
+
+@event.listens_for(Session, 'after_commit')
+def _bump_committed_versions(session):
+    changed = session.info.pop(_PENDING_KEY, None)
+    if changed:
+        bump_version(*changed)
+        _bump_shared_versions(session.get_bind(), changed)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_pending_versions(session):
+    session.info.pop(_PENDING_KEY, None)
@@ -0,0 +1,85 @@
+"""
+Responsive variants for classroom photos.
+
+Uploaded photos (mostly multi-megabyte phone JPEGs) are decoded once and
+re-encoded as WebP and JPEG at a few fixed widths. Card grids request the
+variant closest to their rendered size through srcset instead of the original.
+
+This module only depends on Pillow; storing the variants is up to the caller.
+"""
+import io
+from collections import namedtuple
+
+from PIL import Image, ImageOps
+
+# Widths (px) pre-rendered at upload; requests for other sizes snap to these
+VARIANT_WIDTHS = (320, 640, 960)
+
+# format name -> (Pillow encoder, mimetype, save options)
+VARIANT_FORMATS = {
+    'webp': ('WEBP', 'image/webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', 'image/jpeg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+DEFAULT_FORMAT = 'jpeg'
+
+RenderedVariant = namedtuple('RenderedVariant', ['width', 'format', 'mimetype', 'data'])
+
+
+def nearest_width(requested):
+    """Smallest configured width that covers the requested one"""
+    for width in VARIANT_WIDTHS:
+        if requested <= width:
+            return width
+    return VARIANT_WIDTHS[-1]
+
+
+def preferred_format(accept_mimetypes):
+    """Pick WebP when the client advertises it, JPEG otherwise"""
+    if accept_mimetypes and accept_mimetypes['image/webp']:
+        return 'webp'
+    return DEFAULT_FORMAT
+
+
+def _open(data, max_width):
+    image = Image.open(io.BytesIO(data))
+    # JPEG can decode directly at 1/2, 1/4 or 1/8 scale, which is far cheaper than a full decode
+    image.draft('RGB', (max_width, max_width * image.height // max(image.width, 1)))
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ('RGB', 'L'):
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        image = image.convert('RGBA')
+        background.paste(image, mask=image.getchannel('A'))
+        image = background
+    return image
+
+
+def _resize(image, width):
+    if image.width <= width:
+        return image
+    height = max(1, round(image.height * width / image.width))
+    return image.resize((width, height), Image.LANCZOS)
+
+
+def _encode(image, fmt):
+    encoder, _, options = VARIANT_FORMATS[fmt]
+    buffer = io.BytesIO()
+    image.save(buffer, encoder, **options)
+    return buffer.getvalue()
+
+
+def render_variants(data, widths=VARIANT_WIDTHS, formats=tuple(VARIANT_FORMATS)):
+    """Render every (width, format) variant of an image in a single decode"""
+    widths = sorted(widths, reverse=True)
+    image = _open(data, widths[0])
+    variants = []
+    for width in widths:
+        # Downscale from the previous (larger) variant rather than the full original
+        image = _resize(image, width)
+        for fmt in formats:
+            variants.append(RenderedVariant(width, fmt, VARIANT_FORMATS[fmt][1], _encode(image, fmt)))
+    return variants
+
+
+def render_variant(data, width, fmt):
+    """Render a single variant, used to fill in variants missing from storage"""
+    return render_variants(data, widths=(width,), formats=(fmt,))[0]
@@ -0,0 +1,82 @@
+"""
+Per-classroom layout snapshots.
+
+The layout designer, student assignment, layout view and attendance pages and
+the workstations API all draw the same grid: the ClassroomLayout metadata
+(grid dimensions) and the room's workstations. The snapshot keeps that grid
+per classroom, already parsed and JSON-ready, plus a content ETag and the
+serialized API body, so the pages do not re-query the layout, re-parse
+layout_data or re-serialize every workstation on each load.
+
+Routes that change a layout or a workstation call invalidate_layout() after
+the commit; the TTL (LAYOUT_CACHE_TTL seconds, default DATA_CACHE_TTL) bounds
+how long another gunicorn worker can serve a grid taken before the change.
+Snapshots are shared between requests and must not be modified.
+"""
+import os
+import json
+import hashlib
+from collections import namedtuple
+
+from app import db
+from data_cache import DATA_CACHE_TTL, VersionedCache
+from models import ClassroomLayout, Workstation
+
+LAYOUT_CACHE_TTL = int(os.environ.get("LAYOUT_CACHE_TTL", str(DATA_CACHE_TTL)))
+LAYOUT_CACHE_SIZE = int(os.environ.get("LAYOUT_CACHE_SIZE", "256"))
+
+# Single version: entries only go stale through invalidate_layout() or the TTL
+_VERSION = 0
+
+layout_cache = VersionedCache(max_entries=LAYOUT_CACHE_SIZE, ttl=LAYOUT_CACHE_TTL)
+
+LayoutSnapshot = namedtuple('LayoutSnapshot', ['id', 'classroom_id', 'layout_data', 'workstations', 'etag', 'api_body'])
+
+
+def _parse_layout_data(raw):
+    if not raw:
+        return {}
+    try:
+        layout_data = json.loads(raw)
+    except (TypeError, ValueError):
+        return {}
+    return layout_data if isinstance(layout_data, dict) else {}
+
+
+def _build(classroom_id):
+    layout = db.session.query(ClassroomLayout.id, ClassroomLayout.layout_data).filter_by(
+        classroom_id=classroom_id).first()
+    if layout is None:
+        return None
+    layout_id, raw = layout
+    workstations = [{
+        'id': ws_id,
+        'number': number,
+        'position_x': position_x,
+        'position_y': position_y,
+        'notes': notes,
+    } for ws_id, number, position_x, position_y, notes in db.session.query(
+        Workstation.id, Workstation.number, Workstation.position_x, Workstation.position_y, Workstation.notes
+    ).filter_by(layout_id=layout_id).order_by(Workstation.number)]
+    layout_data = _parse_layout_data(raw)
+
+    api_body = json.dumps({'success': True, 'layout_data': layout_data, 'workstations': workstations},
+                          sort_keys=True, default=str)
+    # Content hash, so every worker derives the same ETag for the same grid
+    etag = f'layout-{classroom_id}-{hashlib.sha1(api_body.encode()).hexdigest()[:16]}'
+    return LayoutSnapshot(layout_id, classroom_id, layout_data, workstations, etag, api_body)
+
+
+def get_layout(classroom_id):
+    """Cached LayoutSnapshot of a classroom, or None when it has no layout"""
+    snapshot = layout_cache.get(classroom_id, _VERSION)
+    if snapshot is None:
+        snapshot = _build(classroom_id)
+        if snapshot is not None:
+            layout_cache.set(classroom_id, _VERSION, snapshot)
+    return snapshot
+
+
+def invalidate_layout(classroom_id=None):
+    """Drop the snapshot of one classroom (or all) after a committed layout change"""
+    layout_cache.invalidate(classroom_id)
@@ -0,0 +1,277 @@
+"""
+Versioned schema migrations.
+
+Schema changes are ordered, idempotent steps registered with @migration. The
+highest applied step is recorded in the schema_version table, so a normal boot
+only reads that number; pending steps run once, either from the CLI
+
+    flask --app main migrate-db        (or: python migrations.py)
+
+or automatically at startup while AUTO_MIGRATE is enabled (the default).
+On PostgreSQL every step runs in its own transaction under an advisory lock,
+so several gunicorn workers booting together apply each step only once.
+
+To change the schema, update models.py and append a new step here; never edit
+or renumber a step that has already shipped.
+"""
+import os
+import hashlib
+import logging
+from datetime import datetime
+
+import click
+from sqlalchemy import inspect, text
+
+from app import app, db
+
+AUTO_MIGRATE = os.environ.get("AUTO_MIGRATE", "1").lower() not in ("0", "false", "no")
+
+# Arbitrary constant identifying this app's migration lock on PostgreSQL
+_ADVISORY_LOCK_ID = 727140311
+
+_migrations = []
+
+
+def migration(version, description):
+    """Register a migration step; steps run in ascending version order"""
+    def decorator(func):
+        _migrations.append((version, description, func))
+        _migrations.sort(key=lambda step: step[0])
+        return func
+    return decorator
+
+
+def latest_version():
+    return _migrations[-1][0] if _migrations else 0
+
+
+# Helpers for steps
+
+def add_column(conn, table, column, column_type, default=None, references=None):
+    """ALTER TABLE ... ADD COLUMN, skipped when the column already exists"""
+    existing = {col['name'] for col in inspect(conn).get_columns(table)}
+    if column in existing:
+        return False
+    preparer = conn.dialect.identifier_preparer
+    ddl = f"ALTER TABLE {preparer.quote(table)} ADD COLUMN {preparer.quote(column)} {column_type.compile(dialect=conn.dialect)}"
+    if default is not None:
+        ddl += f" DEFAULT {default}"
+    if references:
+        ddl += f" REFERENCES {references}"
+    conn.execute(text(ddl))
+    logging.info(f"Migration: added column {table}.{column}")
+    return True
+
+
+def create_indexes(conn, *names):
+    """CREATE INDEX for indexes declared in models.py, skipping existing ones"""
+    declared = {index.name: index for table in db.metadata.tables.values() for index in table.indexes}
+    for name in names:
+        declared[name].create(bind=conn, checkfirst=True)
+
+
+def fill_nulls(conn, table, column, value):
+    preparer = conn.dialect.identifier_preparer
+    conn.execute(text(f"UPDATE {preparer.quote(table)} SET {preparer.quote(column)} = {value} WHERE {preparer.quote(column)} IS NULL"))
+
+
+# Schema version bookkeeping
+
+def _ensure_version_table(conn):
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description VARCHAR(255) NOT NULL,
+            applied_at TIMESTAMP NOT NULL
+        )
+    """))
+
+
+def current_version(conn):
+    """Highest applied migration, 0 for a database that was never migrated"""
+    if not inspect(conn).has_table('schema_version'):
+        return 0
+    return conn.execute(text("SELECT MAX(version) FROM schema_version")).scalar() or 0
+
+
+def schema_is_current():
+    with db.engine.connect() as conn:
+        return current_version(conn) >= latest_version()
+
+
+def run_migrations(engine=None):
+    """Apply every pending step; returns the list of (version, description) applied"""
+    engine = engine or db.engine
+    is_postgres = engine.dialect.name == 'postgresql'
+    applied = []
+    with engine.begin() as conn:
+        _ensure_version_table(conn)
+    for version, description, func in _migrations:
+        with engine.begin() as conn:
+            if is_postgres:
+                conn.execute(text("SELECT pg_advisory_xact_lock(:lock_id)"), {'lock_id': _ADVISORY_LOCK_ID})
+            # Re-read under the lock: another worker may have applied it meanwhile
+            if conn.execute(text("SELECT 1 FROM schema_version WHERE version = :version"), {'version': version}).first():
+                continue
+            logging.info(f"Applying migration {version}: {description}")
+            func(conn)
+            conn.execute(text("INSERT INTO schema_version (version, description, applied_at) VALUES (:version, :description, :applied_at)"),
+                         {'version': version, 'description': description, 'applied_at': datetime.utcnow()})
+            applied.append((version, description))
+    return applied
+
+
+def check_schema_on_startup():
+    """Read the schema version at boot and apply pending steps if AUTO_MIGRATE is on"""
+    if schema_is_current():
+        return
+    if AUTO_MIGRATE:
+        applied = run_migrations()
+        logging.info(f"Database migrated to version {latest_version()} ({len(applied)} steps applied)")
+    else:
+        logging.warning("Database schema is out of date; run 'flask --app main migrate-db'")
+
+
+@app.cli.command('migrate-db')
+def migrate_db_command():
+    """Apply pending database schema migrations"""
+    applied = run_migrations()
+    for version, description in applied:
+        click.echo(f"Applied {version}: {description}")
+    click.echo(f"Schema version: {latest_version()} ({len(applied)} steps applied)")
+
+
+# Migration steps
+
+@migration(1, "Create base tables")
+def _create_base_tables(conn):
+    # Tables only; columns added to existing tables later are handled by the steps below
+    db.metadata.create_all(bind=conn)
+
+
+@migration(2, "Classroom file storage and admin password columns")
+def _classroom_file_columns(conn):
+    add_column(conn, 'classroom', 'image_data', db.LargeBinary())
+    add_column(conn, 'classroom', 'excel_data', db.LargeBinary())
+    add_column(conn, 'classroom', 'image_mimetype', db.String(100))
+    add_column(conn, 'classroom', 'excel_mimetype', db.String(100))
+    add_column(conn, 'classroom', 'admin_password', db.String(255), default="''")
+    add_column(conn, 'classroom', 'created_at', db.DateTime(), default='CURRENT_TIMESTAMP')
+    add_column(conn, 'classroom', 'updated_at', db.DateTime(), default='CURRENT_TIMESTAMP')
+    fill_nulls(conn, 'classroom', 'admin_password', "''")
+
+
+@migration(3, "Classroom blob size/hash metadata")
+def _classroom_blob_metadata(conn):
+    add_column(conn, 'classroom', 'image_size', db.Integer())
+    add_column(conn, 'classroom', 'image_hash', db.String(64))
+    add_column(conn, 'classroom', 'excel_size', db.Integer())
+    add_column(conn, 'classroom', 'excel_hash', db.String(64))
+    # Backfill files stored before the metadata columns existed
+    rows = conn.execute(text("""
+        SELECT id, image_data, excel_data FROM classroom
+        WHERE (image_data IS NOT NULL AND image_size IS NULL)
+           OR (excel_data IS NOT NULL AND excel_size IS NULL)
+    """)).fetchall()
+    for classroom_id, image_data, excel_data in rows:
+        conn.execute(text("""
+            UPDATE classroom SET image_size = :image_size, image_hash = :image_hash,
+                                 excel_size = :excel_size, excel_hash = :excel_hash
+            WHERE id = :id
+        """), {
+            'id': classroom_id,
+            'image_size': len(image_data) if image_data else None,
+            'image_hash': hashlib.sha256(image_data).hexdigest() if image_data else None,
+            'excel_size': len(excel_data) if excel_data else None,
+            'excel_hash': hashlib.sha256(excel_data).hexdigest() if excel_data else None,
+        })
+
+
+@migration(4, "Schedule date range and status columns")
+def _schedule_columns(conn):
+    add_column(conn, 'schedule', 'start_date', db.Date())
+    add_column(conn, 'schedule', 'end_date', db.Date())
+    add_column(conn, 'schedule', 'is_active', db.Boolean(), default='TRUE')
+    add_column(conn, 'schedule', 'created_at', db.DateTime(), default='CURRENT_TIMESTAMP')
+    fill_nulls(conn, 'schedule', 'is_active', 'TRUE')
+
+
+@migration(5, "Incident resolution and visibility columns")
+def _incident_columns(conn):
+    add_column(conn, 'incident', 'is_resolved', db.Boolean(), default='FALSE')
+    add_column(conn, 'incident', 'admin_response', db.Text())
+    add_column(conn, 'incident', 'response_date', db.DateTime())
+    add_column(conn, 'incident', 'hidden_from_classroom', db.Boolean(), default='FALSE')
+    fill_nulls(conn, 'incident', 'is_resolved', 'FALSE')
+    fill_nulls(conn, 'incident', 'hidden_from_classroom', 'FALSE')
+    fill_nulls(conn, 'incident', 'is_active', 'TRUE')
+
+
+@migration(6, "Class group schedule and teacher columns")
+def _class_group_columns(conn):
+    add_column(conn, 'class_group', 'shift', db.String(20), default="''")
+    add_column(conn, 'class_group', 'start_time', db.String(10), default="''")
+    add_column(conn, 'class_group', 'end_time', db.String(10), default="''")
+    add_column(conn, 'class_group', 'days_of_week', db.Text(), default="''")
+    add_column(conn, 'class_group', 'teacher_id', db.Integer(), references='"user"(id)')
+
+
+@migration(7, "User first login flag")
+def _user_first_login(conn):
+    add_column(conn, 'user', 'first_login', db.Boolean(), default='TRUE')
+
+
+@migration(8, "Indexes for hot filter paths")
+def _hot_path_indexes(conn):
+    create_indexes(
+        conn,
+        'ix_schedule_day_shift_active',
+        'ix_schedule_classroom_active_end',
+        'ix_incident_listing',
+        'ix_incident_classroom_created',
+        'ix_schedule_request_status_created',
+        'ix_class_group_classroom',
+        'ix_student_class_group',
+        'ix_workstation_layout',
+        'ix_workstation_assignment_class_group',
+        'ix_attendance_session_classroom_group_date',
+        'ix_attendance_session_group_date',
+        'ix_attendance_record_session_student',
+        'ix_attendance_record_student',
+    )
+
+
+@migration(9, "Background report job table")
+def _report_job_table(conn):
+    from models import ReportJob
+    ReportJob.__table__.create(bind=conn, checkfirst=True)
+
+
+@migration(10, "Attendance change versions for delta polling")
+def _attendance_versions(conn):
+    add_column(conn, 'attendance_session', 'version', db.Integer(), default='0')
+    add_column(conn, 'attendance_record', 'version', db.Integer(), default='0')
+    fill_nulls(conn, 'attendance_session', 'version', 0)
+    fill_nulls(conn, 'attendance_record', 'version', 0)
+    create_indexes(conn, 'ix_attendance_record_session_version')
+
+
+@migration(11, "Materialized attendance statistics")
+def _attendance_stats(conn):
+    from models import AttendanceStat
+    from attendance_stats import rebuild_stats
+    AttendanceStat.__table__.create(bind=conn, checkfirst=True)
+    rebuild_stats(conn)
+
+
+@migration(12, "Shared data versions for cross-worker cache invalidation")
+def _data_version_table(conn):
+    from models import DataVersion
+    DataVersion.__table__.create(bind=conn, checkfirst=True)
+
+
+if __name__ == "__main__":
+    with app.app_context():
+        for version, description in run_migrations():
+            print(f"Applied {version}: {description}")
+        print(f"Schema version: {latest_version()}")
@@ -1,6 +1,7 @@
 from app import db
 from datetime import datetime
-from werkzeug.security import generate_password_hash, check_password_hash
+import hashlib
+from password_policy import hash_password, verify_password
 from flask_login import UserMixin
 
 class Classroom(db.Model):
@@ -13,10 +14,16 @@ class Classroom(db.Model):
     block = db.Column(db.String(50), nullable=False)
     image_filename = db.Column(db.String(255), default='')  # Store filename instead of URL
     excel_filename = db.Column(db.String(255), default='')  # Store Excel filename
-    image_data = db.Column(db.LargeBinary)  # Store image data in PostgreSQL (BYTEA)
-    excel_data = db.Column(db.LargeBinary)  # Store Excel file data in PostgreSQL (BYTEA)
+    # Binary payloads are deferred and raise if touched by a normal query;
+    # use load_image()/load_excel() and the size/hash metadata columns instead
+    image_data = db.deferred(db.Column(db.LargeBinary), group='blobs', raiseload=True)  # Store image data in PostgreSQL (BYTEA)
+    excel_data = db.deferred(db.Column(db.LargeBinary), group='blobs', raiseload=True)  # Store Excel file data in PostgreSQL (BYTEA)
     image_mimetype = db.Column(db.String(100))  # Store image MIME type
     excel_mimetype = db.Column(db.String(100))  # Store Excel MIME type
+    image_size = db.Column(db.Integer)  # Size in bytes of image_data
+    image_hash = db.Column(db.String(64))  # SHA-256 of image_data
+    excel_size = db.Column(db.Integer)  # Size in bytes of excel_data
+    excel_hash = db.Column(db.String(64))  # SHA-256 of excel_data
     admin_password = db.Column(db.String(255), default='')  # Admin password for classroom access
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -34,10 +41,48 @@ class Classroom(db.Model):
     
     # Relationship with schedules
     schedules = db.relationship('Schedule', backref='classroom', lazy=True, cascade='all, delete-orphan')
+    # Resized copies of the photo (see image_pipeline)
+    image_variants = db.relationship('ClassroomImageVariant', backref='classroom', lazy=True, cascade='all, delete-orphan')
     
     def __repr__(self):
         return f'<Classroom {self.name}>'
     
+    @property
+    def has_image(self):
+        return bool(self.image_size)
+    
+    @property
+    def has_excel(self):
+        return bool(self.excel_size)
+    
+    def set_image(self, data, mimetype, filename=None):
+        """Store image bytes together with their size/hash metadata"""
+        self.image_data = data
+        self.image_mimetype = mimetype
+        self.image_size = len(data) if data else None
+        self.image_hash = hashlib.sha256(data).hexdigest() if data else None
+        if filename is not None:
+            self.image_filename = filename
+    
+    def set_excel(self, data, mimetype, filename=None):
+        """Store Excel bytes together with their size/hash metadata"""
+        self.excel_data = data
+        self.excel_mimetype = mimetype
+        self.excel_size = len(data) if data else None
+        self.excel_hash = hashlib.sha256(data).hexdigest() if data else None
+        if filename is not None:
+            self.excel_filename = filename
+    
+    @staticmethod
+    def load_image(classroom_id):
+        """Fetch only (image_data, image_mimetype) for one classroom"""
+        return db.session.query(Classroom.image_data, Classroom.image_mimetype).filter(Classroom.id == classroom_id).first()
+    
+    @staticmethod
+    def load_excel(classroom_id):
+        """Fetch only (excel_data, excel_mimetype) for one classroom"""
+        return db.session.query(Classroom.excel_data, Classroom.excel_mimetype).filter(Classroom.id == classroom_id).first()
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -50,6 +95,40 @@ class Classroom(db.Model):
             'excel_filename': self.excel_filename
         }
 
+class ClassroomImageVariant(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    classroom_id = db.Column(db.Integer, db.ForeignKey('classroom.id'), nullable=False)
+    width = db.Column(db.Integer, nullable=False)
+    format = db.Column(db.String(10), nullable=False)  # webp, jpeg
+    mimetype = db.Column(db.String(100), nullable=False)
+    source_hash = db.Column(db.String(64), nullable=False)  # Classroom.image_hash the variant was rendered from
+    size = db.Column(db.Integer, nullable=False)
+    data = db.deferred(db.Column(db.LargeBinary, nullable=False), raiseload=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.UniqueConstraint('classroom_id', 'width', 'format', name='unique_classroom_image_variant'),
+    )
+    
+    def __init__(self, classroom_id=None, width=0, format='', mimetype='', source_hash='', data=b''):
+        self.classroom_id = classroom_id
+        self.width = width
+        self.format = format
+        self.mimetype = mimetype
+        self.source_hash = source_hash
+        self.data = data
+        self.size = len(data)
+    
+    def __repr__(self):
+        return f'<ClassroomImageVariant {self.classroom_id} {self.width}w {self.format}>'
+    
+    @staticmethod
+    def load(classroom_id, width, format, source_hash):
+        """Fetch only (data, mimetype) of a variant rendered from the current image"""
+        return db.session.query(ClassroomImageVariant.data, ClassroomImageVariant.mimetype).filter_by(
+            classroom_id=classroom_id, width=width, format=format, source_hash=source_hash
+        ).first()
+
 class Schedule(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     classroom_id = db.Column(db.Integer, db.ForeignKey('classroom.id'), nullable=False)
@@ -64,6 +143,11 @@ class Schedule(db.Model):
     is_active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    __table_args__ = (
+        db.Index('ix_schedule_day_shift_active', 'day_of_week', 'shift', 'is_active'),  # Availability and dashboard grids
+        db.Index('ix_schedule_classroom_active_end', 'classroom_id', 'is_active', 'end_date'),  # Per-classroom schedule lists
+    )
+    
     def __init__(self, classroom_id=0, day_of_week=0, shift='', course_name='', instructor='', start_time='', end_time='', start_date=None, end_date=None, is_active=True):
         self.classroom_id = classroom_id
         self.day_of_week = day_of_week
@@ -119,6 +203,11 @@ class Incident(db.Model):
     # Relationship with classroom
     classroom = db.relationship('Classroom', backref='incidents')
     
+    __table_args__ = (
+        db.Index('ix_incident_listing', 'is_active', 'hidden_from_classroom', 'is_resolved', 'created_at'),  # Incidents panel and counters
+        db.Index('ix_incident_classroom_created', 'classroom_id', 'created_at'),  # Classroom page
+    )
+    
     def __init__(self, classroom_id=0, reporter_name='', reporter_email='', description=''):
         self.classroom_id = classroom_id
         self.reporter_name = reporter_name
@@ -177,6 +266,10 @@ class ScheduleRequest(db.Model):
     # Relationship with classroom
     classroom = db.relationship('Classroom', backref='schedule_requests')
     
+    __table_args__ = (
+        db.Index('ix_schedule_request_status_created', 'status', 'created_at'),
+    )
+    
     def __init__(self, classroom_id=0, requester_name='', requester_email='', 
                  event_name='', description='', requested_date=None, 
                  day_of_week=0, shift='', start_time='', end_time='', additional_dates=''):
@@ -232,7 +325,7 @@ class ClassGroup(db.Model):
     teacher_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
     name = db.Column(db.String(200), nullable=False)  # Nome da turma
     excel_filename = db.Column(db.String(255), default='')
-    excel_data = db.Column(db.LargeBinary)  # Store Excel file
+    excel_data = db.deferred(db.Column(db.LargeBinary), raiseload=True)  # Store Excel file
     excel_mimetype = db.Column(db.String(100))
     
     # Schedule information
@@ -250,6 +343,10 @@ class ClassGroup(db.Model):
     teachers = db.relationship('User', secondary=class_group_teachers, backref=db.backref('teaching_groups', lazy='dynamic'))
     students = db.relationship('Student', backref='class_group', lazy=True, cascade='all, delete-orphan')
     
+    __table_args__ = (
+        db.Index('ix_class_group_classroom', 'classroom_id'),
+    )
+    
     def __repr__(self):
         return f'<ClassGroup {self.name}>'
     
@@ -315,6 +412,10 @@ class Student(db.Model):
     row_number = db.Column(db.Integer)  # Original row in Excel for reference
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    __table_args__ = (
+        db.Index('ix_student_class_group', 'class_group_id'),
+    )
+    
     def __init__(self, class_group_id=0, name='', row_number=None):
         self.class_group_id = class_group_id
         self.name = name
@@ -363,6 +464,10 @@ class Workstation(db.Model):
     # Relationships
     assignments = db.relationship('WorkstationAssignment', backref='workstation', lazy=True, cascade='all, delete-orphan')
     
+    __table_args__ = (
+        db.Index('ix_workstation_layout', 'layout_id'),
+    )
+    
     def __init__(self, layout_id=0, number=0, position_x=0, position_y=0, notes=''):
         self.layout_id = layout_id
         self.number = number
@@ -397,6 +502,7 @@ class WorkstationAssignment(db.Model):
     # Unique constraint: each student can only be assigned to one workstation per class group
     __table_args__ = (
         db.UniqueConstraint('student_id', 'class_group_id', name='unique_student_class'),
+        db.Index('ix_workstation_assignment_class_group', 'class_group_id'),
     )
     
     def __init__(self, workstation_id=0, class_group_id=0, student_id=0):
@@ -426,11 +532,18 @@ class AttendanceSession(db.Model):
     created_by = db.Column(db.String(100), default='')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Bumped on every record change; records carry the version of their last change
+    version = db.Column(db.Integer, default=0)
     
     classroom = db.relationship('Classroom', backref='attendance_sessions')
     class_group = db.relationship('ClassGroup', backref='attendance_sessions')
     records = db.relationship('AttendanceRecord', backref='session', lazy=True, cascade='all, delete-orphan')
     
+    __table_args__ = (
+        db.Index('ix_attendance_session_classroom_group_date', 'classroom_id', 'class_group_id', 'session_date'),
+        db.Index('ix_attendance_session_group_date', 'class_group_id', 'session_date'),
+    )
+    
     def __init__(self, classroom_id=0, class_group_id=0, session_date=None, status='active', created_by=''):
         self.classroom_id = classroom_id
         self.class_group_id = class_group_id
@@ -469,10 +582,17 @@ class AttendanceRecord(db.Model):
     notes = db.Column(db.Text, default='')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    version = db.Column(db.Integer, default=0)
     
     student = db.relationship('Student', backref='attendance_records')
     workstation = db.relationship('Workstation', backref='attendance_records')
     
+    __table_args__ = (
+        db.Index('ix_attendance_record_session_student', 'attendance_session_id', 'student_id'),
+        db.Index('ix_attendance_record_student', 'student_id'),
+        db.Index('ix_attendance_record_session_version', 'attendance_session_id', 'version'),
+    )
+    
     def __init__(self, attendance_session_id=0, student_id=0, workstation_id=None, status='absent'):
         self.attendance_session_id = attendance_session_id
         self.student_id = student_id
@@ -496,6 +616,25 @@ class AttendanceRecord(db.Model):
             'notes': self.notes
         }
 
+class AttendanceStat(db.Model):
+    """Attendance totals of a student in a class group for one month, maintained as records change"""
+    id = db.Column(db.Integer, primary_key=True)
+    student_id = db.Column(db.Integer, db.ForeignKey('student.id', ondelete='CASCADE'), nullable=False)
+    class_group_id = db.Column(db.Integer, db.ForeignKey('class_group.id', ondelete='CASCADE'), nullable=False)
+    month = db.Column(db.Date, nullable=False)  # First day of the month
+    sessions = db.Column(db.Integer, nullable=False, default=0)
+    presents = db.Column(db.Integer, nullable=False, default=0)
+    absences = db.Column(db.Integer, nullable=False, default=0)
+    last_check_in = db.Column(db.DateTime)
+    
+    __table_args__ = (
+        db.UniqueConstraint('student_id', 'class_group_id', 'month', name='uq_attendance_stat_student_group_month'),
+        db.Index('ix_attendance_stat_group_month', 'class_group_id', 'month'),
+    )
+    
+    def __repr__(self):
+        return f'<AttendanceStat Student#{self.student_id} {self.month} {self.presents}/{self.sessions}>'
+
 class User(db.Model, UserMixin):
     """User model for authentication with roles"""
     id = db.Column(db.Integer, primary_key=True)
@@ -518,10 +657,10 @@ class User(db.Model, UserMixin):
         self.first_login = first_login
     
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hash_password(password)
     
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return verify_password(self.password_hash, password)
     
     def is_admin(self):
         return self.role == 'admin'
@@ -546,3 +685,46 @@ class User(db.Model, UserMixin):
             'is_active': self.is_active,
             'created_at': self.created_at.strftime('%d/%m/%Y às %H:%M') if self.created_at else ''
         }
+
+class ReportJob(db.Model):
+    """A report rendered in the background; the artifact lives in the report_jobs file store"""
+    id = db.Column(db.String(32), primary_key=True)  # uuid4 hex, also the artifact file name
+    kind = db.Column(db.String(50), nullable=False)  # general_report, incidents_pdf, excel_export, ...
+    params = db.Column(db.Text, default='')  # JSON arguments for the builder
+    status = db.Column(db.String(20), default='queued')  # queued, running, done, failed
+    owner_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)  # Requesting user; delete_user purges the user's jobs
+    filename = db.Column(db.String(255), default='')
+    mimetype = db.Column(db.String(100), default='')
+    size = db.Column(db.Integer)
+    error = db.Column(db.Text, default='')
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    expires_at = db.Column(db.DateTime)
+    
+    __table_args__ = (
+        db.Index('ix_report_job_expires', 'expires_at'),
+    )
+    
+    def __repr__(self):
+        return f'<ReportJob {self.id} {self.kind} {self.status}>'
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'filename': self.filename,
+            'size': self.size,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+class DataVersion(db.Model):
+    """Change counter per tracked model, shared by every worker (see data_cache)"""
+    name = db.Column(db.String(100), primary_key=True)  # Model class name
+    version = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<DataVersion {self.name} {self.version}>'
@@ -0,0 +1,134 @@
+"""
+In-process occupancy index for classroom availability.
+
+Keeps one bitset (a Python int, bit N = classroom id N) per (day_of_week, shift)
+built from the active Schedule rows, so availability checks are set operations
+instead of database queries. The index is built lazily on first use and remembers
+the Schedule data version (data_cache) it was built from; the first query after a
+committed Schedule change rebuilds it with one query.
+
+Each gunicorn worker keeps its own copy. A booking committed in the same worker
+is visible at once; one committed in another worker is visible within
+DATA_VERSION_POLL_SECONDS (default 1s), when data_cache re-reads the shared
+data_version table. OCCUPANCY_INDEX_TTL (seconds, default 300) only forces a
+rebuild for rows changed outside the app.
+"""
+import os
+import time
+import threading
+from collections import namedtuple
+
+from app import db
+from data_cache import data_version, track_versions
+from models import Schedule
+
+INDEX_TTL = int(os.environ.get("OCCUPANCY_INDEX_TTL", "300"))
+
+# Lightweight, detached copy of the Schedule fields used by the availability views
+ScheduleEntry = namedtuple('ScheduleEntry', [
+    'id', 'classroom_id', 'day_of_week', 'shift', 'course_name', 'instructor',
+    'start_time', 'end_time', 'start_date', 'end_date'
+])
+
+track_versions(Schedule)
+
+
+class _Slot:
+    """Schedules for a single (day_of_week, shift) pair"""
+
+    def __init__(self):
+        self.entries = {}
+        self._open_mask = 0
+        self._open_entries = []
+        self._dated = []
+        self._by_date = {}
+
+    def add(self, entry):
+        self.entries[entry.id] = entry
+
+    def reindex(self):
+        self._open_mask = 0
+        self._open_entries = []
+        self._dated = []
+        for entry in sorted(self.entries.values(), key=lambda e: e.id):
+            if entry.start_date and entry.end_date:
+                self._dated.append(entry)
+            else:
+                self._open_mask |= 1 << entry.classroom_id
+                self._open_entries.append(entry)
+        self._by_date = {}
+
+    def occupied(self, target_date):
+        """Return (bitset, entries) for the schedules running on target_date"""
+        cached = self._by_date.get(target_date)
+        if cached is None:
+            mask = self._open_mask
+            entries = list(self._open_entries)
+            for entry in self._dated:
+                if entry.start_date <= target_date <= entry.end_date:
+                    mask |= 1 << entry.classroom_id
+                    entries.append(entry)
+            entries.sort(key=lambda e: e.id)
+            if len(self._by_date) > 64:
+                self._by_date.clear()
+            cached = self._by_date[target_date] = (mask, tuple(entries))
+        return cached
+
+
+class OccupancyIndex:
+    """Bitset index of active schedules keyed by (day_of_week, shift)"""
+
+    def __init__(self, ttl=INDEX_TTL):
+        self.ttl = ttl
+        self._lock = threading.RLock()
+        self._slots = {}
+        self._built_at = None
+        self._built_version = None
+
+    def _ensure_built(self):
+        version = data_version(Schedule)
+        if (self._built_at is not None and self._built_version == version
+                and (self.ttl <= 0 or time.monotonic() - self._built_at < self.ttl)):
+            return
+        rows = db.session.query(
+            Schedule.id, Schedule.classroom_id, Schedule.day_of_week, Schedule.shift,
+            Schedule.course_name, Schedule.instructor, Schedule.start_time,
+            Schedule.end_time, Schedule.start_date, Schedule.end_date
+        ).filter(Schedule.is_active == True).all()
+        slots = {}
+        for row in rows:
+            entry = ScheduleEntry(*row)
+            slots.setdefault((entry.day_of_week, entry.shift), _Slot()).add(entry)
+        for slot in slots.values():
+            slot.reindex()
+        self._slots = slots
+        self._built_at = time.monotonic()
+        self._built_version = version
+
+    def occupied(self, day_of_week, target_date, shifts=None):
+        """
+        Return (bitset of occupied classroom ids, schedule entries) for a date.
+        shifts=None checks every shift of that day.
+        """
+        with self._lock:
+            self._ensure_built()
+            if shifts is None:
+                shifts = sorted(shift for day, shift in self._slots if day == day_of_week)
+            mask = 0
+            entries = []
+            for shift in shifts:
+                slot = self._slots.get((day_of_week, shift))
+                if slot is None:
+                    continue
+                slot_mask, slot_entries = slot.occupied(target_date)
+                mask |= slot_mask
+                entries.extend(slot_entries)
+            return mask, entries
+
+
+occupancy_index = OccupancyIndex()
+
+
+def is_occupied(mask, classroom_id):
+    return bool((mask >> classroom_id) & 1)
+
@@ -0,0 +1,129 @@
+"""
+Keyset (cursor) pagination for listing views.
+
+Pages are addressed by an opaque cursor holding the sort key of the last row
+shown, e.g. (created_at, id), instead of an OFFSET, so every page costs the
+same index range scan no matter how deep into the history it is. The same
+cursors work for HTML views (?after=/?before=) and JSON endpoints.
+"""
+import json
+import base64
+from datetime import date, datetime
+
+from sqlalchemy import tuple_
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def page_size(value, default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    """Clamp a requested page size (e.g. ?per_page=) to 1..maximum"""
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(size, maximum))
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {'dt': value.isoformat()}
+    if isinstance(value, date):
+        return {'d': value.isoformat()}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        if 'dt' in value:
+            return datetime.fromisoformat(value['dt'])
+        if 'd' in value:
+            return date.fromisoformat(value['d'])
+        raise ValueError('unknown cursor value')
+    return value
+
+
+def encode_cursor(values):
+    raw = json.dumps([_encode_value(v) for v in values], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token, length):
+    """Sort key encoded in a cursor, or None when the cursor is missing or malformed"""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        values = [_decode_value(v) for v in json.loads(raw)]
+    except (ValueError, TypeError):
+        return None
+    return tuple(values) if len(values) == length else None
+
+
+class KeysetPage:
+    """One page of rows plus the cursors of its neighbours"""
+
+    def __init__(self, items, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def to_dict(self, serialize):
+        """JSON payload: serialized items plus the cursors to request next/previous pages"""
+        return {
+            'items': [serialize(item) for item in self.items],
+            'next_cursor': self.next_cursor,
+            'prev_cursor': self.prev_cursor,
+        }
+
+
+def paginate_keyset(query, key_columns, after=None, before=None, per_page=DEFAULT_PAGE_SIZE):
+    """
+    Page through a query ordered descending by key_columns (newest first).
+
+    key_columns must be unique together and non-null, e.g. (Model.created_at, Model.id);
+    rows expose them as attributes of the same name. Pass the cursor from
+    next_cursor as `after` and the one from prev_cursor as `before`.
+    """
+    key_columns = tuple(key_columns)
+    key = tuple_(*key_columns)
+    query = query.order_by(None)
+    after_key = decode_cursor(after, len(key_columns))
+    before_key = decode_cursor(before, len(key_columns)) if after_key is None else None
+
+    if before_key is not None:
+        # Walk backwards from the cursor, then restore newest-first order
+        rows = query.filter(key > before_key).order_by(
+            *[column.asc() for column in key_columns]
+        ).limit(per_page + 1).all()
+        has_more_before = len(rows) > per_page
+        rows = list(reversed(rows[:per_page]))
+        has_more_after = True
+    else:
+        if after_key is not None:
+            query = query.filter(key < after_key)
+        rows = query.order_by(*[column.desc() for column in key_columns]).limit(per_page + 1).all()
+        has_more_after = len(rows) > per_page
+        rows = rows[:per_page]
+        has_more_before = after_key is not None
+
+    def cursor_of(row):
+        return encode_cursor([getattr(row, column.key) for column in key_columns])
+
+    next_cursor = cursor_of(rows[-1]) if rows and has_more_after else None
+    prev_cursor = cursor_of(rows[0]) if rows and has_more_before else None
+    return KeysetPage(rows, next_cursor, prev_cursor)
@@ -0,0 +1,84 @@
+"""
+Password hashing policy.
+
+PASSWORD_HASH_METHOD selects the werkzeug method and its cost, e.g.
+"scrypt:32768:8:1" (the werkzeug default) or "pbkdf2:sha256:600000". Hashes made
+with another method or cost keep working; after a successful login they are
+upgraded to the current policy on a background thread, so the login response
+does not pay for a second hash.
+
+Bulk-imported accounts all start with the same default password and are marked
+first_login, which forces a change on the first access. They share one hash,
+computed once per process, instead of hashing the same password per row.
+
+The Flask app is only imported by the background rehash, so this module (and
+bench_login_hash.py) loads without a database.
+"""
+import os
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+PASSWORD_HASH_METHOD = os.environ.get("PASSWORD_HASH_METHOD", "scrypt:32768:8:1")
+PASSWORD_SALT_LENGTH = int(os.environ.get("PASSWORD_SALT_LENGTH", "16"))
+
+_rehash_executor = None
+
+
+def hash_password(password):
+    return generate_password_hash(password, method=PASSWORD_HASH_METHOD, salt_length=PASSWORD_SALT_LENGTH)
+
+
+def verify_password(password_hash, password):
+    return check_password_hash(password_hash, password)
+
+
+@lru_cache(maxsize=None)
+def shared_default_hash(password):
+    """One hash of a bulk-default password, reused for every imported account"""
+    return hash_password(password)
+
+
+@lru_cache(maxsize=1)
+def _policy_prefix():
+    # werkzeug expands partial methods ("scrypt" -> "scrypt:32768:8:1"), so ask it
+    return generate_password_hash('', method=PASSWORD_HASH_METHOD, salt_length=1).split('$', 1)[0]
+
+
+def needs_rehash(password_hash):
+    """True when the hash was made with a different method or cost than the policy"""
+    return password_hash.split('$', 1)[0] != _policy_prefix()
+
+
+def _get_rehash_executor():
+    # Created lazily so every gunicorn worker gets its own thread after fork
+    global _rehash_executor
+    if _rehash_executor is None:
+        _rehash_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='password-rehash')
+    return _rehash_executor
+
+
+def schedule_rehash(user_id, old_hash, password):
+    """Upgrade a user's hash to the current policy after the request has returned"""
+    _get_rehash_executor().submit(_rehash, user_id, old_hash, password)
+
+
+def _rehash(user_id, old_hash, password):
+    from app import app, db
+    from models import User
+
+    with app.app_context():
+        try:
+            # Only replace the hash we verified; a password changed meanwhile wins
+            updated = User.query.filter_by(id=user_id, password_hash=old_hash).update(
+                {User.password_hash: hash_password(password)}, synchronize_session=False)
+            db.session.commit()
+            if updated:
+                logging.info(f"Password hash of user {user_id} upgraded to {_policy_prefix()}")
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f"Error upgrading password hash of user {user_id}: {e}")
+        finally:
+            db.session.remove()
@@ -0,0 +1,135 @@
+"""
+Content-addressed on-disk cache for rendered PDF reports.
+
+A report is identified by a key hashed from its type, its parameters and a
+fingerprint of the rows it is rendered from. Identical inputs map to the same
+file, so repeated downloads skip ReportLab entirely and the key doubles as a
+strong ETag; any change to the input rows yields a new key. Files are shared
+by every worker on the host and evicted least recently used first once the
+directory grows beyond PDF_CACHE_MAX_BYTES.
+"""
+import io
+import os
+import json
+import hashlib
+import logging
+import tempfile
+import threading
+from datetime import date, datetime
+
+from sqlalchemy import inspect
+
+PDF_CACHE_DIR = os.environ.get("PDF_CACHE_DIR") or os.path.join(tempfile.gettempdir(), 'salas_pdf_cache')
+PDF_CACHE_MAX_BYTES = int(os.environ.get("PDF_CACHE_MAX_MB", "200")) * 1024 * 1024
+
+
+def _plain(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, bytes):
+        return hashlib.sha256(value).hexdigest()
+    return value
+
+
+def _row_values(obj):
+    """Loaded column values of an ORM object; deferred columns (blobs) are left out"""
+    mapper = inspect(obj).mapper
+    return [_plain(getattr(obj, attr.key)) for attr in mapper.column_attrs if not attr.deferred]
+
+
+def rows_fingerprint(*row_groups):
+    """sha256 over the column values of every row, in order"""
+    digest = hashlib.sha256()
+    for rows in row_groups:
+        digest.update(b'\x1e')
+        for row in rows:
+            digest.update(json.dumps(_row_values(row), default=str, separators=(',', ':')).encode())
+            digest.update(b'\n')
+    return digest.hexdigest()
+
+
+class PdfCache:
+    """Directory of <key>.pdf files with least-recently-used size eviction"""
+
+    def __init__(self, directory=PDF_CACHE_DIR, max_bytes=PDF_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def path(self, key):
+        return os.path.join(self.directory, f'{key}.pdf')
+
+    def get(self, key):
+        """
+        The cached PDF read into a BytesIO, or None; a hit refreshes its LRU
+        position. Reading it here means a concurrent evict() cannot remove the
+        file between the lookup and the response.
+        """
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as cached:
+                pdf = io.BytesIO(cached.read())
+        except FileNotFoundError:
+            return None
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return pdf
+
+    def put(self, key, data):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(key)
+        fd, partial = tempfile.mkstemp(dir=self.directory, suffix='.part')
+        with os.fdopen(fd, 'wb') as output:
+            output.write(data)
+        os.replace(partial, path)
+        self.evict()
+        return path
+
+    def get_or_render(self, key, render):
+        """BytesIO with the PDF for key, calling render() -> bytes only on a miss"""
+        pdf = self.get(key)
+        if pdf is None:
+            data = render()
+            self.put(key, data)
+            pdf = io.BytesIO(data)
+        return pdf
+
+    def evict(self):
+        """Delete the least recently used files until the cache fits in max_bytes"""
+        with self._lock:
+            try:
+                entries = [entry for entry in os.scandir(self.directory) if entry.name.endswith('.pdf')]
+            except FileNotFoundError:
+                return
+            files = []
+            total = 0
+            for entry in entries:
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+            if total <= self.max_bytes:
+                return
+            for _, size, path in sorted(files):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+                if total <= self.max_bytes:
+                    break
+            logging.info(f"PDF cache evicted down to {total} bytes")
+
+    def clear(self):
+        with self._lock:
+            if os.path.isdir(self.directory):
+                for entry in os.scandir(self.directory):
+                    if entry.name.endswith('.pdf'):
+                        os.remove(entry.path)
+
+
+pdf_cache = PdfCache()
@@ -4,59 +4,229 @@ from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
 from reportlab.lib import colors
 from reportlab.lib.enums import TA_CENTER, TA_LEFT
+from reportlab.pdfgen import canvas
 import io
+import os
+import json
+import math
+import hashlib
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
-from datetime import datetime
+from types import SimpleNamespace
+from pdf_cache import pdf_cache, rows_fingerprint
 
-def create_header_style():
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=18,
-        spaceAfter=30,
-        alignment=TA_CENTER,
-        textColor=colors.HexColor('#2c3e50')
-    )
-    
-    subtitle_style = ParagraphStyle(
-        'CustomSubtitle',
-        parent=styles['Heading2'],
-        fontSize=14,
-        spaceAfter=20,
-        alignment=TA_CENTER,
-        textColor=colors.HexColor('#34495e')
-    )
-    
-    return title_style, subtitle_style
+# pypdf (optional) merges the fragments of parallel general reports
+try:
+    from pypdf import PdfReader, PdfWriter
+except ImportError:
+    PdfReader = PdfWriter = None
 
-def add_header(story, title, subtitle=None):
-    title_style, subtitle_style = create_header_style()
-    
-    # School Header
-    header_text = """
+PDF_RENDER_WORKERS = int(os.environ.get("PDF_RENDER_WORKERS", "0")) or os.cpu_count() or 1
+# Below this many rooms one sequential build beats shipping sections to the pool and merging
+PARALLEL_MIN_ROOMS = int(os.environ.get("PDF_PARALLEL_MIN_ROOMS", "80"))
+
+# Cache keys include this file's contents, so layout changes never serve stale PDFs
+with open(__file__, 'rb') as _source:
+    LAYOUT_VERSION = hashlib.sha256(_source.read()).hexdigest()[:16]
+
+# Style registry: paragraph and table styles are built once at import and shared
+# by every report build; ReportLab only reads them while laying out a document.
+STYLES = getSampleStyleSheet()
+STYLES.add(ParagraphStyle('ReportTitle', parent=STYLES['Heading1'], fontSize=18, spaceAfter=30,
+                          alignment=TA_CENTER, textColor=colors.HexColor('#2c3e50')))
+STYLES.add(ParagraphStyle('ReportSubtitle', parent=STYLES['Heading2'], fontSize=14, spaceAfter=20,
+                          alignment=TA_CENTER, textColor=colors.HexColor('#34495e')))
+STYLES.add(ParagraphStyle('EmptyNote', parent=STYLES['Normal'], fontSize=9,
+                          textColor=colors.HexColor('#64748b'), spaceAfter=15))
+# Incident report (routes.build_incidents_pdf)
+STYLES.add(ParagraphStyle('IncidentTitle', parent=STYLES['Heading1'], fontSize=16, spaceAfter=30,
+                          textColor=colors.HexColor('#1f2937')))
+STYLES.add(ParagraphStyle('IncidentSubtitle', parent=STYLES['Heading2'], fontSize=12, spaceAfter=20,
+                          textColor=colors.HexColor('#374151')))
+STYLES.add(ParagraphStyle('IncidentHeader', parent=STYLES['Heading3'], fontSize=11,
+                          textColor=colors.HexColor('#1f2937')))
+
+TABLE_STYLES = {
+    # generate_classroom_pdf
+    'classroom_info': TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#3b82f6')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 12),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+        ('FONTSIZE', (0, 1), (-1, -1), 10),
+    ]),
+    'classroom_occupancy': TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#10b981')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 10),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor('#f0fdf4')),
+        ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#bbf7d0')),
+        ('FONTSIZE', (0, 1), (-1, -1), 9),
+    ]),
+    'classroom_schedule': TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1e40af')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 9),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 10),
+        ('TOPPADDING', (0, 0), (-1, 0), 8),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor('#f8fafc')),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#cbd5e1')),
+        ('FONTSIZE', (0, 1), (-1, -1), 8),
+        ('LEFTPADDING', (0, 0), (-1, -1), 6),
+        ('RIGHTPADDING', (0, 0), (-1, -1), 6),
+        ('TOPPADDING', (0, 1), (-1, -1), 6),
+        ('BOTTOMPADDING', (0, 1), (-1, -1), 6),
+    ]),
+    # generate_general_report, once per classroom section
+    'section_info': TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#3b82f6')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 9),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.HexColor('#f8fafc'), colors.white]),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#e5e7eb')),
+        ('LEFTPADDING', (0, 0), (-1, -1), 6),
+        ('RIGHTPADDING', (0, 0), (-1, -1), 6),
+        ('TOPPADDING', (0, 0), (-1, -1), 4),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
+    ]),
+    'section_occupancy': TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#10b981')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 9),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.HexColor('#f0fdf4'), colors.white]),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#bbf7d0')),
+        ('LEFTPADDING', (0, 0), (-1, -1), 6),
+        ('RIGHTPADDING', (0, 0), (-1, -1), 6),
+        ('TOPPADDING', (0, 0), (-1, -1), 4),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
+    ]),
+    'section_schedule': TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1e40af')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 8),
+        ('FONTSIZE', (0, 1), (-1, -1), 7),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.HexColor('#f8fafc'), colors.white]),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#cbd5e1')),
+        ('LEFTPADDING', (0, 0), (-1, -1), 4),
+        ('RIGHTPADDING', (0, 0), (-1, -1), 4),
+        ('TOPPADDING', (0, 0), (-1, -1), 3),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 3),
+    ]),
+    # generate_availability_report
+    'availability': TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#7c3aed')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 9),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.white),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ('FONTSIZE', (0, 1), (-1, -1), 8),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ]),
+    'availability_legend': TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#374151')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 10),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (1, 1), (1, 1), colors.HexColor('#dcfce7')),
+        ('BACKGROUND', (1, 2), (1, 2), colors.HexColor('#fecaca')),
+        ('BACKGROUND', (1, 3), (1, 3), colors.HexColor('#f3f4f6')),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ('FONTSIZE', (0, 1), (-1, -1), 9),
+    ]),
+    # routes.build_incidents_pdf
+    'incidents': TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1f2937')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 10),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 1), (-1, -1), 8),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+    ]),
+}
+
+# Cell backgrounds of the availability grid
+AVAILABILITY_COLORS = {
+    'LIVRE': colors.HexColor('#dcfce7'),
+    'OCUPADA': colors.HexColor('#fecaca'),
+    'N/A': colors.HexColor('#f3f4f6'),
+}
+
+SCHOOL_HEADER = """
     <para align="center">
     <font size="20" color="#1e3a8a"><b>ESCOLA SENAI "MORVAN FIGUEIREDO"</b></font><br/>
     <font size="12" color="#475569">Sistema de Gestão de Salas</font>
     </para>
     """
-    story.append(Paragraph(header_text, getSampleStyleSheet()['Normal']))
+
+def create_header_style():
+    return STYLES['ReportTitle'], STYLES['ReportSubtitle']
+
+def add_header(story, title, subtitle=None):
+    # School Header
+    story.append(Paragraph(SCHOOL_HEADER, STYLES['Normal']))
     story.append(Spacer(1, 20))
     
     # Title
-    story.append(Paragraph(title, title_style))
+    story.append(Paragraph(title, STYLES['ReportTitle']))
     
     if subtitle:
-        story.append(Paragraph(subtitle, subtitle_style))
+        story.append(Paragraph(subtitle, STYLES['ReportSubtitle']))
     
     story.append(Spacer(1, 20))
 
-def generate_classroom_pdf(classroom, schedules):
+def add_footer(story, timestamped=True, as_of=None):
+    # Cached reports are served long after rendering: instead of the generation
+    # time they carry as_of, when their newest row last changed
+    if timestamped:
+        footer_text = f"Relatório gerado em {datetime.now().strftime('%d/%m/%Y às %H:%M')}"
+    elif as_of:
+        footer_text = f"Dados atualizados em {as_of.strftime('%d/%m/%Y às %H:%M')}"
+    else:
+        return
+    story.append(Paragraph(footer_text, STYLES['Normal']))
+
+def rows_as_of(*row_groups):
+    """Newest updated_at (or created_at) among the rows, None when none is set"""
+    stamps = [getattr(row, 'updated_at', None) or getattr(row, 'created_at', None)
+              for rows in row_groups for row in rows]
+    return max((stamp for stamp in stamps if stamp), default=None)
+
+def generate_classroom_pdf(classroom, schedules, timestamped=True, as_of=None):
     buffer = io.BytesIO()
     doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=72, leftMargin=72, topMargin=72, bottomMargin=18)
     
     story = []
-    styles = getSampleStyleSheet()
+    styles = STYLES
     
     # Header
     add_header(story, f"Relatório da Sala: {classroom.name}")
@@ -73,18 +243,7 @@ def generate_classroom_pdf(classroom, schedules):
     ]
     
     info_table = Table(info_data, colWidths=[2*inch, 4*inch])
-    info_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#3b82f6')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 12),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-        ('FONTSIZE', (0, 1), (-1, -1), 10),
-    ]))
+    info_table.setStyle(TABLE_STYLES['classroom_info'])
     
     story.append(info_table)
     story.append(Spacer(1, 30))
@@ -106,17 +265,7 @@ def generate_classroom_pdf(classroom, schedules):
     ]
     
     occupancy_table = Table(occupancy_data, colWidths=[2.5*inch, 2*inch])
-    occupancy_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#10b981')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor('#f0fdf4')),
-        ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#bbf7d0')),
-        ('FONTSIZE', (0, 1), (-1, -1), 9),
-    ]))
+    occupancy_table.setStyle(TABLE_STYLES['classroom_occupancy'])
     
     story.append(occupancy_table)
     story.append(Spacer(1, 30))
@@ -151,22 +300,7 @@ def generate_classroom_pdf(classroom, schedules):
             ])
         
         schedule_table = Table(schedule_data, colWidths=[0.9*inch, 0.9*inch, 1.1*inch, 1.8*inch, 1.1*inch])
-        schedule_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1e40af')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 9),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 10),
-            ('TOPPADDING', (0, 0), (-1, 0), 8),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor('#f8fafc')),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#cbd5e1')),
-            ('FONTSIZE', (0, 1), (-1, -1), 8),
-            ('LEFTPADDING', (0, 0), (-1, -1), 6),
-            ('RIGHTPADDING', (0, 0), (-1, -1), 6),
-            ('TOPPADDING', (0, 1), (-1, -1), 6),
-            ('BOTTOMPADDING', (0, 1), (-1, -1), 6),
-        ]))
+        schedule_table.setStyle(TABLE_STYLES['classroom_schedule'])
         
         story.append(schedule_table)
     else:
@@ -175,170 +309,266 @@ def generate_classroom_pdf(classroom, schedules):
     
     # Footer
     story.append(Spacer(1, 50))
-    footer_text = f"Relatório gerado em {datetime.now().strftime('%d/%m/%Y às %H:%M')}"
-    story.append(Paragraph(footer_text, styles['Normal']))
+    add_footer(story, timestamped, as_of)
     
     doc.build(story)
     buffer.seek(0)
     return buffer
 
-def generate_general_report(classrooms, all_schedules):
+def group_schedules(all_schedules):
+    """classroom_id -> schedules, for quick lookup"""
+    schedule_map = {}
+    for schedule in all_schedules:
+        if schedule.classroom_id not in schedule_map:
+            schedule_map[schedule.classroom_id] = []
+        schedule_map[schedule.classroom_id].append(schedule)
+    return schedule_map
+
+def add_classroom_section(story, classroom, classroom_schedules):
+    """Append the general report's section for one classroom"""
+    styles = STYLES
+    
+    # Classroom header
+    classroom_title = Paragraph(f"Sala: {classroom.name}", styles['Heading2'])
+    classroom_title.outline_title = classroom.name  # table of contents entry in parallel builds
+    story.append(classroom_title)
+    story.append(Spacer(1, 12))
+    
+    # Basic info
+    info_data = [
+        ['Informação', 'Detalhes'],
+        ['Nome', classroom.name],
+        ['Capacidade', f'{classroom.capacity} alunos'],
+        ['Localização', classroom.block],
+        ['Computadores', 'Sim' if classroom.has_computers else 'Não'],
+    ]
+    
+    if classroom.software:
+        info_data.append(['Software', classroom.software])
+    
+    info_table = Table(info_data, colWidths=[1.5*inch, 4*inch])
+    info_table.setStyle(TABLE_STYLES['section_info'])
+    
+    story.append(info_table)
+    story.append(Spacer(1, 15))
+    
+    # Occupancy statistics for this classroom
+    total_slots = 23  # 6 days * 4 shifts - 1 (no Saturday night)
+    occupied_slots = len(classroom_schedules)
+    occupancy_rate = (occupied_slots / total_slots * 100) if total_slots > 0 else 0
+    
+    occupancy_data = [
+        ['Métrica', 'Valor'],
+        ['Horários Ocupados', f'{occupied_slots} de {total_slots}'],
+        ['Taxa de Ocupação', f'{occupancy_rate:.1f}%'],
+        ['Status', 'Em uso' if occupied_slots > 0 else 'Disponível']
+    ]
+    
+    occupancy_table = Table(occupancy_data, colWidths=[1.5*inch, 2*inch])
+    occupancy_table.setStyle(TABLE_STYLES['section_occupancy'])
+    
+    story.append(occupancy_table)
+    story.append(Spacer(1, 15))
+    
+    # Schedule details for this classroom
+    if classroom_schedules:
+        story.append(Paragraph("Horários Detalhados", styles['Heading3']))
+        story.append(Spacer(1, 8))
+        
+        days = ['Segunda', 'Terça', 'Quarta', 'Quinta', 'Sexta', 'Sábado']
+        shifts = {'morning': 'Manhã', 'afternoon': 'Tarde', 'fullday': 'Integral', 'night': 'Noite'}
+        
+        schedule_data = [['Dia', 'Turno', 'Curso', 'Instrutor', 'Horário']]
+        
+        for schedule in sorted(classroom_schedules, key=lambda x: (x.day_of_week, x.shift)):
+            course_name = schedule.course_name
+            if len(course_name) > 20:
+                course_name = course_name[:17] + "..."
+            
+            instructor = schedule.instructor or 'N/A'
+            if len(instructor) > 15:
+                instructor = instructor[:12] + "..."
+            
+            schedule_data.append([
+                days[schedule.day_of_week],
+                shifts.get(schedule.shift, schedule.shift),
+                course_name,
+                instructor,
+                f'{schedule.start_time} - {schedule.end_time}'
+            ])
+        
+        schedule_table = Table(schedule_data, colWidths=[0.8*inch, 0.8*inch, 1.8*inch, 1.2*inch, 1*inch])
+        schedule_table.setStyle(TABLE_STYLES['section_schedule'])
+        
+        story.append(schedule_table)
+    else:
+        story.append(Paragraph("Nenhum horário cadastrado para esta sala.", styles['EmptyNote']))
+
+def generate_general_report(classrooms, all_schedules, timestamped=True, as_of=None):
+    if PdfWriter is not None and PDF_RENDER_WORKERS > 1 and len(classrooms) >= PARALLEL_MIN_ROOMS:
+        try:
+            return generate_general_report_parallel(classrooms, all_schedules, timestamped=timestamped, as_of=as_of)
+        except Exception:
+            logging.exception("Parallel general report failed, rendering sequentially")
+    
     buffer = io.BytesIO()
     doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=72, leftMargin=72, topMargin=72, bottomMargin=18)
     
     story = []
-    styles = getSampleStyleSheet()
+    styles = STYLES
     
     # Header
     add_header(story, "Relatório Geral de Salas", f"Total de {len(classrooms)} salas cadastradas")
     
-    # Create schedule map for quick lookup
-    schedule_map = {}
-    for schedule in all_schedules:
-        if schedule.classroom_id not in schedule_map:
-            schedule_map[schedule.classroom_id] = []
-        schedule_map[schedule.classroom_id].append(schedule)
+    schedule_map = group_schedules(all_schedules)
     
     # Detailed report for each classroom
     for i, classroom in enumerate(classrooms):
         if i > 0:
             story.append(Spacer(1, 30))
-        
-        # Classroom header
-        classroom_title = f"Sala: {classroom.name}"
-        story.append(Paragraph(classroom_title, styles['Heading2']))
-        story.append(Spacer(1, 12))
-        
-        # Basic info
-        info_data = [
-            ['Informação', 'Detalhes'],
-            ['Nome', classroom.name],
-            ['Capacidade', f'{classroom.capacity} alunos'],
-            ['Localização', classroom.block],
-            ['Computadores', 'Sim' if classroom.has_computers else 'Não'],
-        ]
-        
-        if classroom.software:
-            info_data.append(['Software', classroom.software])
-        
-        info_table = Table(info_data, colWidths=[1.5*inch, 4*inch])
-        info_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#3b82f6')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), 9),
-            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.HexColor('#f8fafc'), colors.white]),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#e5e7eb')),
-            ('LEFTPADDING', (0, 0), (-1, -1), 6),
-            ('RIGHTPADDING', (0, 0), (-1, -1), 6),
-            ('TOPPADDING', (0, 0), (-1, -1), 4),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
-        ]))
-        
-        story.append(info_table)
-        story.append(Spacer(1, 15))
-        
-        # Occupancy statistics for this classroom
-        classroom_schedules = schedule_map.get(classroom.id, [])
-        total_slots = 23  # 6 days * 4 shifts - 1 (no Saturday night)
-        occupied_slots = len(classroom_schedules)
-        occupancy_rate = (occupied_slots / total_slots * 100) if total_slots > 0 else 0
-        
-        occupancy_data = [
-            ['Métrica', 'Valor'],
-            ['Horários Ocupados', f'{occupied_slots} de {total_slots}'],
-            ['Taxa de Ocupação', f'{occupancy_rate:.1f}%'],
-            ['Status', 'Em uso' if occupied_slots > 0 else 'Disponível']
-        ]
-        
-        occupancy_table = Table(occupancy_data, colWidths=[1.5*inch, 2*inch])
-        occupancy_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#10b981')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), 9),
-            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.HexColor('#f0fdf4'), colors.white]),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#bbf7d0')),
-            ('LEFTPADDING', (0, 0), (-1, -1), 6),
-            ('RIGHTPADDING', (0, 0), (-1, -1), 6),
-            ('TOPPADDING', (0, 0), (-1, -1), 4),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
-        ]))
-        
-        story.append(occupancy_table)
-        story.append(Spacer(1, 15))
-        
-        # Schedule details for this classroom
-        if classroom_schedules:
-            story.append(Paragraph("Horários Detalhados", styles['Heading3']))
-            story.append(Spacer(1, 8))
-            
-            days = ['Segunda', 'Terça', 'Quarta', 'Quinta', 'Sexta', 'Sábado']
-            shifts = {'morning': 'Manhã', 'afternoon': 'Tarde', 'fullday': 'Integral', 'night': 'Noite'}
-            
-            schedule_data = [['Dia', 'Turno', 'Curso', 'Instrutor', 'Horário']]
-            
-            for schedule in sorted(classroom_schedules, key=lambda x: (x.day_of_week, x.shift)):
-                course_name = schedule.course_name
-                if len(course_name) > 20:
-                    course_name = course_name[:17] + "..."
-                
-                instructor = schedule.instructor or 'N/A'
-                if len(instructor) > 15:
-                    instructor = instructor[:12] + "..."
-                
-                schedule_data.append([
-                    days[schedule.day_of_week],
-                    shifts.get(schedule.shift, schedule.shift),
-                    course_name,
-                    instructor,
-                    f'{schedule.start_time} - {schedule.end_time}'
-                ])
-            
-            schedule_table = Table(schedule_data, colWidths=[0.8*inch, 0.8*inch, 1.8*inch, 1.2*inch, 1*inch])
-            schedule_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1e40af')),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 8),
-                ('FONTSIZE', (0, 1), (-1, -1), 7),
-                ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.HexColor('#f8fafc'), colors.white]),
-                ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#cbd5e1')),
-                ('LEFTPADDING', (0, 0), (-1, -1), 4),
-                ('RIGHTPADDING', (0, 0), (-1, -1), 4),
-                ('TOPPADDING', (0, 0), (-1, -1), 3),
-                ('BOTTOMPADDING', (0, 0), (-1, -1), 3),
-            ]))
-            
-            story.append(schedule_table)
-        else:
-            empty_style = ParagraphStyle(
-                'Empty',
-                parent=styles['Normal'],
-                fontSize=9,
-                textColor=colors.HexColor('#64748b'),
-                spaceAfter=15
-            )
-            story.append(Paragraph("Nenhum horário cadastrado para esta sala.", empty_style))
+        add_classroom_section(story, classroom, schedule_map.get(classroom.id, []))
     
     # Footer
     story.append(Spacer(1, 30))
-    footer_text = f"Relatório gerado em {datetime.now().strftime('%d/%m/%Y às %H:%M')}"
-    story.append(Paragraph(footer_text, styles['Normal']))
+    add_footer(story, timestamped, as_of)
+    
+    doc.build(story)
+    buffer.seek(0)
+    return buffer
+
+# Parallel general report: classroom sections are rendered in a process pool as
+# separate PDF fragments, then merged behind a cover page with a table of
+# contents; page numbers are stamped on the merged document.
+
+CLASSROOM_FIELDS = ('id', 'name', 'capacity', 'block', 'has_computers', 'software')
+SCHEDULE_FIELDS = ('classroom_id', 'day_of_week', 'shift', 'course_name', 'instructor', 'start_time', 'end_time')
+
+class _OutlineDocTemplate(SimpleDocTemplate):
+    """Records the page of every flowable carrying an outline_title"""
     
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.outline = []
+    
+    def afterFlowable(self, flowable):
+        title = getattr(flowable, 'outline_title', None)
+        if title:
+            self.outline.append((title, self.page - 1))
+
+def _new_doc(buffer):
+    return _OutlineDocTemplate(buffer, pagesize=A4, rightMargin=72, leftMargin=72, topMargin=72, bottomMargin=18)
+
+def render_section_chunk(sections):
+    """Worker: render [(classroom, schedules)] given as plain dicts; returns (pdf bytes, pages, outline)"""
+    buffer = io.BytesIO()
+    doc = _new_doc(buffer)
+    story = []
+    for i, (classroom, schedules) in enumerate(sections):
+        if i > 0:
+            story.append(Spacer(1, 30))
+        add_classroom_section(story, SimpleNamespace(**classroom), [SimpleNamespace(**s) for s in schedules])
+    doc.build(story)
+    return buffer.getvalue(), doc.page, doc.outline
+
+# Forked children of a threaded worker can inherit locks held by other threads;
+# forkserver (spawn where unavailable) starts them from a clean process instead
+_POOL_START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+_render_pool = None
+_render_pool_lock = threading.Lock()
+
+def _get_render_pool():
+    """Section render pool of this process, started on first use and shared by every report"""
+    global _render_pool
+    with _render_pool_lock:
+        if _render_pool is None:
+            _render_pool = ProcessPoolExecutor(max_workers=PDF_RENDER_WORKERS,
+                                               mp_context=multiprocessing.get_context(_POOL_START_METHOD))
+        return _render_pool
+
+def _discard_render_pool(pool):
+    """Drop a broken pool so the next report starts a fresh one"""
+    global _render_pool
+    with _render_pool_lock:
+        if _render_pool is pool:
+            _render_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def _render_cover(total_rooms, toc_rows, timestamped=True, as_of=None):
+    buffer = io.BytesIO()
+    story = []
+    add_header(story, "Relatório Geral de Salas", f"Total de {total_rooms} salas cadastradas")
+    story.append(Paragraph("<b>Índice</b>", STYLES['Heading3']))
+    story.append(Spacer(1, 8))
+    toc_table = Table([['Sala', 'Página']] + toc_rows, colWidths=[4*inch, 1.2*inch], repeatRows=1)
+    toc_table.setStyle(TABLE_STYLES['section_info'])
+    story.append(toc_table)
+    story.append(Spacer(1, 30))
+    add_footer(story, timestamped, as_of)
+    doc = _new_doc(buffer)
     doc.build(story)
+    return buffer.getvalue(), doc.page
+
+def _page_number_overlay(total_pages):
+    buffer = io.BytesIO()
+    overlay = canvas.Canvas(buffer, pagesize=A4)
+    overlay.setFont('Helvetica', 8)
+    for number in range(1, total_pages + 1):
+        overlay.drawCentredString(A4[0] / 2, 20, f"Página {number} de {total_pages}")
+        overlay.showPage()
+    overlay.save()
+    return PdfReader(io.BytesIO(buffer.getvalue()))
+
+def generate_general_report_parallel(classrooms, all_schedules, workers=None, timestamped=True, as_of=None):
+    workers = workers or PDF_RENDER_WORKERS
+    schedule_map = group_schedules(all_schedules)
+    sections = [
+        ({field: getattr(classroom, field) for field in CLASSROOM_FIELDS},
+         [{field: getattr(schedule, field) for field in SCHEDULE_FIELDS} for schedule in schedule_map.get(classroom.id, [])])
+        for classroom in classrooms
+    ]
+    # About two chunks per worker keeps the pool busy when chunk sizes vary
+    chunk_size = max(1, math.ceil(len(sections) / (workers * 2)))
+    chunks = [sections[start:start + chunk_size] for start in range(0, len(sections), chunk_size)]
+    pool = _get_render_pool()
+    try:
+        fragments = list(pool.map(render_section_chunk, chunks))
+    except BrokenProcessPool:
+        _discard_render_pool(pool)
+        raise
+    
+    # Section pages (0-based) counted from the end of the cover
+    outline = []
+    offset = 0
+    for _, pages, chunk_outline in fragments:
+        outline.extend((title, offset + page) for title, page in chunk_outline)
+        offset += pages
+    
+    # The cover's own length shifts every entry; its layout does not depend on the numbers
+    _, cover_pages = _render_cover(len(classrooms), [[title, '0000'] for title, _ in outline], timestamped, as_of)
+    cover, _ = _render_cover(len(classrooms), [[title, str(cover_pages + page + 1)] for title, page in outline], timestamped, as_of)
+    
+    writer = PdfWriter()
+    for pdf_bytes in [cover] + [pdf_bytes for pdf_bytes, _, _ in fragments]:
+        for page in PdfReader(io.BytesIO(pdf_bytes)).pages:
+            writer.add_page(page)
+    
+    numbers = _page_number_overlay(len(writer.pages))
+    for page, number_page in zip(writer.pages, numbers.pages):
+        page.merge_page(number_page)
+    for title, page in outline:
+        writer.add_outline_item(title, cover_pages + page)
+    
+    buffer = io.BytesIO()
+    writer.write(buffer)
     buffer.seek(0)
     return buffer
 
-def generate_availability_report(classrooms, schedules):
+def generate_availability_report(classrooms, schedules, timestamped=True, as_of=None):
     buffer = io.BytesIO()
     doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=72, leftMargin=72, topMargin=72, bottomMargin=18)
     
     story = []
-    styles = getSampleStyleSheet()
+    styles = STYLES
     
     # Header
     add_header(story, "Relatório de Disponibilidade de Salas")
@@ -361,7 +591,7 @@ def generate_availability_report(classrooms, schedules):
         data = [['Sala'] + [shift_names[shift] for shift in shifts]]
         
         for classroom in classrooms:
-            row = [f"{classroom.name} ({classroom.block}{classroom.floor})"]
+            row = [f"{classroom.name} ({classroom.block})"]
             
             for shift in shifts:
                 # Skip night shift for Saturday
@@ -379,35 +609,16 @@ def generate_availability_report(classrooms, schedules):
             data.append(row)
         
         table = Table(data, colWidths=[2*inch, 1.2*inch, 1.2*inch, 1.2*inch, 1.2*inch])
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#7c3aed')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 9),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ('FONTSIZE', (0, 1), (-1, -1), 8),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ]))
+        table.setStyle(TABLE_STYLES['availability'])
         
-        # Color coding for availability
+        # Color coding for availability, applied as a single batch of cell commands
+        cell_colors = []
         for row_idx in range(1, len(data)):
             for col_idx in range(1, len(data[row_idx])):
-                cell_value = data[row_idx][col_idx]
-                if 'LIVRE' in cell_value:
-                    table.setStyle(TableStyle([
-                        ('BACKGROUND', (col_idx, row_idx), (col_idx, row_idx), colors.HexColor('#dcfce7'))
-                    ]))
-                elif 'OCUPADA' in cell_value:
-                    table.setStyle(TableStyle([
-                        ('BACKGROUND', (col_idx, row_idx), (col_idx, row_idx), colors.HexColor('#fecaca'))
-                    ]))
-                elif 'N/A' in cell_value:
-                    table.setStyle(TableStyle([
-                        ('BACKGROUND', (col_idx, row_idx), (col_idx, row_idx), colors.HexColor('#f3f4f6'))
-                    ]))
+                status = data[row_idx][col_idx].split('\n', 1)[0]
+                if status in AVAILABILITY_COLORS:
+                    cell_colors.append(('BACKGROUND', (col_idx, row_idx), (col_idx, row_idx), AVAILABILITY_COLORS[status]))
+        table.setStyle(cell_colors)
         
         story.append(table)
         story.append(Spacer(1, 20))
@@ -422,27 +633,35 @@ def generate_availability_report(classrooms, schedules):
     ]
     
     legend_table = Table(legend_data, colWidths=[1*inch, 0.8*inch, 2.5*inch])
-    legend_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#374151')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (1, 1), (1, 1), colors.HexColor('#dcfce7')),
-        ('BACKGROUND', (1, 2), (1, 2), colors.HexColor('#fecaca')),
-        ('BACKGROUND', (1, 3), (1, 3), colors.HexColor('#f3f4f6')),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ('FONTSIZE', (0, 1), (-1, -1), 9),
-    ]))
+    legend_table.setStyle(TABLE_STYLES['availability_legend'])
     
     story.append(legend_table)
     
     # Footer
     story.append(Spacer(1, 30))
-    footer_text = f"Relatório gerado em {datetime.now().strftime('%d/%m/%Y às %H:%M')}"
-    story.append(Paragraph(footer_text, styles['Normal']))
+    add_footer(story, timestamped, as_of)
     
     doc.build(story)
     buffer.seek(0)
     return buffer
+
+# Cached rendering: (cache key, PDF BytesIO); the key is also the download's ETag
+
+def report_cache_key(kind, params, *row_groups):
+    raw = json.dumps([kind, params, LAYOUT_VERSION, rows_fingerprint(*row_groups)], separators=(',', ':'))
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+def cached_classroom_pdf(classroom, schedules):
+    key = report_cache_key('classroom', {'classroom_id': classroom.id}, [classroom], schedules)
+    return key, pdf_cache.get_or_render(key, lambda: generate_classroom_pdf(
+        classroom, schedules, timestamped=False, as_of=rows_as_of([classroom], schedules)).getvalue())
+
+def cached_general_report(classrooms, schedules):
+    key = report_cache_key('general', {}, classrooms, schedules)
+    return key, pdf_cache.get_or_render(key, lambda: generate_general_report(
+        classrooms, schedules, timestamped=False, as_of=rows_as_of(classrooms, schedules)).getvalue())
+
+def cached_availability_report(classrooms, schedules):
+    key = report_cache_key('availability', {}, classrooms, schedules)
+    return key, pdf_cache.get_or_render(key, lambda: generate_availability_report(
+        classrooms, schedules, timestamped=False, as_of=rows_as_of(classrooms, schedules)).getvalue())
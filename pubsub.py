@@ -0,0 +1,205 @@
+"""
+Publish/subscribe for Server-Sent Events.
+
+Routes publish small JSON messages on named channels (e.g. "attendance:12")
+after committing a change; SSE endpoints hold a Subscription per open
+connection and stream what arrives. Two brokers are available, chosen by
+PUBSUB_BROKER:
+
+- "memory": fan-out inside the worker process. Enough for a single gunicorn
+  worker (or the development server).
+- "postgres": messages go through PostgreSQL LISTEN/NOTIFY, so a change made
+  in one gunicorn worker reaches subscribers connected to any other worker.
+  Each worker runs one listener thread that feeds its local subscribers.
+
+The default is "postgres" when DATABASE_URL points at PostgreSQL and "memory"
+otherwise. SSE connections stay open, so run gunicorn with threaded workers
+(--worker-class gthread --threads N); a sync worker is blocked by each stream.
+"""
+import os
+import json
+import queue
+import select
+import logging
+import threading
+
+PUBSUB_BROKER = os.environ.get("PUBSUB_BROKER") or (
+    'postgres' if os.environ.get("DATABASE_URL", "").startswith(('postgres://', 'postgresql')) else 'memory')
+
+# Messages waiting for one slow client before it is told to resynchronize
+SUBSCRIPTION_QUEUE_SIZE = 256
+
+# PostgreSQL NOTIFY channel shared by every worker
+NOTIFY_CHANNEL = 'salas_pubsub'
+# pg_notify rejects payloads of 8000 bytes or more: publish ids and cursors, not data
+NOTIFY_MAX_PAYLOAD = 7999
+LISTEN_POLL_SECONDS = 5
+
+RESYNC = {'event': 'resync'}
+
+
+class Subscription:
+    """Queue of messages for one channel; iterate with get(timeout)"""
+
+    def __init__(self, broker, channel):
+        self.broker = broker
+        self.channel = channel
+        self._queue = queue.Queue(maxsize=SUBSCRIPTION_QUEUE_SIZE)
+        self._overflowed = False
+
+    def put(self, message):
+        try:
+            self._queue.put_nowait(message)
+        except queue.Full:
+            self._overflowed = True
+
+    def get(self, timeout=None):
+        """Next message, RESYNC after dropped messages, or None on timeout"""
+        if self._overflowed:
+            self._overflowed = False
+            with self._queue.mutex:
+                self._queue.queue.clear()
+            return RESYNC
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class MemoryBroker:
+    """In-process fan-out to the subscriptions of each channel"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._channels = {}
+
+    def subscribe(self, channel):
+        subscription = Subscription(self, channel)
+        with self._lock:
+            self._channels.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._channels.get(subscription.channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._channels[subscription.channel]
+
+    def subscriber_count(self, channel=None):
+        with self._lock:
+            if channel is not None:
+                return len(self._channels.get(channel, ()))
+            return sum(len(subscribers) for subscribers in self._channels.values())
+
+    def deliver(self, channel, message):
+        with self._lock:
+            subscribers = list(self._channels.get(channel, ()))
+        for subscription in subscribers:
+            subscription.put(message)
+
+    def publish(self, channel, message):
+        self.deliver(channel, message)
+
+
+class PostgresBroker(MemoryBroker):
+    """Fan-out across workers through LISTEN/NOTIFY; local delivery comes from the listener"""
+
+    def __init__(self, engine):
+        super().__init__()
+        self.engine = engine
+        self._listener = None
+        self._listener_lock = threading.Lock()
+
+    def subscribe(self, channel):
+        self._ensure_listener()
+        return super().subscribe(channel)
+
+    def publish(self, channel, message):
+        from sqlalchemy import text
+
+        payload = json.dumps({'channel': channel, 'message': message}, default=str)
+        if len(payload.encode()) > NOTIFY_MAX_PAYLOAD:
+            raise ValueError(f"pub/sub message of {len(payload.encode())} bytes exceeds the NOTIFY limit")
+        with self.engine.begin() as conn:
+            conn.execute(text("SELECT pg_notify(:channel, :payload)"),
+                         {'channel': NOTIFY_CHANNEL, 'payload': payload})
+
+    def _ensure_listener(self):
+        # Started lazily so every gunicorn worker gets its own thread after fork
+        with self._listener_lock:
+            if self._listener is None or not self._listener.is_alive():
+                self._listener = threading.Thread(target=self._listen, name='pubsub-listener', daemon=True)
+                self._listener.start()
+
+    def _listen(self):
+        while True:
+            try:
+                raw = self.engine.raw_connection()
+                try:
+                    connection = raw.driver_connection
+                    connection.autocommit = True
+                    with connection.cursor() as cursor:
+                        cursor.execute(f"LISTEN {NOTIFY_CHANNEL}")
+                    while True:
+                        if select.select([connection], [], [], LISTEN_POLL_SECONDS) == ([], [], []):
+                            continue
+                        connection.poll()
+                        while connection.notifies:
+                            notify = connection.notifies.pop(0)
+                            data = json.loads(notify.payload)
+                            self.deliver(data['channel'], data['message'])
+                finally:
+                    raw.invalidate()
+            except Exception as e:
+                logging.error(f"Pub/sub listener error, reconnecting: {e}")
+                threading.Event().wait(LISTEN_POLL_SECONDS)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            if PUBSUB_BROKER == 'postgres':
+                from app import db
+                _broker = PostgresBroker(db.engine)
+            else:
+                _broker = MemoryBroker()
+        return _broker
+
+
+def publish(channel, message):
+    """Send a message to every subscriber of the channel; errors are logged, not raised"""
+    try:
+        get_broker().publish(channel, message)
+    except Exception as e:
+        logging.error(f"Error publishing to {channel}: {e}")
+
+
+def subscribe(channel):
+    return get_broker().subscribe(channel)
+
+
+def sse_event(data, event=None, event_id=None):
+    """One Server-Sent Events frame"""
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    if event:
+        lines.append(f'event: {event}')
+    lines.append(f'data: {json.dumps(data, default=str)}')
+    return '\n'.join(lines) + '\n\n'
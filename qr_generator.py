@@ -1,13 +1,68 @@
+"""
+QR code labels for classroom doors.
+
+Fonts are loaded once per process and rendered PNGs are kept in a small LRU
+cache per classroom, tagged with the URL and name they were drawn with, so a
+renamed room is redrawn on its next request. Batches (every room of the
+school) render their cache misses over a process pool and are laid out as a
+printable multi-page PDF or packed into a ZIP. The pool is started once per
+process from a forkserver (spawn where unavailable): forking a threaded
+gunicorn worker could copy locks held by its other threads.
+
+This module must not import the Flask app: pool workers import it on their own.
+"""
+import io
+import os
+import zipfile
+import threading
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+
 import qrcode
 from PIL import Image, ImageDraw, ImageFont
-import io
-from flask import Flask, Response
 
-app = Flask(__name__)
+QR_CACHE_SIZE = int(os.environ.get("QR_CACHE_SIZE", "512"))
+QR_WORKERS = int(os.environ.get("QR_WORKERS", "0")) or os.cpu_count() or 1
 
-def generate_qr_code(url, classroom_name):
-    """Generate QR code with classroom information"""
-    # Create QR code
+# Below this many labels shipping them to the pool costs more than it saves
+POOL_THRESHOLD = 24
+
+# Printable sheet: A4 portrait, LABEL_COLUMNS x LABEL_ROWS labels per page
+LABEL_COLUMNS = 2
+LABEL_ROWS = 3
+
+SCHOOL_TEXT = "SENAI Morvan Figueiredo"
+INSTRUCTION_TEXT = "Escaneie para acessar informações da sala"
+
+_FONT_CANDIDATES = (
+    ("/usr/share/fonts/truetype/liberation/LiberationSans-Bold.ttf",
+     "/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf"),
+    ("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf",
+     "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf"),
+)
+
+
+@lru_cache(maxsize=1)
+def _fonts():
+    """(title, subtitle) fonts, read from disk once per process"""
+    for bold, regular in _FONT_CANDIDATES:
+        try:
+            return ImageFont.truetype(bold, 16), ImageFont.truetype(regular, 12)
+        except OSError:
+            continue
+    return ImageFont.load_default(), ImageFont.load_default()
+
+
+def _draw_centered(draw, width, y, text, font, fill):
+    bbox = draw.textbbox((0, 0), text, font=font)
+    draw.text(((width - (bbox[2] - bbox[0])) // 2, y), text, fill=fill, font=font)
+
+
+def render_qr_png(url, classroom_name):
+    """PNG bytes of a door label: school name, classroom name, QR code and instructions"""
     qr = qrcode.QRCode(
         version=1,
         error_correction=qrcode.constants.ERROR_CORRECT_L,
@@ -19,72 +74,172 @@ def generate_qr_code(url, classroom_name):
 
     # Create QR code image and convert to RGB so it can be pasted
     qr_img = qr.make_image(fill_color="black", back_color="white").convert("RGB")
-    
-    # Create a larger image to add text
+
+    # Leave 40px above the code for the titles and 40px below for the instructions
     width, height = qr_img.size
-    new_width = width
-    new_height = height + 80  # Add space for text
-    
-    # Create new image with white background
-    img = Image.new('RGB', (new_width, new_height), 'white')
-    
-    # Paste QR code
+    new_height = height + 80
+    img = Image.new('RGB', (width, new_height), 'white')
     img.paste(qr_img, (0, 40))
-    
-    # Add text
+
     draw = ImageDraw.Draw(img)
-    
-    try:
-        # Try to use a nice font
-        font_title = ImageFont.truetype("/usr/share/fonts/truetype/liberation/LiberationSans-Bold.ttf", 16)
-        font_subtitle = ImageFont.truetype("/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf", 12)
-    except:
-        try:
-            # Try DejaVu fonts as fallback
-            font_title = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", 16)
-            font_subtitle = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", 12)
-        except:
-            # Fallback to default font
-            font_title = ImageFont.load_default()
-            font_subtitle = ImageFont.load_default()
-    
-    # School name
-    school_text = "SENAI Morvan Figueiredo"
-    bbox = draw.textbbox((0, 0), school_text, font=font_title)
-    text_width = bbox[2] - bbox[0]
-    x = (new_width - text_width) // 2
-    draw.text((x, 5), school_text, fill="black", font=font_title)
-    
-    # Classroom name
-    classroom_text = classroom_name
-    bbox = draw.textbbox((0, 0), classroom_text, font=font_subtitle)
-    text_width = bbox[2] - bbox[0]
-    x = (new_width - text_width) // 2
-    draw.text((x, 25), classroom_text, fill="black", font=font_subtitle)
-    
-    # Instructions at bottom
-    instruction_text = "Escaneie para acessar informações da sala"
-    bbox = draw.textbbox((0, 0), instruction_text, font=font_subtitle)
-    text_width = bbox[2] - bbox[0]
-    x = (new_width - text_width) // 2
-    draw.text((x, new_height - 20), instruction_text, fill="gray", font=font_subtitle)
-    
-    # Save to buffer
+    font_title, font_subtitle = _fonts()
+    _draw_centered(draw, width, 5, SCHOOL_TEXT, font_title, "black")
+    _draw_centered(draw, width, 25, classroom_name, font_subtitle, "black")
+    _draw_centered(draw, width, new_height - 20, INSTRUCTION_TEXT, font_subtitle, "gray")
+
     buffer = io.BytesIO()
     img.save(buffer, format='PNG')
-    buffer.seek(0)
-    
-    return buffer
-
-# Exemplo de rota Flask para servir o QR Code
-@app.route('/generate_qr/<int:id>')
-def generate_qr(id):
-    # Para exemplo, vamos simular url e nome da sala
-    classroom_url = f"https://example.com/classroom/{id}"
-    classroom_name = f"Sala {id}"
-    
-    qr_buffer = generate_qr_code(classroom_url, classroom_name)
-    return Response(qr_buffer.getvalue(), mimetype='image/png')
-
-if __name__ == '__main__':
-    app.run(debug=True)
+    return buffer.getvalue()
+
+
+def generate_qr_code(url, classroom_name):
+    """Generate QR code with classroom information (PNG in a BytesIO)"""
+    return io.BytesIO(render_qr_png(url, classroom_name))
+
+
+class QrPngCache:
+    """LRU of classroom_id -> (url, name, png); an entry only matches its own url and name"""
+
+    def __init__(self, max_entries=QR_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, classroom_id, url, name):
+        with self._lock:
+            entry = self._entries.get(classroom_id)
+            if entry is None or entry[0] != url or entry[1] != name:
+                return None
+            self._entries.move_to_end(classroom_id)
+            return entry[2]
+
+    def put(self, classroom_id, url, name, png):
+        with self._lock:
+            self._entries[classroom_id] = (url, name, png)
+            self._entries.move_to_end(classroom_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, classroom_id=None):
+        with self._lock:
+            if classroom_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(classroom_id, None)
+
+
+qr_cache = QrPngCache()
+
+
+def cached_qr_png(classroom_id, url, classroom_name):
+    """PNG bytes of a classroom's label, rendered only when missing or renamed"""
+    png = qr_cache.get(classroom_id, url, classroom_name)
+    if png is None:
+        png = render_qr_png(url, classroom_name)
+        qr_cache.put(classroom_id, url, classroom_name, png)
+    return png
+
+
+def _render_label(label):
+    return render_qr_png(label[1], label[2])
+
+
+_POOL_START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    """Label render pool of this process, started on first use"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=QR_WORKERS,
+                                        mp_context=multiprocessing.get_context(_POOL_START_METHOD))
+        return _pool
+
+
+def _discard_pool(pool):
+    """Drop a broken pool so the next batch starts a fresh one"""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def render_qr_batch(labels, workers=QR_WORKERS):
+    """
+    PNG bytes for every (classroom_id, url, name) label, in order. Cached labels
+    are reused; misses are rendered in a process pool for large batches.
+    """
+    labels = list(labels)
+    pngs = [qr_cache.get(*label) for label in labels]
+    missing = [index for index, png in enumerate(pngs) if png is None]
+    todo = [labels[index] for index in missing]
+    if workers <= 1 or len(todo) < POOL_THRESHOLD:
+        rendered = [_render_label(label) for label in todo]
+    else:
+        workers = min(workers, QR_WORKERS, len(todo))
+        pool = _get_pool()
+        try:
+            rendered = list(pool.map(_render_label, todo, chunksize=max(1, len(todo) // (workers * 4))))
+        except BrokenProcessPool:
+            _discard_pool(pool)
+            rendered = [_render_label(label) for label in todo]
+    for index, png in zip(missing, rendered):
+        pngs[index] = png
+        qr_cache.put(*labels[index], png)
+    return pngs
+
+
+def qr_filename(classroom_name):
+    return f'qr_sala_{classroom_name.replace(" ", "_").replace("/", "_")}.png'
+
+
+def write_qr_zip(labels, pngs, output):
+    """One PNG per label; PNGs are already compressed, so entries are stored as is"""
+    seen = set()
+    with zipfile.ZipFile(output, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for (classroom_id, _, name), png in zip(labels, pngs):
+            filename = qr_filename(name)
+            if filename in seen:
+                filename = f'{classroom_id}_{filename}'
+            seen.add(filename)
+            archive.writestr(filename, png)
+
+
+def write_qr_sheet(labels, pngs, output):
+    """Printable A4 pages of LABEL_COLUMNS x LABEL_ROWS labels with dashed cut lines"""
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.units import cm
+    from reportlab.lib.utils import ImageReader
+    from reportlab.pdfgen import canvas
+
+    page_width, page_height = A4
+    margin = 1 * cm
+    cell_width = (page_width - 2 * margin) / LABEL_COLUMNS
+    cell_height = (page_height - 2 * margin) / LABEL_ROWS
+    per_page = LABEL_COLUMNS * LABEL_ROWS
+
+    pdf = canvas.Canvas(output, pagesize=A4)
+    pdf.setTitle('QR Codes das Salas')
+    pdf.setDash(3, 3)
+    pdf.setStrokeGray(0.7)
+    for index, png in enumerate(pngs):
+        slot = index % per_page
+        if index and not slot:
+            pdf.showPage()
+            pdf.setDash(3, 3)
+            pdf.setStrokeGray(0.7)
+        col, row = slot % LABEL_COLUMNS, slot // LABEL_COLUMNS
+        x = margin + col * cell_width
+        y = page_height - margin - (row + 1) * cell_height
+        pdf.rect(x, y, cell_width, cell_height)
+
+        image = ImageReader(io.BytesIO(png))
+        image_width, image_height = image.getSize()
+        scale = min((cell_width - 0.6 * cm) / image_width, (cell_height - 0.6 * cm) / image_height)
+        width, height = image_width * scale, image_height * scale
+        pdf.drawImage(image, x + (cell_width - width) / 2, y + (cell_height - height) / 2, width, height)
+    pdf.save()
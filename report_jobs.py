@@ -0,0 +1,162 @@
+"""
+Background report jobs.
+
+PDF and Excel reports can take seconds of ReportLab/openpyxl work. Instead of
+holding a gunicorn worker for that long, a report route can enqueue a job: the
+request returns a job id at once, a small thread pool renders the report, and
+the client polls /jobs/<id> until the artifact is ready to download.
+
+Job state is kept in the report_job table, so any worker can answer a status
+poll; artifacts are files in REPORT_JOB_DIR, removed together with their rows
+once REPORT_JOB_TTL has passed.
+"""
+import os
+import json
+import uuid
+import logging
+import tempfile
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from app import app, db
+from models import ReportJob
+
+REPORT_JOB_WORKERS = int(os.environ.get("REPORT_JOB_WORKERS", "2"))
+REPORT_JOB_TTL = timedelta(seconds=int(os.environ.get("REPORT_JOB_TTL", "3600")))
+REPORT_JOB_DIR = os.environ.get("REPORT_JOB_DIR") or os.path.join(tempfile.gettempdir(), 'salas_report_jobs')
+
+# Jobs queued or running for longer than this were lost (e.g. the worker restarted)
+STALE_AFTER = timedelta(minutes=15)
+
+ReportArtifact = namedtuple('ReportArtifact', ['filename', 'mimetype'])
+
+_builders = {}
+_executor = None
+
+
+def report_job(kind):
+    """
+    Register a report builder for background jobs.
+
+    A builder receives the job params (a JSON-compatible dict) and a binary file
+    object to write the report to, and returns a ReportArtifact. It runs inside
+    an app context but without a request, so everything it needs must be in params.
+    """
+    def decorator(func):
+        _builders[kind] = func
+        return func
+    return decorator
+
+
+def _get_executor():
+    # Created lazily so every gunicorn worker gets its own threads after fork
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=REPORT_JOB_WORKERS, thread_name_prefix='report-job')
+    return _executor
+
+
+def result_path(job_id):
+    return os.path.join(REPORT_JOB_DIR, f'{job_id}.bin')
+
+
+def enqueue_report(kind, params=None, owner_id=None):
+    """Record a queued job and hand it to the pool; returns the ReportJob"""
+    if kind not in _builders:
+        raise KeyError(f'unknown report kind: {kind}')
+    purge_expired_jobs()
+    job = ReportJob(id=uuid.uuid4().hex, kind=kind, params=json.dumps(params or {}),
+                    status='queued', owner_id=owner_id)
+    db.session.add(job)
+    db.session.commit()
+    _get_executor().submit(_run_job, job.id)
+    return job
+
+
+def _run_job(job_id):
+    with app.app_context():
+        try:
+            job = db.session.get(ReportJob, job_id)
+            if job is None:
+                return
+            job.status = 'running'
+            job.started_at = datetime.utcnow()
+            db.session.commit()
+
+            os.makedirs(REPORT_JOB_DIR, exist_ok=True)
+            path = result_path(job_id)
+            partial = path + '.part'
+            with open(partial, 'wb') as output:
+                artifact = _builders[job.kind](json.loads(job.params or '{}'), output)
+            os.replace(partial, path)
+
+            job.status = 'done'
+            job.filename = artifact.filename
+            job.mimetype = artifact.mimetype
+            job.size = os.path.getsize(path)
+            job.finished_at = datetime.utcnow()
+            job.expires_at = job.finished_at + REPORT_JOB_TTL
+            db.session.commit()
+        except Exception as e:
+            logging.exception(f"Report job {job_id} failed")
+            db.session.rollback()
+            _remove_file(result_path(job_id) + '.part')
+            job = db.session.get(ReportJob, job_id)
+            if job is None:
+                _remove_file(result_path(job_id))  # Purged meanwhile, e.g. its owner was deleted
+            else:
+                job.status = 'failed'
+                job.error = str(e)[:500]
+                job.finished_at = datetime.utcnow()
+                job.expires_at = job.finished_at + REPORT_JOB_TTL
+                db.session.commit()
+        finally:
+            db.session.remove()
+
+
+def load_job(job_id):
+    """The job with this id, or None when unknown or expired; lost jobs are marked failed"""
+    job = db.session.get(ReportJob, job_id)
+    if job is None:
+        return None
+    now = datetime.utcnow()
+    if job.expires_at and job.expires_at < now:
+        return None
+    if job.status in ('queued', 'running') and job.created_at and job.created_at < now - STALE_AFTER:
+        job.status = 'failed'
+        job.error = 'Tempo esgotado ao gerar o relatório'
+        job.finished_at = now
+        job.expires_at = now + REPORT_JOB_TTL
+        db.session.commit()
+    return job
+
+
+def purge_expired_jobs():
+    """Delete expired jobs and their artifacts"""
+    expired = db.session.query(ReportJob.id).filter(ReportJob.expires_at < datetime.utcnow()).all()
+    if not expired:
+        return 0
+    ids = [job_id for job_id, in expired]
+    for job_id in ids:
+        _remove_file(result_path(job_id))
+    ReportJob.query.filter(ReportJob.id.in_(ids)).delete(synchronize_session=False)
+    db.session.commit()
+    return len(ids)
+
+
+def purge_user_jobs(user_id):
+    """Delete a user's jobs and artifacts before the user row; the caller commits"""
+    ids = [job_id for job_id, in db.session.query(ReportJob.id).filter_by(owner_id=user_id)]
+    for job_id in ids:
+        _remove_file(result_path(job_id))
+    if ids:
+        ReportJob.query.filter(ReportJob.id.in_(ids)).delete(synchronize_session=False)
+    return len(ids)
+
+
+def _remove_file(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
@@ -1,13 +1,26 @@
 import os
 import sys
 import json
-from flask import render_template, request, redirect, url_for, flash, session, jsonify, send_file, make_response
+from flask import render_template, request, redirect, url_for, flash, session, jsonify, send_file, make_response, Response
 from app import app, db
-from models import Classroom, Schedule, Incident, ScheduleRequest, ClassGroup, Student, ClassroomLayout, Workstation, WorkstationAssignment, AttendanceSession, AttendanceRecord, User
+from models import Classroom, ClassroomImageVariant, Schedule, Incident, ScheduleRequest, ClassGroup, Student, ClassroomLayout, Workstation, WorkstationAssignment, AttendanceSession, AttendanceRecord, User
 from datetime import datetime, timedelta
 from flask_login import login_user, logout_user, login_required, current_user
 from functools import wraps
 from forms import LoginForm, UserForm, UserEditForm, ChangePasswordForm
+from occupancy_index import occupancy_index, is_occupied
+from data_cache import VersionedCache, data_version, snapshot, track_versions
+from image_pipeline import VARIANT_WIDTHS, nearest_width, preferred_format, render_variant, render_variants
+from pagination import page_size, paginate_keyset
+from bulk_import import chunked, read_user_roster
+from password_policy import needs_rehash, schedule_rehash, shared_default_hash
+from xlsx_stream import XLSX_MIMETYPE, XlsxStreamWriter
+from report_jobs import ReportArtifact, enqueue_report, load_job, purge_user_jobs, report_job, result_path
+from user_cache import invalidate_user
+from pubsub import RESYNC, publish, sse_event, subscribe
+from attendance_sessions import start_session
+from attendance_stats import StatChanges, period_totals, student_stats
+from layout_cache import get_layout, invalidate_layout
 
 # xAI Grok integration
 try:
@@ -32,6 +45,9 @@ except ImportError:
     from datetime import timezone
     pytz = None
 import io
+import time
+import shutil
+import threading
 from urllib.parse import urljoin
 from werkzeug.utils import secure_filename
 import uuid
@@ -39,19 +55,21 @@ import uuid
 # Import optional dependencies with error handling
 try:
     from pdf_generator import generate_classroom_pdf, generate_general_report, generate_availability_report
+    from pdf_generator import cached_classroom_pdf, cached_general_report, cached_availability_report
     PDF_AVAILABLE = True
 except ImportError as e:
     import logging
     logging.warning(f"PDF generation not available: {e}")
     generate_classroom_pdf = generate_general_report = generate_availability_report = None
+    cached_classroom_pdf = cached_general_report = cached_availability_report = None
     PDF_AVAILABLE = False
 
 try:
-    from qr_generator import generate_qr_code
+    from qr_generator import cached_qr_png, qr_cache, qr_filename, render_qr_batch, write_qr_sheet, write_qr_zip
 except ImportError as e:
     import logging
     logging.warning(f"QR code generation not available: {e}")
-    generate_qr_code = None
+    cached_qr_png = qr_cache = None
 
 try:
     import openpyxl
@@ -68,12 +86,36 @@ ADMIN_PASSWORD = os.environ.get("ADMIN_PASSWORD", "senai103103")
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
 ALLOWED_EXCEL_EXTENSIONS = {'xlsx', 'xls'}
 
+# Models whose commits invalidate the cached view models
+track_versions(Classroom, Schedule, Incident)
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 def allowed_excel_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXCEL_EXTENSIONS
 
+def attach_image_variants(classroom, image_data):
+    """Pre-render the responsive variants of a newly uploaded classroom photo"""
+    try:
+        rendered = render_variants(image_data)
+    except Exception as e:
+        # Undecodable upload: variants fall back to the original image
+        import logging
+        logging.warning(f"Could not render image variants for classroom {classroom.id}: {e}")
+        rendered = []
+    if classroom.id is not None:
+        # Delete the old variants first: the unit of work would insert the new
+        # rows before deleting the replaced ones and hit the unique constraint
+        ClassroomImageVariant.query.filter_by(classroom_id=classroom.id).delete()
+        db.session.flush()
+        db.session.expire(classroom, ['image_variants'])
+    classroom.image_variants = [
+        ClassroomImageVariant(width=v.width, format=v.format, mimetype=v.mimetype,
+                              source_hash=classroom.image_hash, data=v.data)
+        for v in rendered
+    ]
+
 def is_admin_authenticated():
     """Check if current user is an authenticated admin"""
     return current_user.is_authenticated and current_user.is_admin()
@@ -124,53 +166,12 @@ def classroom_detail(classroom_id):
         )
     ).all()
     
-    # Get incidents for this classroom using raw SQL to avoid SQLAlchemy column issues
-    incidents = []
-    try:
-        from sqlalchemy import text
-        with db.engine.connect() as conn:
-            # First ensure the column exists
-            try:
-                conn.execute(text("ALTER TABLE incident ADD COLUMN IF NOT EXISTS hidden_from_classroom BOOLEAN DEFAULT FALSE"))
-                conn.commit()
-            except:
-                pass
-            
-            # Use safe SQL query
-            result = conn.execute(text("""
-                SELECT id, classroom_id, reporter_name, reporter_email, description, 
-                       created_at, is_active, is_resolved, admin_response, response_date,
-                       COALESCE(hidden_from_classroom, FALSE) as hidden_from_classroom
-                FROM incident 
-                WHERE classroom_id = :classroom_id 
-                  AND is_active = TRUE 
-                  AND COALESCE(hidden_from_classroom, FALSE) = FALSE
-                ORDER BY created_at DESC
-            """), {'classroom_id': classroom_id})
-            
-            incident_data = result.fetchall()
-            
-            # Convert to Incident-like objects for template compatibility
-            class IncidentProxy:
-                def __init__(self, row):
-                    self.id = row[0]
-                    self.classroom_id = row[1]
-                    self.reporter_name = row[2]
-                    self.reporter_email = row[3]
-                    self.description = row[4]
-                    self.created_at = row[5]
-                    self.is_active = row[6]
-                    self.is_resolved = row[7]
-                    self.admin_response = row[8]
-                    self.response_date = row[9]
-                    self.hidden_from_classroom = row[10]
-            
-            incidents = [IncidentProxy(row) for row in incident_data]
-            
-    except Exception as e:
-        import logging
-        logging.error(f"Incident query error: {e}")
-        incidents = []
+    # Get incidents for this classroom that were not hidden by an admin
+    incidents = Incident.query.filter(
+        Incident.classroom_id == classroom_id,
+        Incident.is_active == True,
+        db.or_(Incident.hidden_from_classroom == False, Incident.hidden_from_classroom == None)
+    ).order_by(Incident.created_at.desc()).all()
     
     # Check if current user (if teacher) has any class groups in this classroom
     user_has_groups_in_classroom = False
@@ -203,6 +204,9 @@ def login():
                 flash('Sua conta está inativa. Entre em contato com o administrador.', 'error')
                 return redirect(url_for('login'))
             
+            if needs_rehash(user.password_hash):
+                schedule_rehash(user.id, user.password_hash, form.password.data)
+            
             login_user(user, remember=True)
             session.permanent = True
             app.permanent_session_lifetime = timedelta(hours=2)
@@ -232,8 +236,10 @@ def logout():
 @app.route('/users')
 @require_admin_auth
 def users():
-    all_users = User.query.order_by(User.created_at.desc()).all()
-    return render_template('users.html', users=all_users)
+    page = paginate_keyset(User.query, (User.created_at, User.id),
+                           after=request.args.get('after'), before=request.args.get('before'),
+                           per_page=page_size(request.args.get('per_page')))
+    return render_template('users.html', users=page.items, page=page)
 
 @app.route('/users/add', methods=['GET', 'POST'])
 @require_admin_auth
@@ -284,6 +290,7 @@ def edit_user(user_id):
         user.is_active = form.is_active.data == 'True'
         
         db.session.commit()
+        invalidate_user(user_id)
         
         flash(f'Usuário {user.name} atualizado com sucesso!', 'success')
         return redirect(url_for('users'))
@@ -304,8 +311,11 @@ def delete_user(user_id):
         return redirect(url_for('users'))
     
     username = user.name
+    # report_job.owner_id references the user
+    purge_user_jobs(user.id)
     db.session.delete(user)
     db.session.commit()
+    invalidate_user(user_id)
     
     flash(f'Usuário {username} deletado com sucesso!', 'success')
     return redirect(url_for('users'))
@@ -319,12 +329,16 @@ def change_user_password(user_id):
     if form.validate_on_submit():
         user.set_password(form.password.data)
         db.session.commit()
+        invalidate_user(user_id)
         
         flash(f'Senha do usuário {user.name} alterada com sucesso!', 'success')
         return redirect(url_for('users'))
     
     return render_template('change_password_form.html', form=form, user=user, title='Alterar Senha')
 
+USER_IMPORT_BATCH_SIZE = 500
+USER_IMPORT_DEFAULT_PASSWORD = 'senai103'
+
 @app.route('/users/import-excel', methods=['POST'])
 @require_admin_auth
 def import_users_excel():
@@ -348,62 +362,45 @@ def import_users_excel():
         return redirect(url_for('users'))
     
     try:
-        # Read the Excel file
-        workbook = openpyxl.load_workbook(excel_file)
-        sheet = workbook.active
-        
-        imported_count = 0
-        skipped_count = 0
-        errors = []
-        
-        # Assume first row is header, start from second row
-        for row_num, row in enumerate(sheet.iter_rows(min_row=2, values_only=True), start=2):
-            if not row or len(row) < 2:
-                continue
-            
-            nif = str(row[0]).strip() if row[0] else ''
-            name = str(row[1]).strip() if row[1] else ''
-            
-            if not nif or not name:
-                skipped_count += 1
-                errors.append(f'Linha {row_num}: NIF ou nome vazio')
-                continue
-            
-            # Validate NIF format (should be like sn1077416)
-            import re
-            if not re.match(r'^sn\d{6,8}$', nif.lower()):
-                skipped_count += 1
-                errors.append(f'Linha {row_num}: NIF "{nif}" não está no formato correto (ex: sn1077416)')
-                continue
-            
-            # Check if user already exists
-            existing_user = User.query.filter_by(username=nif.lower()).first()
-            if existing_user:
-                skipped_count += 1
-                errors.append(f'Linha {row_num}: Usuário com NIF "{nif}" já existe')
-                continue
-            
-            # Create new user
-            try:
-                user = User(
-                    username=nif.lower(),
-                    name=name,
-                    role='teacher',
-                    email=f'{nif.lower()}@senai.br',
-                    first_login=True
-                )
-                user.set_password('senai103')
-                user.created_by = current_user.id
-                
-                db.session.add(user)
-                imported_count += 1
-            except Exception as e:
-                skipped_count += 1
-                errors.append(f'Linha {row_num}: Erro ao criar usuário - {str(e)}')
+        # Stream and validate the roster, then resolve duplicates with one IN query per batch
+        entries, errors = read_user_roster(excel_file)
+        
+        existing = set()
+        for batch in chunked([entry.username for entry in entries], USER_IMPORT_BATCH_SIZE):
+            existing.update(username for (username,) in
+                            db.session.query(User.username).filter(User.username.in_(batch)))
+        
+        new_entries = []
+        for entry in entries:
+            if entry.username in existing:
+                errors.append(f'Linha {entry.row_num}: Usuário com NIF "{entry.username}" já existe')
+            else:
+                new_entries.append(entry)
+        
+        # Every new account gets the same default password and must change it on first login
+        password_hash = shared_default_hash(USER_IMPORT_DEFAULT_PASSWORD)
+        created_at = datetime.utcnow()
+        mappings = [{
+            'username': entry.username,
+            'name': entry.name,
+            'role': 'teacher',
+            'email': f'{entry.username}@senai.br',
+            'password_hash': password_hash,
+            'is_active': True,
+            'first_login': True,
+            'created_at': created_at,
+            'created_by': current_user.id,
+        } for entry in new_entries]
+        
+        for batch in chunked(mappings, USER_IMPORT_BATCH_SIZE):
+            db.session.bulk_insert_mappings(User, batch)
         
         # Commit all changes
         db.session.commit()
         
+        imported_count = len(mappings)
+        skipped_count = len(errors)
+        
         # Show results
         if imported_count > 0:
             flash(f'✅ {imported_count} usuário(s) importado(s) com sucesso!', 'success')
@@ -429,7 +426,7 @@ def import_users_excel():
 @app.route('/profile')
 @login_required
 def profile():
-    return render_template('profile.html', user=current_user)
+    return render_template('profile.html', user=current_user.record)
 
 @app.route('/profile/change-password', methods=['GET', 'POST'])
 @login_required
@@ -437,8 +434,9 @@ def change_my_password():
     form = ChangePasswordForm()
     
     if form.validate_on_submit():
-        current_user.set_password(form.password.data)
+        current_user.record.set_password(form.password.data)
         db.session.commit()
+        invalidate_user(current_user.id)
         
         flash('Sua senha foi alterada com sucesso!', 'success')
         return redirect(url_for('profile'))
@@ -456,9 +454,11 @@ def force_password_change():
     form = ChangePasswordForm()
     
     if form.validate_on_submit():
-        current_user.set_password(form.password.data)
-        current_user.first_login = False
+        user = current_user.record
+        user.set_password(form.password.data)
+        user.first_login = False
         db.session.commit()
+        invalidate_user(user.id)
         
         flash('Senha alterada com sucesso! Bem-vindo ao sistema.', 'success')
         return redirect(url_for('index'))
@@ -532,9 +532,8 @@ def edit_classroom(classroom_id):
                 if file and file.filename and file.filename != '' and allowed_file(file.filename):
                     filename = secure_filename(file.filename)
                     # Store file data in database
-                    classroom.image_data = file.read()
-                    classroom.image_mimetype = file.mimetype
-                    classroom.image_filename = filename
+                    classroom.set_image(file.read(), file.mimetype, filename)
+                    attach_image_variants(classroom, classroom.image_data)
             
             # Handle Excel file upload with PostgreSQL storage
             if 'excel_file' in request.files:
@@ -542,13 +541,12 @@ def edit_classroom(classroom_id):
                 if excel_file and excel_file.filename and excel_file.filename != '' and allowed_excel_file(excel_file.filename):
                     filename = secure_filename(excel_file.filename)
                     # Store file data in database
-                    classroom.excel_data = excel_file.read()
-                    classroom.excel_mimetype = excel_file.mimetype
-                    classroom.excel_filename = filename
+                    classroom.set_excel(excel_file.read(), excel_file.mimetype, filename)
                     
             classroom.updated_at = datetime.utcnow()
             
             db.session.commit()
+            invalidate_classroom_qr(classroom_id)
             flash('Sala atualizada com sucesso!', 'success')
             return redirect(url_for('classroom_detail', classroom_id=classroom_id))
         except Exception as e:
@@ -564,14 +562,15 @@ def download_excel(classroom_id):
     try:
         classroom = Classroom.query.get_or_404(classroom_id)
         
-        if not classroom.excel_data:
+        if not classroom.has_excel:
             flash('Nenhum arquivo Excel disponível para esta sala.', 'error')
             return redirect(url_for('classroom_detail', classroom_id=classroom_id))
         
+        excel_data, excel_mimetype = Classroom.load_excel(classroom_id)
         safe_filename = f"{classroom.name.replace(' ', '_')}_patrimonio.xlsx"
         return send_file(
-            io.BytesIO(classroom.excel_data),
-            mimetype=classroom.excel_mimetype or 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+            io.BytesIO(excel_data),
+            mimetype=excel_mimetype or 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
             as_attachment=True,
             download_name=safe_filename
         )
@@ -579,23 +578,120 @@ def download_excel(classroom_id):
         flash(f'Erro ao baixar arquivo: {str(e)}', 'error')
         return redirect(url_for('classroom_detail', classroom_id=classroom_id))
 
+IMAGE_VERSION_LENGTH = 16
+IMAGE_IMMUTABLE_MAX_AGE = 31536000  # One year; versioned URLs change whenever the image does
+
+@app.template_global()
+def classroom_image_url(classroom, width=None):
+    """Image URL carrying a content-hash version, safe to cache forever"""
+    params = {'classroom_id': classroom.id}
+    if classroom.image_hash:
+        params['v'] = classroom.image_hash[:IMAGE_VERSION_LENGTH]
+    if width:
+        return url_for('serve_image_variant', width=nearest_width(width), **params)
+    return url_for('serve_image', **params)
+
+@app.template_global()
+def classroom_image_srcset(classroom):
+    """srcset listing every pre-rendered width of a classroom photo"""
+    return ', '.join(f'{classroom_image_url(classroom, width)} {width}w' for width in VARIANT_WIDTHS)
+
+def load_image_meta(classroom_id):
+    """(image_hash, image_size, updated_at) of a classroom, without touching the blob"""
+    return db.session.query(Classroom.image_hash, Classroom.image_size, Classroom.updated_at).filter(
+        Classroom.id == classroom_id
+    ).first()
+
+def add_image_cache_headers(response, etag, updated_at, versioned):
+    if etag:
+        response.set_etag(etag)
+    if updated_at:
+        response.last_modified = updated_at
+    if versioned:
+        response.headers['Cache-Control'] = f'public, max-age={IMAGE_IMMUTABLE_MAX_AGE}, immutable'
+    else:
+        response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def is_versioned_image_request(image_hash):
+    return bool(image_hash) and request.args.get('v') == image_hash[:IMAGE_VERSION_LENGTH]
+
 @app.route('/image/<int:classroom_id>')
 def serve_image(classroom_id):
     """Serve images from PostgreSQL database"""
+    from flask import abort
     try:
-        classroom = Classroom.query.get_or_404(classroom_id)
+        # Validators come from the metadata columns; the blob is only read on a cache miss
+        meta = load_image_meta(classroom_id)
         
-        if not classroom.image_data:
-            # Return default image or 404
-            from flask import abort
+        if not meta or not meta.image_size:
             abort(404)
         
-        return send_file(
-            io.BytesIO(classroom.image_data),
-            mimetype=classroom.image_mimetype or 'image/jpeg'
+        image_hash, _, updated_at = meta
+        versioned = is_versioned_image_request(image_hash)
+        
+        if image_hash and request.if_none_match.contains(image_hash):
+            return add_image_cache_headers(make_response('', 304), image_hash, updated_at, versioned)
+        
+        image = Classroom.load_image(classroom_id)
+        response = send_file(
+            io.BytesIO(image.image_data),
+            mimetype=image.image_mimetype or 'image/jpeg'
         )
+        return add_image_cache_headers(response, image_hash, updated_at, versioned)
+    except Exception as e:
+        abort(404)
+
+@app.route('/image/<int:classroom_id>/<int:width>')
+def serve_image_variant(classroom_id, width):
+    """Serve a resized WebP/JPEG copy of a classroom image, rendering it on first use"""
+    from flask import abort
+    import logging
+    try:
+        meta = load_image_meta(classroom_id)
+        
+        if not meta or not meta.image_size or not meta.image_hash:
+            abort(404)
+        
+        image_hash, _, updated_at = meta
+        width = nearest_width(width)
+        fmt = request.args.get('fmt')
+        negotiated = fmt is None
+        if fmt not in ('webp', 'jpeg'):
+            fmt = preferred_format(request.accept_mimetypes)
+        etag = f'{image_hash[:IMAGE_VERSION_LENGTH]}-{width}-{fmt}'
+        versioned = is_versioned_image_request(image_hash)
+        
+        if request.if_none_match.contains(etag):
+            response = make_response('', 304)
+        else:
+            variant = ClassroomImageVariant.load(classroom_id, width, fmt, image_hash)
+            if variant:
+                data, mimetype = variant
+            else:
+                # Missing or rendered from an older image (e.g. migrated uploads): render and store it now
+                original = Classroom.load_image(classroom_id)
+                try:
+                    rendered = render_variant(original.image_data, width, fmt)
+                except Exception as e:
+                    logging.warning(f"Could not render {width}w {fmt} variant for classroom {classroom_id}: {e}")
+                    return redirect(url_for('serve_image', classroom_id=classroom_id, v=image_hash[:IMAGE_VERSION_LENGTH]))
+                data, mimetype = rendered.data, rendered.mimetype
+                try:
+                    ClassroomImageVariant.query.filter_by(classroom_id=classroom_id, width=width, format=fmt).delete()
+                    db.session.add(ClassroomImageVariant(classroom_id=classroom_id, width=width, format=fmt,
+                                                         mimetype=mimetype, source_hash=image_hash, data=data))
+                    db.session.commit()
+                except Exception as e:
+                    # A concurrent request stored it first; serve what we rendered anyway
+                    db.session.rollback()
+                    logging.debug(f"Image variant not stored: {e}")
+            response = send_file(io.BytesIO(data), mimetype=mimetype)
+        
+        if negotiated:
+            response.vary.add('Accept')
+        return add_image_cache_headers(response, etag, updated_at, versioned)
     except Exception as e:
-        from flask import abort
         abort(404)
 
 @app.route('/upload_excel/<int:classroom_id>', methods=['POST'])
@@ -618,9 +714,7 @@ def upload_excel(classroom_id):
             filename = secure_filename(excel_file.filename or '')
             
             # Store file data in database
-            classroom.excel_data = excel_file.read()
-            classroom.excel_mimetype = excel_file.mimetype
-            classroom.excel_filename = filename
+            classroom.set_excel(excel_file.read(), excel_file.mimetype, filename)
             classroom.updated_at = datetime.utcnow()
             db.session.commit()
             
@@ -701,43 +795,8 @@ def hide_incident_from_classroom(incident_id):
     classroom_id = incident.classroom_id
     
     try:
-        # Check if hidden_from_classroom column exists
-        from sqlalchemy import text
-        column_exists = False
-        try:
-            with db.engine.connect() as conn:
-                if 'postgresql' in str(db.engine.url) or 'postgres' in str(db.engine.url):
-                    result = conn.execute(text("""
-                        SELECT column_name FROM information_schema.columns 
-                        WHERE table_name='incident' AND column_name='hidden_from_classroom'
-                    """))
-                    column_exists = result.fetchone() is not None
-                else:
-                    try:
-                        conn.execute(text("SELECT hidden_from_classroom FROM incident LIMIT 1"))
-                        column_exists = True
-                    except:
-                        column_exists = False
-        except:
-            column_exists = False
-        
-        # Hide incident using raw SQL with column creation if needed
-        with db.engine.connect() as conn:
-            # Ensure column exists first
-            try:
-                conn.execute(text("ALTER TABLE incident ADD COLUMN IF NOT EXISTS hidden_from_classroom BOOLEAN DEFAULT FALSE"))
-                conn.commit()
-            except:
-                pass
-                
-            # Use raw SQL to avoid SQLAlchemy issues
-            conn.execute(text("""
-                UPDATE incident 
-                SET hidden_from_classroom = true 
-                WHERE id = :incident_id
-            """), {'incident_id': incident_id})
-            conn.commit()
-            
+        incident.hidden_from_classroom = True
+        db.session.commit()
         flash('Ocorrência removida da visualização da sala!', 'success')
     except Exception as e:
         db.session.rollback()
@@ -769,26 +828,68 @@ def delete_incident(incident_id):
 @app.route('/admin/migrate_db')
 @require_admin_auth  
 def migrate_database():
-    """Rota para migrar banco de dados - adicionar colunas faltantes"""
+    """Rota para migrar banco de dados - aplica as migrações pendentes"""
     try:
-        from sqlalchemy import text
-        with db.engine.connect() as conn:
-            # Adicionar hidden_from_classroom
-            try:
-                conn.execute(text("ALTER TABLE incident ADD COLUMN IF NOT EXISTS hidden_from_classroom BOOLEAN DEFAULT FALSE"))
-                conn.commit()
-                flash('✅ Migração concluída com sucesso! Coluna hidden_from_classroom adicionada.', 'success')
-            except Exception as e:
-                if 'already exists' in str(e) or 'duplicate' in str(e):
-                    flash('✅ Coluna hidden_from_classroom já existe.', 'info')  
-                else:
-                    flash(f'❌ Erro na migração: {str(e)}', 'error')
-                    
+        from migrations import run_migrations, latest_version
+        applied = run_migrations()
+        if applied:
+            flash(f'✅ Migração concluída com sucesso! {len(applied)} etapa(s) aplicada(s), versão {latest_version()}.', 'success')
+        else:
+            flash(f'✅ Banco de dados já está atualizado (versão {latest_version()}).', 'info')
     except Exception as e:
         flash(f'❌ Erro na migração: {str(e)}', 'error')
         
     return redirect(url_for('incidents_management'))
 
+# Incident filter dropdowns, rebuilt only after incidents or classrooms change
+incident_filter_cache = VersionedCache(max_entries=4)
+
+def incident_listing_query(status_filter='', reporter_filter='', classroom_filter=''):
+    """Visible incidents joined with their classroom name, newest first, as lightweight rows"""
+    query = db.session.query(
+        Incident.id, Incident.classroom_id, Incident.reporter_name, Incident.reporter_email,
+        Incident.description, Incident.created_at, Incident.is_resolved,
+        Incident.admin_response, Incident.response_date,
+        db.func.coalesce(Classroom.name, 'Sala não encontrada').label('classroom_name')
+    ).outerjoin(Classroom, Classroom.id == Incident.classroom_id).filter(
+        Incident.is_active == True,
+        Incident.hidden_from_classroom == False
+    )
+    
+    if status_filter == 'pending':
+        query = query.filter(Incident.is_resolved == False)
+    elif status_filter == 'resolved':
+        query = query.filter(Incident.is_resolved == True)
+    
+    if reporter_filter:
+        query = query.filter(db.func.lower(Incident.reporter_name).like(f'%{reporter_filter.lower()}%'))
+    
+    if classroom_filter:
+        try:
+            query = query.filter(Incident.classroom_id == int(classroom_filter))
+        except ValueError:
+            pass
+    
+    return query.order_by(Incident.created_at.desc(), Incident.id.desc())
+
+def incident_status_counts():
+    """(pending, resolved) counts of visible incidents in a single aggregate query"""
+    rows = db.session.query(Incident.is_resolved, db.func.count(Incident.id)).filter(
+        Incident.is_active == True,
+        Incident.hidden_from_classroom == False
+    ).group_by(Incident.is_resolved).all()
+    counts = {bool(is_resolved): count for is_resolved, count in rows}
+    return counts.get(False, 0), counts.get(True, 0)
+
+def build_incident_filter_options():
+    reporters = [name for (name,) in db.session.query(Incident.reporter_name).filter(
+        Incident.is_active == True,
+        Incident.hidden_from_classroom == False
+    ).distinct().order_by(Incident.reporter_name)]
+    classrooms = [snapshot(c, ('id', 'name')) for c in
+                  db.session.query(Classroom.id, Classroom.name).order_by(Classroom.name)]
+    return {'reporters': reporters, 'classrooms': classrooms}
+
 @app.route('/incidents_management')
 @require_admin_auth
 def incidents_management():
@@ -799,119 +900,24 @@ def incidents_management():
         reporter_filter = request.args.get('reporter', '')
         classroom_filter = request.args.get('classroom', '')
         
-        # Use raw SQL to avoid SQLAlchemy model issues with missing columns
-        from sqlalchemy import text
-        
-        # Use simplified SQL with COALESCE to handle missing column gracefully
-        base_sql = """
-            SELECT id, classroom_id, reporter_name, reporter_email, description, 
-                   created_at, is_active, is_resolved, admin_response, response_date,
-                   COALESCE(hidden_from_classroom, FALSE) as hidden_from_classroom
-        """
-        where_clause = "WHERE is_active = true AND COALESCE(hidden_from_classroom, FALSE) = FALSE"
-        
-        # Add filters to WHERE clause
-        filter_conditions = []
-        params = {}
-        
-        if status_filter == 'pending':
-            filter_conditions.append("is_resolved = false")
-        elif status_filter == 'resolved':
-            filter_conditions.append("is_resolved = true")
-        
-        if reporter_filter:
-            filter_conditions.append("LOWER(reporter_name) LIKE LOWER(:reporter_filter)")
-            params['reporter_filter'] = f'%{reporter_filter}%'
-        
-        if classroom_filter:
-            try:
-                classroom_id = int(classroom_filter)
-                filter_conditions.append("classroom_id = :classroom_id")
-                params['classroom_id'] = classroom_id
-            except ValueError:
-                pass
-        
-        # Complete SQL query
-        if filter_conditions:
-            full_sql = f"{base_sql} FROM incident {where_clause} AND {' AND '.join(filter_conditions)} ORDER BY created_at DESC"
-        else:
-            full_sql = f"{base_sql} FROM incident {where_clause} ORDER BY created_at DESC"
-        
-        # Execute query and convert to incident objects
-        with db.engine.connect() as conn:
-            # Ensure column exists first
-            try:
-                conn.execute(text("ALTER TABLE incident ADD COLUMN IF NOT EXISTS hidden_from_classroom BOOLEAN DEFAULT FALSE"))
-                conn.commit()
-            except:
-                pass
-                
-            result = conn.execute(text(full_sql), params)
-            incident_rows = result.fetchall()
-        
-        # Convert to Incident-like objects for template compatibility
-        class IncidentProxy:
-            def __init__(self, row):
-                self.id = row[0]
-                self.classroom_id = row[1]
-                self.reporter_name = row[2]
-                self.reporter_email = row[3]
-                self.description = row[4]
-                self.created_at = row[5]
-                self.is_active = row[6]
-                self.is_resolved = row[7]
-                self.admin_response = row[8]
-                self.response_date = row[9]
-                if len(row) > 10:
-                    self.hidden_from_classroom = row[10]
-                else:
-                    self.hidden_from_classroom = False
-                
-                # Add classroom relationship
-                self.classroom = Classroom.query.get(self.classroom_id)
-        
-        incidents = [IncidentProxy(row) for row in incident_rows]
-        
-        # Get counts using safe SQL with COALESCE
-        with db.engine.connect() as conn:
-            # Ensure column exists first
-            try:
-                conn.execute(text("ALTER TABLE incident ADD COLUMN IF NOT EXISTS hidden_from_classroom BOOLEAN DEFAULT FALSE"))
-                conn.commit()
-            except:
-                pass
-                
-            pending_result = conn.execute(text("""
-                SELECT COUNT(*) FROM incident 
-                WHERE is_active = true AND is_resolved = false 
-                AND COALESCE(hidden_from_classroom, FALSE) = FALSE
-            """))
-            resolved_result = conn.execute(text("""
-                SELECT COUNT(*) FROM incident 
-                WHERE is_active = true AND is_resolved = true 
-                AND COALESCE(hidden_from_classroom, FALSE) = FALSE
-            """))
-            
-            pending_count = pending_result.scalar()
-            resolved_count = resolved_result.scalar()
+        page = paginate_keyset(incident_listing_query(status_filter, reporter_filter, classroom_filter),
+                               (Incident.created_at, Incident.id),
+                               after=request.args.get('after'), before=request.args.get('before'),
+                               per_page=page_size(request.args.get('per_page')))
         
-        # Get classrooms and reporters using safe queries
-        classrooms = Classroom.query.all()
+        pending_count, resolved_count = incident_status_counts()
         
-        with db.engine.connect() as conn:
-            reporters_result = conn.execute(text("""
-                SELECT DISTINCT reporter_name FROM incident 
-                WHERE is_active = true 
-                AND COALESCE(hidden_from_classroom, FALSE) = FALSE
-            """))
-            reporters = [row[0] for row in reporters_result.fetchall()]
+        filter_options = incident_filter_cache.get_or_build(
+            'filter_options', data_version(Incident, Classroom), build_incident_filter_options
+        )
         
         return render_template('incidents_management.html', 
-                             incidents=incidents, 
+                             incidents=page.items, 
                              pending_count=pending_count, 
                              resolved_count=resolved_count,
-                             classrooms=classrooms,
-                             reporters=reporters,
+                             classrooms=filter_options['classrooms'],
+                             reporters=filter_options['reporters'],
+                             page=page,
                              current_filters={
                                  'status': status_filter,
                                  'reporter': reporter_filter,
@@ -971,230 +977,146 @@ def resolve_incident(incident_id):
     
     return redirect(url_for('incidents_management'))
 
-@app.route('/incidents_pdf_report')
-@require_admin_auth
-def incidents_pdf_report():
-    """Generate PDF report of incidents with filters"""
-    try:
-        # Get the same filters as incidents_management
-        status_filter = request.args.get('status', '')
-        reporter_filter = request.args.get('reporter', '')
-        classroom_filter = request.args.get('classroom', '')
-        
-        # Use raw SQL for PDF report to avoid column issues
-        from sqlalchemy import text
-        
-        # Use simplified SQL with COALESCE for PDF report
-        where_clause = "WHERE is_active = true AND COALESCE(hidden_from_classroom, FALSE) = FALSE"
-        
-        # Add filters
-        filter_conditions = []
-        params = {}
-        
-        if status_filter == 'pending':
-            filter_conditions.append("is_resolved = false")
-        elif status_filter == 'resolved':
-            filter_conditions.append("is_resolved = true")
-        
-        if reporter_filter:
-            filter_conditions.append("LOWER(reporter_name) LIKE LOWER(:reporter_filter)")
-            params['reporter_filter'] = f'%{reporter_filter}%'
-        
-        if classroom_filter:
-            try:
-                classroom_id = int(classroom_filter)
-                filter_conditions.append("classroom_id = :classroom_id")
-                params['classroom_id'] = classroom_id
-            except ValueError:
-                pass
-        
-        # Complete SQL
-        if filter_conditions:
-            full_sql = f"SELECT id FROM incident {where_clause} AND {' AND '.join(filter_conditions)} ORDER BY created_at DESC"
-        else:
-            full_sql = f"SELECT id FROM incident {where_clause} ORDER BY created_at DESC"
-        
-        # Get incident data directly to avoid SQLAlchemy issues
-        with db.engine.connect() as conn:
-            # Ensure column exists first
-            try:
-                conn.execute(text("ALTER TABLE incident ADD COLUMN IF NOT EXISTS hidden_from_classroom BOOLEAN DEFAULT FALSE"))
-                conn.commit()
-            except:
-                pass
-                
-            # Get full incident data
-            full_data_sql = f"""
-                SELECT id, classroom_id, reporter_name, reporter_email, description, 
-                       created_at, is_active, is_resolved, admin_response, response_date
-                FROM incident {where_clause}
-            """
-            if filter_conditions:
-                full_data_sql += f" AND {' AND '.join(filter_conditions)}"
-            full_data_sql += " ORDER BY created_at DESC"
-            
-            result = conn.execute(text(full_data_sql), params)
-            incident_data = result.fetchall()
-        
-        # Convert to incident-like objects
-        class IncidentProxy:
-            def __init__(self, row):
-                self.id = row[0]
-                self.classroom_id = row[1]
-                self.reporter_name = row[2]
-                self.reporter_email = row[3]
-                self.description = row[4]
-                self.created_at = row[5]
-                self.is_active = row[6]
-                self.is_resolved = row[7]
-                self.admin_response = row[8]
-                self.response_date = row[9]
-                self.classroom = Classroom.query.get(self.classroom_id)
-        
-        incidents = [IncidentProxy(row) for row in incident_data]
-        
-        # Generate PDF using ReportLab
-        from reportlab.lib.pagesizes import letter, A4
-        from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-        from reportlab.lib import colors
-        from reportlab.lib.units import inch
-        
-        # Create BytesIO buffer
-        buffer = io.BytesIO()
-        
-        # Create the PDF object
-        doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=72, leftMargin=72, topMargin=72, bottomMargin=18)
-        
-        # Container for the 'Flowable' objects
-        elements = []
-        
-        # Define styles
-        styles = getSampleStyleSheet()
-        title_style = ParagraphStyle('CustomTitle', parent=styles['Heading1'], fontSize=16, spaceAfter=30, textColor=colors.HexColor('#1f2937'))
-        subtitle_style = ParagraphStyle('CustomSubtitle', parent=styles['Heading2'], fontSize=12, spaceAfter=20, textColor=colors.HexColor('#374151'))
-        normal_style = styles['Normal']
-        
-        # Add title
-        title = Paragraph("Relatório de Ocorrências - SENAI Morvan Figueiredo", title_style)
-        elements.append(title)
-        
-        # Add generation date
-        generation_date = f"Gerado em: {get_brazil_time().strftime('%d/%m/%Y às %H:%M')}"
-        date_para = Paragraph(generation_date, normal_style)
-        elements.append(date_para)
+@report_job('incidents_pdf')
+def build_incidents_pdf(params, output):
+    """Incident report PDF for the incidents_management filters"""
+    status_filter = params.get('status', '')
+    reporter_filter = params.get('reporter', '')
+    classroom_filter = params.get('classroom', '')
+    
+    incidents = incident_listing_query(status_filter, reporter_filter, classroom_filter).all()
+    
+    # Generate PDF using ReportLab
+    from reportlab.lib.pagesizes import letter, A4
+    from reportlab.platypus import SimpleDocTemplate, Table, Paragraph, Spacer
+    from reportlab.lib.units import inch
+    from pdf_generator import STYLES, TABLE_STYLES
+    
+    # Create the PDF object
+    doc = SimpleDocTemplate(output, pagesize=A4, rightMargin=72, leftMargin=72, topMargin=72, bottomMargin=18)
+    
+    # Container for the 'Flowable' objects
+    elements = []
+    
+    # Shared styles from the pdf_generator registry
+    title_style = STYLES['IncidentTitle']
+    subtitle_style = STYLES['IncidentSubtitle']
+    header_style = STYLES['IncidentHeader']
+    normal_style = STYLES['Normal']
+    
+    # Add title
+    title = Paragraph("Relatório de Ocorrências - SENAI Morvan Figueiredo", title_style)
+    elements.append(title)
+    
+    # Add generation date
+    generation_date = f"Gerado em: {get_brazil_time().strftime('%d/%m/%Y às %H:%M')}"
+    date_para = Paragraph(generation_date, normal_style)
+    elements.append(date_para)
+    elements.append(Spacer(1, 12))
+    
+    # Add filter info if any
+    filter_info = []
+    if status_filter:
+        filter_info.append(f"Status: {'Pendentes' if status_filter == 'pending' else 'Resolvidas'}")
+    if reporter_filter:
+        filter_info.append(f"Reportado por: {reporter_filter}")
+    if classroom_filter:
+        classroom = Classroom.query.get(int(classroom_filter))
+        if classroom:
+            filter_info.append(f"Sala: {classroom.name}")
+    
+    if filter_info:
+        filter_text = "Filtros aplicados: " + ", ".join(filter_info)
+        filter_para = Paragraph(filter_text, subtitle_style)
+        elements.append(filter_para)
         elements.append(Spacer(1, 12))
+    
+    if incidents:
+        # Create table data
+        data = [['ID', 'Sala', 'Reportado por', 'Data', 'Status', 'Descrição']]
+        
+        for incident in incidents:
+            status = 'Resolvida' if incident.is_resolved else 'Pendente'
+            # Truncate description for table
+            description = incident.description[:50] + '...' if len(incident.description) > 50 else incident.description
+            data.append([
+                f"#{incident.id}",
+                incident.classroom_name,
+                incident.reporter_name,
+                incident.created_at.strftime('%d/%m/%Y') if incident.created_at else '',
+                status,
+                description
+            ])
+        
+        # Create table
+        table = Table(data, colWidths=[0.8*inch, 1.5*inch, 1.5*inch, 1*inch, 1*inch, 2.2*inch])
+        table.setStyle(TABLE_STYLES['incidents'])
+        
+        elements.append(table)
+        elements.append(Spacer(1, 20))
         
-        # Add filter info if any
-        filter_info = []
-        if status_filter:
-            filter_info.append(f"Status: {'Pendentes' if status_filter == 'pending' else 'Resolvidas'}")
-        if reporter_filter:
-            filter_info.append(f"Reportado por: {reporter_filter}")
-        if classroom_filter:
-            classroom = Classroom.query.get(int(classroom_filter))
-            if classroom:
-                filter_info.append(f"Sala: {classroom.name}")
-        
-        if filter_info:
-            filter_text = "Filtros aplicados: " + ", ".join(filter_info)
-            filter_para = Paragraph(filter_text, subtitle_style)
-            elements.append(filter_para)
-            elements.append(Spacer(1, 12))
+        # Add detailed incidents
+        detailed_title = Paragraph("Detalhes das Ocorrências", subtitle_style)
+        elements.append(detailed_title)
         
-        if incidents:
-            # Create table data
-            data = [['ID', 'Sala', 'Reportado por', 'Data', 'Status', 'Descrição']]
-            
-            for incident in incidents:
-                status = 'Resolvida' if incident.is_resolved else 'Pendente'
-                # Truncate description for table
-                description = incident.description[:50] + '...' if len(incident.description) > 50 else incident.description
-                data.append([
-                    f"#{incident.id}",
-                    incident.classroom.name,
-                    incident.reporter_name,
-                    incident.created_at.strftime('%d/%m/%Y') if incident.created_at else '',
-                    status,
-                    description
-                ])
+        for incident in incidents:
+            # Incident header
+            incident_header = f"Ocorrência #{incident.id} - {incident.classroom_name}"
+            header_para = Paragraph(incident_header, header_style)
+            elements.append(header_para)
             
-            # Create table
-            table = Table(data, colWidths=[0.8*inch, 1.5*inch, 1.5*inch, 1*inch, 1*inch, 2.2*inch])
-            table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1f2937')),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 10),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-                ('FONTSIZE', (0, 1), (-1, -1), 8),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-            ]))
+            # Incident details
+            details = f"""<b>Reportado por:</b> {incident.reporter_name} ({incident.reporter_email})<br/>
+            <b>Data:</b> {incident.created_at.strftime('%d/%m/%Y às %H:%M') if incident.created_at else 'Não informada'}<br/>
+            <b>Status:</b> {'Resolvida' if incident.is_resolved else 'Pendente'}<br/>
+            <b>Descrição:</b> {incident.description}<br/>"""
             
-            elements.append(table)
-            elements.append(Spacer(1, 20))
+            if incident.admin_response:
+                details += f"<b>Resposta do Admin:</b> {incident.admin_response}<br/>"
+                if incident.response_date:
+                    details += f"<b>Data da Resposta:</b> {incident.response_date.strftime('%d/%m/%Y às %H:%M')}<br/>"
             
-            # Add detailed incidents
-            detailed_title = Paragraph("Detalhes das Ocorrências", subtitle_style)
-            elements.append(detailed_title)
-            
-            for incident in incidents:
-                # Incident header
-                incident_header = f"Ocorrência #{incident.id} - {incident.classroom.name}"
-                header_para = Paragraph(incident_header, ParagraphStyle('IncidentHeader', parent=styles['Heading3'], fontSize=11, textColor=colors.HexColor('#1f2937')))
-                elements.append(header_para)
-                
-                # Incident details
-                details = f"""<b>Reportado por:</b> {incident.reporter_name} ({incident.reporter_email})<br/>
-                <b>Data:</b> {incident.created_at.strftime('%d/%m/%Y às %H:%M') if incident.created_at else 'Não informada'}<br/>
-                <b>Status:</b> {'Resolvida' if incident.is_resolved else 'Pendente'}<br/>
-                <b>Descrição:</b> {incident.description}<br/>"""
-                
-                if incident.admin_response:
-                    details += f"<b>Resposta do Admin:</b> {incident.admin_response}<br/>"
-                    if incident.response_date:
-                        details += f"<b>Data da Resposta:</b> {incident.response_date.strftime('%d/%m/%Y às %H:%M')}<br/>"
-                
-                details_para = Paragraph(details, normal_style)
-                elements.append(details_para)
-                elements.append(Spacer(1, 12))
-        else:
-            no_incidents = Paragraph("Nenhuma ocorrência encontrada com os filtros aplicados.", normal_style)
-            elements.append(no_incidents)
-        
-        # Add summary
-        total_incidents = len(incidents)
-        pending_incidents = len([i for i in incidents if not i.is_resolved])
-        resolved_incidents = len([i for i in incidents if i.is_resolved])
-        
-        summary = f"""<b>Resumo:</b><br/>
-        Total de ocorrências: {total_incidents}<br/>
-        Pendentes: {pending_incidents}<br/>
-        Resolvidas: {resolved_incidents}"""
-        
-        summary_para = Paragraph(summary, subtitle_style)
-        elements.append(Spacer(1, 20))
-        elements.append(summary_para)
-        
-        # Build PDF
-        doc.build(elements)
-        
-        # Get the value of the BytesIO buffer and create response
-        pdf_data = buffer.getvalue()
-        buffer.close()
-        
-        timestamp = get_brazil_time().strftime("%Y%m%d_%H%M%S")
-        filename = f'relatorio_ocorrencias_{timestamp}.pdf'
-        
-        response = make_response(pdf_data)
-        response.headers['Content-Type'] = 'application/pdf'
-        response.headers['Content-Disposition'] = f'attachment; filename={filename}'
-        
-        return response
+            details_para = Paragraph(details, normal_style)
+            elements.append(details_para)
+            elements.append(Spacer(1, 12))
+    else:
+        no_incidents = Paragraph("Nenhuma ocorrência encontrada com os filtros aplicados.", normal_style)
+        elements.append(no_incidents)
+    
+    # Add summary
+    total_incidents = len(incidents)
+    pending_incidents = len([i for i in incidents if not i.is_resolved])
+    resolved_incidents = len([i for i in incidents if i.is_resolved])
+    
+    summary = f"""<b>Resumo:</b><br/>
+    Total de ocorrências: {total_incidents}<br/>
+    Pendentes: {pending_incidents}<br/>
+    Resolvidas: {resolved_incidents}"""
+    
+    summary_para = Paragraph(summary, subtitle_style)
+    elements.append(Spacer(1, 20))
+    elements.append(summary_para)
+    
+    # Build PDF
+    doc.build(elements)
+    
+    timestamp = get_brazil_time().strftime("%Y%m%d_%H%M%S")
+    return ReportArtifact(f'relatorio_ocorrencias_{timestamp}.pdf', 'application/pdf')
+
+@app.route('/incidents_pdf_report')
+@require_admin_auth
+def incidents_pdf_report():
+    """Generate PDF report of incidents with filters"""
+    try:
+        # Get the same filters as incidents_management
+        params = {
+            'status': request.args.get('status', ''),
+            'reporter': request.args.get('reporter', ''),
+            'classroom': request.args.get('classroom', ''),
+        }
+        if wants_report_job():
+            return enqueue_report_response('incidents_pdf', params)
+        return send_report(build_incidents_pdf, params)
         
     except Exception as e:
         flash(f'Erro ao gerar relatório PDF: {str(e)}', 'error')
@@ -1219,19 +1141,18 @@ def migrate_uploads_to_db():
         
         for classroom in classrooms:
             # Check if classroom has image_filename but no image_data
-            if classroom.image_filename and not classroom.image_data:
+            if classroom.image_filename and not classroom.has_image:
                 old_image_path = os.path.join(uploads_folder, classroom.image_filename)
                 if os.path.exists(old_image_path):
                     try:
                         with open(old_image_path, 'rb') as f:
-                            classroom.image_data = f.read()
                             # Determine mimetype from extension
                             ext = classroom.image_filename.lower().split('.')[-1]
                             mime_map = {
                                 'jpg': 'image/jpeg', 'jpeg': 'image/jpeg',
                                 'png': 'image/png', 'gif': 'image/gif'
                             }
-                            classroom.image_mimetype = mime_map.get(ext, 'image/jpeg')
+                            classroom.set_image(f.read(), mime_map.get(ext, 'image/jpeg'))
                             migrated_count += 1
                     except Exception as e:
                         import logging
@@ -1239,13 +1160,12 @@ def migrate_uploads_to_db():
             
             # Check if classroom has excel_filename but no excel_data
             # Also check Excel files with any uploads pattern
-            if classroom.excel_filename and not classroom.excel_data:
+            if classroom.excel_filename and not classroom.has_excel:
                 old_excel_path = os.path.join(uploads_folder, classroom.excel_filename)
                 if os.path.exists(old_excel_path):
                     try:
                         with open(old_excel_path, 'rb') as f:
-                            classroom.excel_data = f.read()
-                            classroom.excel_mimetype = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+                            classroom.set_excel(f.read(), 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
                             migrated_count += 1
                     except Exception as e:
                         import logging
@@ -1290,8 +1210,8 @@ def add_classroom():
             
             # Set image data after creation
             if image_data:
-                classroom.image_data = image_data
-                classroom.image_mimetype = image_mimetype
+                classroom.set_image(image_data, image_mimetype)
+                attach_image_variants(classroom, image_data)
             
             db.session.add(classroom)
             db.session.commit()
@@ -1498,6 +1418,8 @@ def delete_classroom(classroom_id):
         # Delete the classroom
         db.session.delete(classroom)
         db.session.commit()
+        invalidate_classroom_qr(classroom_id)
+        invalidate_layout(classroom_id)
         
         flash(f'Sala "{classroom_name}" excluída com sucesso!', 'success')
         return redirect(url_for('index'))
@@ -1507,6 +1429,12 @@ def delete_classroom(classroom_id):
         flash(f'Erro ao excluir sala: {str(e)}', 'error')
         return redirect(url_for('edit_classroom', classroom_id=classroom_id))
 
+DASHBOARD_CLASSROOM_FIELDS = ('id', 'name', 'capacity', 'has_computers', 'software', 'description', 'block')
+DASHBOARD_SCHEDULE_FIELDS = ('id', 'classroom_id', 'day_of_week', 'shift', 'course_name', 'instructor', 'start_time', 'end_time')
+
+# Dashboard view models keyed by the normalized filter tuple
+dashboard_cache = VersionedCache(max_entries=256)
+
 @app.route('/dashboard')
 def dashboard():
     # Get filter parameters
@@ -1519,6 +1447,32 @@ def dashboard():
     shift_filter = request.args.get('shift', '')
     week_filter = request.args.get('week', '')  # New week filter parameter
     
+    current_date = get_brazil_time().date()
+    filters = (block_filter, instructor_filter, software_filter, has_computers_filter.lower(),
+               capacity_filter, day_filter, shift_filter, week_filter)
+    
+    view_model = dashboard_cache.get_or_build(
+        filters + (current_date,),
+        data_version(Classroom, Schedule),
+        lambda: build_dashboard_view(*filters, current_date=current_date)
+    )
+    
+    return render_template('dashboard.html', 
+                         current_filters={
+                             'block': block_filter,
+                             'instructor': instructor_filter,
+                             'software': software_filter,
+                             'has_computers': has_computers_filter,
+                             'capacity': capacity_filter,
+                             'day': day_filter,
+                             'shift': shift_filter,
+                             'week': week_filter
+                         },
+                         **view_model)
+
+def build_dashboard_view(block_filter, instructor_filter, software_filter, has_computers_filter,
+                         capacity_filter, day_filter, shift_filter, week_filter, current_date):
+    """Build the dashboard template context from the database (cached by dashboard())"""
     # Build classroom query with filters
     classroom_query = Classroom.query
     if block_filter:
@@ -1541,10 +1495,9 @@ def dashboard():
                 Classroom.capacity <= max_cap
             )
     
-    classrooms = classroom_query.all()
+    classrooms = [snapshot(c, DASHBOARD_CLASSROOM_FIELDS) for c in classroom_query.all()]
     
     # Build schedule query with filters - ONLY SHOW ACTIVE/CURRENT COURSES
-    current_date = get_brazil_time().date()
     
     # Calculate week dates for filtering
     if week_filter:
@@ -1599,7 +1552,7 @@ def dashboard():
     if instructor_filter:
         schedule_query = schedule_query.filter(Schedule.instructor.ilike(f'%{instructor_filter}%'))
     
-    schedules = schedule_query.all()
+    schedules = [snapshot(s, DASHBOARD_SCHEDULE_FIELDS) for s in schedule_query.all()]
     print(f"DEBUG: Dashboard showing {len(schedules)} active/current schedules (expired courses hidden)")
     
     # Filter classrooms by instructor if specified
@@ -1622,37 +1575,43 @@ def dashboard():
     free_slots = total_slots - occupied_slots
     occupancy_rate = (occupied_slots / total_slots * 100) if total_slots > 0 else 0
     
-    # Get unique filter options
-    all_classrooms = Classroom.query.all()
-    blocks = sorted(list(set(c.block for c in all_classrooms if c.block)))
-    all_schedules = Schedule.query.filter_by(is_active=True).all()
-    instructors = sorted(list(set(s.instructor for s in all_schedules if s.instructor and s.instructor.strip())))
-    software_list = sorted(list(set(software.strip() for c in all_classrooms if c.software for software in c.software.split(',') if software.strip())))
+    # Get unique filter options (column-only queries, shared by every filter combination)
+    blocks, instructors, software_list = dashboard_cache.get_or_build(
+        'filter_options',
+        data_version(Classroom, Schedule),
+        build_dashboard_filter_options
+    )
     
-    return render_template('dashboard.html', 
-                         classrooms=classrooms, 
-                         schedule_map=schedule_map,
-                         free_slots=free_slots,
-                         occupied_slots=occupied_slots,
-                         occupancy_rate=occupancy_rate,
-                         blocks=blocks,
-                         instructors=instructors,
-                         software_list=software_list,
-                         current_filters={
-                             'block': block_filter,
-                             'instructor': instructor_filter,
-                             'software': software_filter,
-                             'has_computers': has_computers_filter,
-                             'capacity': capacity_filter,
-                             'day': day_filter,
-                             'shift': shift_filter,
-                             'week': week_filter
-                         },
-                         week_dates={
-                             'monday': week_monday,
-                             'sunday': week_sunday,
-                             'formatted': f"{week_monday.strftime('%d/%m')} - {week_sunday.strftime('%d/%m/%Y')}"
-                         })
+    return {
+        'classrooms': classrooms,
+        'schedule_map': schedule_map,
+        'free_slots': free_slots,
+        'occupied_slots': occupied_slots,
+        'occupancy_rate': occupancy_rate,
+        'blocks': blocks,
+        'instructors': instructors,
+        'software_list': software_list,
+        'week_dates': {
+            'monday': week_monday,
+            'sunday': week_sunday,
+            'formatted': f"{week_monday.strftime('%d/%m')} - {week_sunday.strftime('%d/%m/%Y')}"
+        }
+    }
+
+def build_dashboard_filter_options():
+    """Distinct blocks, instructors and software names for the dashboard filter dropdowns"""
+    blocks = sorted(set(block for (block,) in db.session.query(Classroom.block).distinct() if block))
+    instructors = sorted(set(
+        instructor for (instructor,) in db.session.query(Schedule.instructor).filter_by(is_active=True).distinct()
+        if instructor and instructor.strip()
+    ))
+    software_list = sorted(set(
+        software.strip()
+        for (software_text,) in db.session.query(Classroom.software)
+        if software_text
+        for software in software_text.split(',') if software.strip()
+    ))
+    return blocks, instructors, software_list
 
 @app.route('/availability')
 def availability():
@@ -1733,12 +1692,10 @@ def get_availability_for_date(target_date=None, shift_filter=None):
             'total_rooms': len(classrooms)
         }
     
-    # If no shift filter is provided and we're checking current time, get current shifts
+    # Decide which shifts of the day count as occupied (None = every shift)
     if shift_filter is None or shift_filter == 'all':
-        # If checking current date, determine the primary current shift
         if target_date.date() == get_brazil_time().date():
             current_shifts = get_current_shift()
-            print(f"DEBUG: Checking current date, active shifts: {current_shifts}")
             
             if not current_shifts:  # Outside operating hours
                 return {
@@ -1748,148 +1705,27 @@ def get_availability_for_date(target_date=None, shift_filter=None):
                     'total_rooms': len(classrooms)
                 }
             
-            # Determine which shift to check based on current time
             # Priority: specific shifts (morning, afternoon, night) over fullday
-            primary_shift = None
+            primary_shift = next(shift for shift in ('morning', 'afternoon', 'night', 'fullday') if shift in current_shifts)
+            shifts_to_check = [primary_shift]
             
-            # Check for specific time-based shifts first
-            if 'morning' in current_shifts:
-                primary_shift = 'morning'
-            elif 'afternoon' in current_shifts:
-                primary_shift = 'afternoon'
-            elif 'night' in current_shifts:
-                primary_shift = 'night'
-            elif 'fullday' in current_shifts:
-                primary_shift = 'fullday'
-            
-            occupied_schedules = []
-            
-            if primary_shift:
-                # Get schedules for the primary shift only - PRECISE DATE CHECKING
-                all_schedules = Schedule.query.filter_by(
-                    day_of_week=target_day,
-                    shift=primary_shift,
-                    is_active=True
-                ).all()
-                
-                # Filter by actual course dates
-                active_schedules = []
-                for schedule in all_schedules:
-                    if schedule.start_date and schedule.end_date:
-                        if schedule.start_date <= target_date_only <= schedule.end_date:
-                            active_schedules.append(schedule)
-                            print(f"DEBUG: Schedule {schedule.id} ({schedule.shift}) is ACTIVE (course runs {schedule.start_date} to {schedule.end_date})")
-                        else:
-                            print(f"DEBUG: Schedule {schedule.id} ({schedule.shift}) is EXPIRED/FUTURE (course runs {schedule.start_date} to {schedule.end_date}, today is {target_date_only})")
-                    else:
-                        # If no dates specified, consider it active (backward compatibility)
-                        active_schedules.append(schedule)
-                        print(f"DEBUG: Schedule {schedule.id} ({schedule.shift}) has no date restrictions, treating as active")
-                
-                occupied_schedules.extend(active_schedules)
-                print(f"DEBUG: Using primary shift '{primary_shift}', found {len(active_schedules)} ACTIVE schedules out of {len(all_schedules)} total")
-                
-                # CRITICAL LOGIC: Only add fullday schedules if we're checking for CURRENT time
-                # This prevents fullday classes from appearing when user filters by specific shift
-                if primary_shift in ['morning', 'afternoon'] and target_date.date() == get_brazil_time().date():
-                    all_fullday_schedules = Schedule.query.filter_by(
-                        day_of_week=target_day,
-                        shift='fullday',
-                        is_active=True
-                    ).all()
-                    
-                    active_fullday_schedules = []
-                    for schedule in all_fullday_schedules:
-                        if schedule.start_date and schedule.end_date:
-                            if schedule.start_date <= target_date_only <= schedule.end_date:
-                                active_fullday_schedules.append(schedule)
-                                print(f"DEBUG: Fullday schedule {schedule.id} is ACTIVE (overlaps with current {primary_shift} shift)")
-                            else:
-                                print(f"DEBUG: Fullday schedule {schedule.id} is EXPIRED/FUTURE")
-                        else:
-                            active_fullday_schedules.append(schedule)
-                    
-                    occupied_schedules.extend(active_fullday_schedules)
-                    print(f"DEBUG: Added {len(active_fullday_schedules)} ACTIVE fullday schedules for CURRENT TIME overlap")
-                else:
-                    print(f"DEBUG: Skipping fullday overlap - not checking current time or not morning/afternoon shift")
+            # Fullday classes overlap the CURRENT morning/afternoon period
+            if primary_shift in ['morning', 'afternoon']:
+                shifts_to_check.append('fullday')
         else:
             # For other dates (future/past), check ALL shifts to get complete availability picture
-            print(f"DEBUG: Checking NON-CURRENT date {target_date_only} - checking ALL shifts for complete availability")
-            all_schedules = Schedule.query.filter_by(day_of_week=target_day, is_active=True).all()
-            
-            active_schedules = []
-            for schedule in all_schedules:
-                if schedule.start_date and schedule.end_date:
-                    if schedule.start_date <= target_date_only <= schedule.end_date:
-                        active_schedules.append(schedule)
-                        print(f"DEBUG: Schedule {schedule.id} ({schedule.shift} - {schedule.course_name}) is ACTIVE on {target_date_only}")
-                    else:
-                        print(f"DEBUG: Schedule {schedule.id} ({schedule.shift} - {schedule.course_name}) is EXPIRED/FUTURE on {target_date_only}")
-                else:
-                    active_schedules.append(schedule)
-                    print(f"DEBUG: Schedule {schedule.id} ({schedule.shift} - {schedule.course_name}) has no date restrictions, treating as active")
-            
-            occupied_schedules = active_schedules
-            print(f"DEBUG: Future/past date check - found {len(active_schedules)} ACTIVE schedules out of {len(all_schedules)} total")
+            shifts_to_check = None
     else:
-        # Apply specific shift filter - ULTRA PRECISE: ONLY show rooms occupied by EXACTLY that shift
-        print(f"DEBUG: PRECISE FILTER MODE - Looking for shift '{shift_filter}' on {target_date_only}")
-        
-        # Get schedules that EXACTLY match the requested shift
-        all_schedules = Schedule.query.filter_by(
-            day_of_week=target_day,
-            shift=shift_filter,
-            is_active=True
-        ).all()
-        
-        active_schedules = []
-        for schedule in all_schedules:
-            if schedule.start_date and schedule.end_date:
-                if schedule.start_date <= target_date_only <= schedule.end_date:
-                    active_schedules.append(schedule)
-                    print(f"DEBUG: Schedule {schedule.id} ({schedule.shift} - {schedule.course_name}) is ACTIVE with exact shift filter '{shift_filter}'")
-                else:
-                    print(f"DEBUG: Schedule {schedule.id} ({schedule.shift} - {schedule.course_name}) is EXPIRED/FUTURE with shift filter")
-            else:
-                active_schedules.append(schedule)
-                print(f"DEBUG: Schedule {schedule.id} ({schedule.shift} - {schedule.course_name}) has no date restrictions, treating as active for shift filter")
-        
-        occupied_schedules = active_schedules
-        
-        # CRITICAL: For specific shift filters, we need to consider fullday classes as conflicts too
-        # BUT only when the user is NOT specifically looking for fullday
+        # ULTRA PRECISE: the requested shift plus fullday classes, which conflict with any other shift
+        shifts_to_check = [shift_filter]
         if shift_filter != 'fullday':
-            print(f"DEBUG: Checking if any fullday classes conflict with '{shift_filter}' filter")
-            
-            # Get fullday schedules for this day
-            all_fullday_schedules = Schedule.query.filter_by(
-                day_of_week=target_day,
-                shift='fullday',
-                is_active=True
-            ).all()
-            
-            active_fullday_schedules = []
-            for schedule in all_fullday_schedules:
-                if schedule.start_date and schedule.end_date:
-                    if schedule.start_date <= target_date_only <= schedule.end_date:
-                        active_fullday_schedules.append(schedule)
-                        print(f"DEBUG: Fullday schedule {schedule.id} ({schedule.course_name}) CONFLICTS with '{shift_filter}' filter")
-                    else:
-                        print(f"DEBUG: Fullday schedule {schedule.id} ({schedule.course_name}) is EXPIRED/FUTURE, no conflict")
-                else:
-                    active_fullday_schedules.append(schedule)
-                    print(f"DEBUG: Fullday schedule {schedule.id} ({schedule.course_name}) has no date restrictions, treating as conflict")
-            
-            occupied_schedules.extend(active_fullday_schedules)
-            print(f"DEBUG: Added {len(active_fullday_schedules)} conflicting fullday schedules to '{shift_filter}' filter")
-        
-        print(f"DEBUG: EXACT SHIFT FILTER '{shift_filter}' - found {len(active_schedules)} exact matches + {len(occupied_schedules) - len(active_schedules)} conflicting schedules")
+            shifts_to_check.append('fullday')
     
-    occupied_classroom_ids = set(schedule.classroom_id for schedule in occupied_schedules)
+    occupied_mask, occupied_schedules = occupancy_index.occupied(target_day, target_date_only, shifts_to_check)
+    app.logger.debug(f"Shifts {shifts_to_check or 'all'} on {target_date_only} - {len(occupied_schedules)} active schedules")
     
-    available_rooms = [room for room in classrooms if room.id not in occupied_classroom_ids]
-    occupied_rooms = [room for room in classrooms if room.id in occupied_classroom_ids]
+    available_rooms = [room for room in classrooms if not is_occupied(occupied_mask, room.id)]
+    occupied_rooms = [room for room in classrooms if is_occupied(occupied_mask, room.id)]
     
     # Build period description
     days = ['Segunda', 'Terça', 'Quarta', 'Quinta', 'Sexta', 'Sábado', 'Domingo']
@@ -1957,21 +1793,39 @@ def generate_pdf(classroom_id):
         return redirect(url_for('classroom_detail', classroom_id=classroom_id))
         
     classroom = Classroom.query.get_or_404(classroom_id)
-    schedules = Schedule.query.filter_by(classroom_id=classroom_id, is_active=True).all()
+    schedules = Schedule.query.filter_by(classroom_id=classroom_id, is_active=True).order_by(Schedule.id).all()
     
     try:
-        pdf_buffer = generate_classroom_pdf(classroom, schedules)
-        
-        return send_file(
-            io.BytesIO(pdf_buffer.getvalue()),
-            mimetype='application/pdf',
-            as_attachment=True,
-            download_name=f'sala_{classroom.name.replace(" ", "_")}.pdf'
-        )
+        return send_cached_pdf(cached_classroom_pdf(classroom, schedules),
+                               f'sala_{classroom.name.replace(" ", "_")}.pdf')
     except Exception as e:
         flash(f'Erro ao gerar PDF: {str(e)}', 'error')
         return redirect(url_for('classroom_detail', classroom_id=classroom_id))
 
+def send_cached_pdf(cached, download_name):
+    """Send a (key, BytesIO) pair from pdf_generator's cached_* functions, with the key as ETag"""
+    key, pdf = cached
+    return send_file(pdf, mimetype='application/pdf', as_attachment=True,
+                     download_name=download_name, etag=key, conditional=True)
+
+def report_rows():
+    """Classrooms and active schedules in a stable order, so unchanged data hits the PDF cache"""
+    classrooms = Classroom.query.order_by(Classroom.id).all()
+    schedules = Schedule.query.filter_by(is_active=True).order_by(Schedule.id).all()
+    return classrooms, schedules
+
+@report_job('general_report')
+def build_general_report(params, output):
+    _, pdf = cached_general_report(*report_rows())
+    shutil.copyfileobj(pdf, output)
+    return ReportArtifact('relatorio_geral.pdf', 'application/pdf')
+
+@report_job('availability_report')
+def build_availability_report(params, output):
+    _, pdf = cached_availability_report(*report_rows())
+    shutil.copyfileobj(pdf, output)
+    return ReportArtifact('relatorio_disponibilidade.pdf', 'application/pdf')
+
 @app.route('/generate_general_report')
 def generate_general_report_route():
     if not generate_general_report:
@@ -1979,17 +1833,9 @@ def generate_general_report_route():
         return redirect(url_for('dashboard'))
         
     try:
-        classrooms = Classroom.query.all()
-        schedules = Schedule.query.filter_by(is_active=True).all()
-        
-        pdf_buffer = generate_general_report(classrooms, schedules)
-        
-        return send_file(
-            io.BytesIO(pdf_buffer.getvalue()),
-            mimetype='application/pdf',
-            as_attachment=True,
-            download_name='relatorio_geral.pdf'
-        )
+        if wants_report_job():
+            return enqueue_report_response('general_report')
+        return send_cached_pdf(cached_general_report(*report_rows()), 'relatorio_geral.pdf')
     except Exception as e:
         flash(f'Erro ao gerar relatório: {str(e)}', 'error')
         return redirect(url_for('dashboard'))
@@ -2001,233 +1847,198 @@ def generate_availability_report_route():
         return redirect(url_for('dashboard'))
         
     try:
-        classrooms = Classroom.query.all()
-        schedules = Schedule.query.filter_by(is_active=True).all()
-        
-        pdf_buffer = generate_availability_report(classrooms, schedules)
-        
-        return send_file(
-            io.BytesIO(pdf_buffer.getvalue()),
-            mimetype='application/pdf',
-            as_attachment=True,
-            download_name='relatorio_disponibilidade.pdf'
-        )
+        if wants_report_job():
+            return enqueue_report_response('availability_report')
+        return send_cached_pdf(cached_availability_report(*report_rows()), 'relatorio_disponibilidade.pdf')
     except Exception as e:
         flash(f'Erro ao gerar relatório: {str(e)}', 'error')
         return redirect(url_for('dashboard'))
 
+def classroom_qr_url(classroom_id):
+    return request.url_root.rstrip('/') + url_for('classroom_detail', classroom_id=classroom_id)
+
+def invalidate_classroom_qr(classroom_id):
+    if qr_cache is not None:
+        qr_cache.invalidate(classroom_id)
+
 @app.route('/generate_qr/<int:classroom_id>')
 def generate_qr(classroom_id):
     try:
         classroom = Classroom.query.get_or_404(classroom_id)
         
-        if not generate_qr_code:
+        if not cached_qr_png:
             flash('Geração de QR code não está disponível no momento.', 'error')
             return redirect(url_for('classroom_detail', classroom_id=classroom_id))
         
-        # Generate the full URL for the classroom
-        classroom_url = request.url_root.rstrip('/') + url_for('classroom_detail', classroom_id=classroom_id)
-        
-        qr_buffer = generate_qr_code(classroom_url, classroom.name)
-        safe_filename = f'qr_sala_{classroom.name.replace(" ", "_").replace("/", "_")}.png'
+        png = cached_qr_png(classroom_id, classroom_qr_url(classroom_id), classroom.name)
         
         return send_file(
-            io.BytesIO(qr_buffer.getvalue()),
+            io.BytesIO(png),
             mimetype='image/png',
             as_attachment=True,
-            download_name=safe_filename
+            download_name=qr_filename(classroom.name)
         )
     except Exception as e:
         flash(f'Erro ao gerar QR code: {str(e)}', 'error')
         return redirect(url_for('classroom_detail', classroom_id=classroom_id))
 
+QR_BATCH_FORMATS = ('pdf', 'zip')
+
+@report_job('qr_batch')
+def build_qr_batch(params, output):
+    """Door labels for every classroom, as a printable PDF sheet or a ZIP of PNGs"""
+    rooms = db.session.query(Classroom.id, Classroom.name).order_by(Classroom.block, Classroom.name, Classroom.id).all()
+    # Jobs run without a request; rebuild one for the host the batch was requested from
+    with app.test_request_context(base_url=params['base_url']):
+        labels = [(room_id, classroom_qr_url(room_id), name) for room_id, name in rooms]
+    pngs = render_qr_batch(labels)
+    if params.get('format') == 'zip':
+        write_qr_zip(labels, pngs, output)
+        return ReportArtifact('qr_codes_salas.zip', 'application/zip')
+    write_qr_sheet(labels, pngs, output)
+    return ReportArtifact('qr_codes_salas.pdf', 'application/pdf')
+
+@app.route('/generate_qr_batch')
+@require_admin_auth
+def generate_qr_batch():
+    if not cached_qr_png:
+        flash('Geração de QR code não está disponível no momento.', 'error')
+        return redirect(url_for('index'))
+    
+    try:
+        batch_format = request.args.get('format', 'pdf')
+        if batch_format not in QR_BATCH_FORMATS:
+            batch_format = 'pdf'
+        params = {'format': batch_format, 'base_url': request.url_root}
+        if wants_report_job():
+            return enqueue_report_response('qr_batch', params)
+        return send_report(build_qr_batch, params)
+    except Exception as e:
+        flash(f'Erro ao gerar QR codes: {str(e)}', 'error')
+        return redirect(url_for('index'))
+
+# Background report jobs: report links add ?async=1 when main.js polls for the result
+def wants_report_job():
+    return request.args.get('async') == '1'
+
+def report_job_payload(job):
+    payload = job.to_dict()
+    payload['status_url'] = url_for('report_job_status', job_id=job.id)
+    payload['download_url'] = url_for('download_report_job', job_id=job.id) if job.status == 'done' else None
+    return payload
+
+def enqueue_report_response(kind, params=None):
+    """Queue a report job for the signed-in user and answer 202 with its status payload"""
+    if not current_user.is_authenticated:
+        # Only signed-in users queue jobs; the page falls back to the plain download link
+        return jsonify({'success': False, 'fallback': True}), 401
+    job = enqueue_report(kind, params, owner_id=current_user.id)
+    return jsonify(report_job_payload(job)), 202
+
+def send_report(builder, params=None):
+    """Render a report builder in this request and send it as a download"""
+    output = io.BytesIO()
+    artifact = builder(params or {}, output)
+    output.seek(0)
+    return send_file(output, mimetype=artifact.mimetype, as_attachment=True, download_name=artifact.filename)
+
+def accessible_report_job(job_id):
+    """Report jobs are only visible to the user who requested them"""
+    job = load_job(job_id)
+    if job is not None and current_user.is_authenticated and current_user.id == job.owner_id:
+        return job
+    return None
+
+@app.route('/jobs/<job_id>')
+def report_job_status(job_id):
+    job = accessible_report_job(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Relatório não encontrado ou expirado'}), 404
+    return jsonify(report_job_payload(job))
+
+@app.route('/jobs/<job_id>/download')
+def download_report_job(job_id):
+    job = accessible_report_job(job_id)
+    if job is None or job.status != 'done' or not os.path.exists(result_path(job.id)):
+        flash('Relatório não encontrado ou expirado. Gere o relatório novamente.', 'error')
+        return redirect(url_for('index'))
+    return send_file(result_path(job.id), mimetype=job.mimetype, as_attachment=True, download_name=job.filename)
+
 # Exportação para Excel - versão corrigida
-@app.route('/export_excel')
-def export_excel():
+EXPORT_BATCH_SIZE = 1000
+EXPORT_DAYS = ['Segunda', 'Terça', 'Quarta', 'Quinta', 'Sexta', 'Sábado', 'Domingo']
+EXPORT_SHIFTS = {'morning': 'Manhã', 'afternoon': 'Tarde', 'fullday': 'Integral', 'night': 'Noite'}
+EXPORT_CLASSROOM_HEADERS = ['ID', 'Nome', 'Capacidade', 'Bloco', 'Tem Computadores', 'Softwares', 'Descrição']
+
+def classroom_export_query():
+    """Classroom columns for the Excel exports, without the deferred blobs"""
+    return db.session.query(
+        Classroom.id, Classroom.name, Classroom.capacity, Classroom.block,
+        Classroom.has_computers, Classroom.software, Classroom.description
+    ).order_by(Classroom.id).yield_per(EXPORT_BATCH_SIZE)
+
+def classroom_export_row(classroom):
+    return [classroom.id, classroom.name, classroom.capacity, classroom.block,
+            'Sim' if classroom.has_computers else 'Não', classroom.software, classroom.description]
+
+def build_export_workbook():
+    """Full export: classrooms, schedules and statistics sheets"""
+    book = XlsxStreamWriter()
     try:
-        # Check if openpyxl is available
-        if not openpyxl:
-            flash('Funcionalidade de Excel não está disponível no momento.', 'error')
-            return redirect(url_for('dashboard'))
-            
-        # Create workbook and worksheet
-        wb = openpyxl.Workbook()
-        
         # Sheet 1: Classrooms
-        ws1 = wb.active
-        ws1.title = "Salas de Aula"
-        
-        # Import openpyxl styles if available
-        try:
-            from openpyxl.styles import Font, PatternFill, Alignment
-        except ImportError:
-            Font = PatternFill = Alignment = None
-        
-        # Headers for classrooms
-        headers1 = ['ID', 'Nome', 'Capacidade', 'Bloco', 'Tem Computadores', 'Softwares', 'Descrição']
-        for col, header in enumerate(headers1, 1):
-            cell = ws1.cell(row=1, column=col)
-            if cell:
-                cell.value = header
-                if Font:
-                    cell.font = Font(bold=True, color='FFFFFF')
-                if PatternFill:
-                    cell.fill = PatternFill(start_color='366092', end_color='366092', fill_type='solid')
-                if Alignment:
-                    cell.alignment = Alignment(horizontal='center')
-        
-        # Data for classrooms
-        classrooms = Classroom.query.all()
-        for row, classroom in enumerate(classrooms, 2):
-            ws1.cell(row=row, column=1).value = classroom.id
-            ws1.cell(row=row, column=2).value = classroom.name
-            ws1.cell(row=row, column=3).value = classroom.capacity
-            ws1.cell(row=row, column=4).value = classroom.block
-            ws1.cell(row=row, column=5).value = 'Sim' if classroom.has_computers else 'Não'
-            ws1.cell(row=row, column=6).value = classroom.software
-            ws1.cell(row=row, column=7).value = classroom.description
-        
-        # Auto-fit columns with safer approach
-        try:
-            for column_cells in ws1.columns:
-                if column_cells and len(column_cells) > 0:
-                    max_length = 0
-                    column_letter = column_cells[0].column_letter
-                    for cell in column_cells:
-                        try:
-                            if cell and cell.value and len(str(cell.value)) > max_length:
-                                max_length = len(str(cell.value))
-                        except:
-                            pass
-                    adjusted_width = min(max_length + 2, 50)
-                    if ws1.column_dimensions and column_letter:
-                        ws1.column_dimensions[column_letter].width = adjusted_width
-        except Exception:
-            pass  # Skip column sizing if there are issues
-        
-        # Sheet 2: Schedules
-        ws2 = wb.create_sheet(title="Horários")
-        
-        # Headers for schedules
-        headers2 = ['ID', 'Sala', 'Dia da Semana', 'Turno', 'Curso', 'Professor', 'Início', 'Fim', 'Ativo']
-        for col, header in enumerate(headers2, 1):
-            cell = ws2.cell(row=1, column=col)
-            if cell:
-                cell.value = header
-                if Font:
-                    cell.font = Font(bold=True, color='FFFFFF')
-                if PatternFill:
-                    cell.fill = PatternFill(start_color='366092', end_color='366092', fill_type='solid')
-                if Alignment:
-                    cell.alignment = Alignment(horizontal='center')
-        
-        # Data for schedules
-        schedules = Schedule.query.all()
-        days = ['Segunda', 'Terça', 'Quarta', 'Quinta', 'Sexta', 'Sábado', 'Domingo']
-        shifts = {'morning': 'Manhã', 'afternoon': 'Tarde', 'fullday': 'Integral', 'night': 'Noite'}
-        
-        for row, schedule in enumerate(schedules, 2):
-            classroom = Classroom.query.get(schedule.classroom_id)
-            ws2.cell(row=row, column=1).value = schedule.id
-            ws2.cell(row=row, column=2).value = classroom.name if classroom else 'N/A'
-            ws2.cell(row=row, column=3).value = days[schedule.day_of_week]
-            ws2.cell(row=row, column=4).value = shifts.get(schedule.shift, schedule.shift)
-            ws2.cell(row=row, column=5).value = schedule.course_name
-            ws2.cell(row=row, column=6).value = schedule.instructor
-            ws2.cell(row=row, column=7).value = schedule.start_time
-            ws2.cell(row=row, column=8).value = schedule.end_time
-            ws2.cell(row=row, column=9).value = 'Sim' if schedule.is_active else 'Não'
-        
-        # Auto-fit columns for sheet 2
-        for column_cells in ws2.columns:
-            max_length = 0
-            column_letter = column_cells[0].column_letter
-            for cell in column_cells:
-                try:
-                    if cell.value and len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)
-            ws2.column_dimensions[column_letter].width = adjusted_width
+        classrooms_sheet = book.add_sheet("Salas de Aula", EXPORT_CLASSROOM_HEADERS)
+        total_classrooms = with_computers = 0
+        for classroom in classroom_export_query():
+            classrooms_sheet.append(classroom_export_row(classroom))
+            total_classrooms += 1
+            if classroom.has_computers:
+                with_computers += 1
+        
+        # Sheet 2: Schedules, joined to their classroom in a single query
+        schedules_sheet = book.add_sheet("Horários", ['ID', 'Sala', 'Dia da Semana', 'Turno', 'Curso', 'Professor', 'Início', 'Fim', 'Ativo'])
+        schedules = db.session.query(
+            Schedule.id, Schedule.day_of_week, Schedule.shift, Schedule.course_name,
+            Schedule.instructor, Schedule.start_time, Schedule.end_time, Schedule.is_active,
+            db.func.coalesce(Classroom.name, 'N/A').label('classroom_name')
+        ).outerjoin(Classroom, Classroom.id == Schedule.classroom_id).order_by(Schedule.id).yield_per(EXPORT_BATCH_SIZE)
+        
+        active_schedules = 0
+        for schedule in schedules:
+            schedules_sheet.append([
+                schedule.id, schedule.classroom_name, EXPORT_DAYS[schedule.day_of_week],
+                EXPORT_SHIFTS.get(schedule.shift, schedule.shift), schedule.course_name,
+                schedule.instructor, schedule.start_time, schedule.end_time,
+                'Sim' if schedule.is_active else 'Não'
+            ])
+            if schedule.is_active:
+                active_schedules += 1
         
         # Sheet 3: Statistics
-        ws3 = wb.create_sheet(title="Estatísticas")
-        ws3.cell(row=1, column=1).value = "Estatística"
-        ws3.cell(row=1, column=2).value = "Valor"
-        
-        # Style headers
-        for col in [1, 2]:
-            cell = ws3.cell(row=1, column=col)
-            cell.font = Font(bold=True, color='FFFFFF')
-            cell.fill = PatternFill(start_color='366092', end_color='366092', fill_type='solid')
-            cell.alignment = Alignment(horizontal='center')
-        
-        # Statistics data
-        total_classrooms = len(classrooms)
-        total_schedules = len([s for s in schedules if s.is_active])
+        stats_sheet = book.add_sheet("Estatísticas", ["Estatística", "Valor"])
         total_slots = total_classrooms * 23  # 6 days * 4 shifts - 1 (no Saturday night)
-        occupancy_rate = (total_schedules / total_slots * 100) if total_slots > 0 else 0
+        occupancy_rate = (active_schedules / total_slots * 100) if total_slots > 0 else 0
         
         stats_data = [
             ['Total de Salas', total_classrooms],
-            ['Total de Horários Ativos', total_schedules],
+            ['Total de Horários Ativos', active_schedules],
             ['Taxa de Ocupação (%)', f"{occupancy_rate:.1f}%"],
-            ['Salas com Computadores', len([c for c in classrooms if c.has_computers])],
-            ['Salas sem Computadores', len([c for c in classrooms if not c.has_computers])]
+            ['Salas com Computadores', with_computers],
+            ['Salas sem Computadores', total_classrooms - with_computers]
         ]
-        
-        for row, (stat, value) in enumerate(stats_data, 2):
-            ws3.cell(row=row, column=1).value = stat
-            ws3.cell(row=row, column=2).value = value
-        
-        # Auto-fit columns for sheet 3
-        for column_cells in ws3.columns:
-            max_length = 0
-            column_letter = column_cells[0].column_letter
-            for cell in column_cells:
-                try:
-                    if cell.value and len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)
-            ws3.column_dimensions[column_letter].width = adjusted_width
-        
-        # Save to BytesIO
-        output = io.BytesIO()
-        wb.save(output)
-        output.seek(0)
-        
-        # Generate filename with timestamp
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f'relatorio_senai_{timestamp}.xlsx'
-        
-        response = make_response(output.getvalue())
-        response.headers['Content-Disposition'] = f'attachment; filename={filename}'
-        response.headers['Content-Type'] = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        
-        return response
-    except Exception as e:
-        flash(f'Erro ao gerar Excel: {str(e)}', 'error')
-        return redirect(url_for('dashboard'))
+        for row in stats_data:
+            stats_sheet.append(row)
+    except Exception:
+        book.close()
+        raise
+    return book
 
-@app.route('/export_filtered_excel')
-def export_filtered_excel():
+def build_filtered_export_workbook(block_filter='', has_computers_filter='', capacity_filter=''):
+    """Classrooms sheet restricted by the dashboard filters"""
+    book = XlsxStreamWriter()
     try:
-        # Get the same filters as dashboard
-        block_filter = request.args.get('block', '')
-        # Remove floor filter as it doesn't exist in the model
-        has_computers_filter = request.args.get('has_computers', '')
-        capacity_filter = request.args.get('capacity', '')
-        day_filter = request.args.get('day', '')
-        shift_filter = request.args.get('shift', '')
-        
-        # Build filtered queries
-        classroom_query = Classroom.query
+        classroom_query = classroom_export_query()
         if block_filter:
             classroom_query = classroom_query.filter(Classroom.block == block_filter)
-        # Remove floor filter as it doesn't exist in the model
         if has_computers_filter:
             has_computers_bool = has_computers_filter.lower() == 'true'
             classroom_query = classroom_query.filter(Classroom.has_computers == has_computers_bool)
@@ -2244,78 +2055,59 @@ def export_filtered_excel():
                     Classroom.capacity <= max_cap
                 )
         
-        filtered_classrooms = classroom_query.all()
-        
-        # Build schedule query with filters
-        schedule_query = Schedule.query.filter_by(is_active=True)
-        if day_filter:
-            schedule_query = schedule_query.filter(Schedule.day_of_week == int(day_filter))
-        if shift_filter:
-            schedule_query = schedule_query.filter(Schedule.shift == shift_filter)
-        
-        filtered_schedules = schedule_query.all()
-        
-        # Create Excel file similar to export_excel but with filtered data
-        wb = openpyxl.Workbook()
-        ws1 = wb.active
-        ws1.title = "Salas Filtradas"
-        
-        # Headers
-        headers = ['ID', 'Nome', 'Capacidade', 'Bloco', 'Tem Computadores', 'Softwares', 'Descrição']
-        for col, header in enumerate(headers, 1):
-            cell = ws1.cell(row=1, column=col)
-            if cell:
-                cell.value = header
-                try:
-                    from openpyxl.styles import Font, PatternFill, Alignment
-                    cell.font = Font(bold=True, color='FFFFFF')
-                    cell.fill = PatternFill(start_color='366092', end_color='366092', fill_type='solid')
-                    cell.alignment = Alignment(horizontal='center')
-                except ImportError:
-                    pass  # Styles not available
-        
-        # Data
-        for row, classroom in enumerate(filtered_classrooms, 2):
-            ws1.cell(row=row, column=1).value = classroom.id
-            ws1.cell(row=row, column=2).value = classroom.name
-            ws1.cell(row=row, column=3).value = classroom.capacity
-            ws1.cell(row=row, column=4).value = classroom.block
-            ws1.cell(row=row, column=5).value = 'Sim' if classroom.has_computers else 'Não'
-            ws1.cell(row=row, column=6).value = classroom.software
-            ws1.cell(row=row, column=7).value = classroom.description
-        
-        # Auto-fit columns with safer approach
-        try:
-            for column_cells in ws1.columns:
-                if column_cells and len(column_cells) > 0:
-                    max_length = 0
-                    column_letter = column_cells[0].column_letter
-                    for cell in column_cells:
-                        try:
-                            if cell and cell.value and len(str(cell.value)) > max_length:
-                                max_length = len(str(cell.value))
-                        except:
-                            pass
-                    adjusted_width = min(max_length + 2, 50)
-                    if ws1.column_dimensions and column_letter:
-                        ws1.column_dimensions[column_letter].width = adjusted_width
-        except Exception:
-            pass  # Skip column sizing if there are issues
-        
-        # Save to BytesIO
-        output = io.BytesIO()
-        wb.save(output)
-        output.seek(0)
-        
-        # Generate filename with timestamp
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f'relatorio_filtrado_{timestamp}.xlsx'
-        
-        response = make_response(output.getvalue())
-        response.headers['Content-Disposition'] = f'attachment; filename={filename}'
-        response.headers['Content-Type'] = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        
-        return response
+        sheet = book.add_sheet("Salas Filtradas", EXPORT_CLASSROOM_HEADERS)
+        for classroom in classroom_query:
+            sheet.append(classroom_export_row(classroom))
+    except Exception:
+        book.close()
+        raise
+    return book
+
+def xlsx_filename(prefix):
+    return f'{prefix}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx'
+
+def xlsx_download(book, prefix):
+    """Stream a workbook as an attachment named <prefix>_<timestamp>.xlsx"""
+    response = Response(book.stream(), mimetype=XLSX_MIMETYPE)
+    response.headers['Content-Disposition'] = f'attachment; filename={xlsx_filename(prefix)}'
+    return response
+
+@report_job('excel_export')
+def build_excel_export(params, output):
+    for chunk in build_export_workbook().stream():
+        output.write(chunk)
+    return ReportArtifact(xlsx_filename('relatorio_senai'), XLSX_MIMETYPE)
+
+@report_job('filtered_excel_export')
+def build_filtered_excel_export(params, output):
+    book = build_filtered_export_workbook(params.get('block', ''), params.get('has_computers', ''), params.get('capacity', ''))
+    for chunk in book.stream():
+        output.write(chunk)
+    return ReportArtifact(xlsx_filename('relatorio_filtrado'), XLSX_MIMETYPE)
+
+@app.route('/export_excel')
+def export_excel():
+    try:
+        if wants_report_job():
+            return enqueue_report_response('excel_export')
+        return xlsx_download(build_export_workbook(), 'relatorio_senai')
+    except Exception as e:
+        flash(f'Erro ao gerar Excel: {str(e)}', 'error')
+        return redirect(url_for('dashboard'))
+
+@app.route('/export_filtered_excel')
+def export_filtered_excel():
+    try:
+        # Get the same filters as dashboard
+        params = {
+            'block': request.args.get('block', ''),
+            'has_computers': request.args.get('has_computers', ''),
+            'capacity': request.args.get('capacity', ''),
+        }
+        if wants_report_job():
+            return enqueue_report_response('filtered_excel_export', params)
+        book = build_filtered_export_workbook(params['block'], params['has_computers'], params['capacity'])
+        return xlsx_download(book, 'relatorio_filtrado')
     except Exception as e:
         flash(f'Erro ao gerar Excel filtrado: {str(e)}', 'error')
         return redirect(url_for('dashboard'))
@@ -2456,10 +2248,13 @@ def admin_schedule_requests():
     if status_filter and status_filter != 'all':
         query = query.filter(ScheduleRequest.status == status_filter)
     
-    schedule_requests = query.order_by(ScheduleRequest.created_at.desc()).all()
+    page = paginate_keyset(query, (ScheduleRequest.created_at, ScheduleRequest.id),
+                           after=request.args.get('after'), before=request.args.get('before'),
+                           per_page=page_size(request.args.get('per_page'), default=20))
     
     return render_template('admin_schedule_requests.html', 
-                         requests=schedule_requests, 
+                         requests=page.items, 
+                         page=page,
                          current_status=status_filter)
 
 @app.route('/admin/schedule_request/<int:request_id>/action', methods=['POST'])
@@ -4173,7 +3968,7 @@ def upload_class_group(classroom_id):
         
         # If admin is creating and no teachers selected, add current user if they're a teacher
         if not teacher_ids and current_user.role == 'teacher':
-            class_group.teachers.append(current_user)
+            class_group.teachers.append(current_user.record)
         
         # Create student records
         for student_data in students_data:
@@ -4210,7 +4005,7 @@ def delete_class_group(classroom_id, group_id):
     # Teachers can only delete class groups where they are assigned
     if not current_user.is_admin():
         is_assigned = (class_group.teacher_id == current_user.id or 
-                      current_user in class_group.teachers)
+                      current_user.record in class_group.teachers)
         if not is_assigned:
             flash('Você só pode deletar turmas onde está atribuído como docente', 'error')
             return redirect(url_for('asset_management', classroom_id=classroom_id))
@@ -4233,25 +4028,13 @@ def delete_class_group(classroom_id, group_id):
 def layout_designer(classroom_id):
     """Layout designer page for creating/editing room layout"""
     classroom = Classroom.query.get_or_404(classroom_id)
-    layout = ClassroomLayout.query.filter_by(classroom_id=classroom_id).first()
-    
-    # Get existing workstations if layout exists
-    workstations = []
-    layout_data = {}
-    if layout:
-        workstations_db = Workstation.query.filter_by(layout_id=layout.id).all()
-        workstations = [ws.to_dict() for ws in workstations_db]
-        if layout.layout_data:
-            try:
-                layout_data = json.loads(layout.layout_data)
-            except:
-                layout_data = {}
+    layout = get_layout(classroom_id)
     
     return render_template('layout_designer.html',
                          classroom=classroom,
                          layout=layout,
-                         workstations=workstations,
-                         layout_data=layout_data)
+                         workstations=layout.workstations if layout else [],
+                         layout_data=layout.layout_data if layout else {})
 
 @app.route('/classroom/<int:classroom_id>/save_layout', methods=['POST'])
 @require_teacher_or_admin
@@ -4300,6 +4083,7 @@ def save_layout(classroom_id):
             db.session.add(workstation)
         
         db.session.commit()
+        invalidate_layout(classroom_id)
         flash(f'Layout salvo com sucesso! {len(workstations_data)} computadores configurados.', 'success')
         
     except Exception as e:
@@ -4317,33 +4101,15 @@ def save_layout(classroom_id):
 def assign_students_page(classroom_id):
     """Page for assigning students to workstations"""
     classroom = Classroom.query.get_or_404(classroom_id)
-    layout = ClassroomLayout.query.filter_by(classroom_id=classroom_id).first()
+    layout = get_layout(classroom_id)
     
     if not layout:
         flash('Crie um layout primeiro antes de atribuir alunos', 'error')
         return redirect(url_for('asset_management', classroom_id=classroom_id))
     
     class_groups = ClassGroup.query.filter_by(classroom_id=classroom_id).all()
-    workstations_db = Workstation.query.filter_by(layout_id=layout.id).order_by(Workstation.number).all()
-    
-    # Convert workstations to JSON-serializable dictionaries
-    workstations = []
-    for ws in workstations_db:
-        workstations.append({
-            'id': ws.id,
-            'number': ws.number,
-            'position_x': ws.position_x,
-            'position_y': ws.position_y,
-            'notes': ws.notes
-        })
-    
-    # Parse layout data
-    layout_data = {}
-    if layout and layout.layout_data:
-        try:
-            layout_data = json.loads(layout.layout_data)
-        except:
-            layout_data = {}
+    workstations = layout.workstations
+    layout_data = layout.layout_data
     
     # Get selected class group
     selected_group_id = request.args.get('group_id', type=int)
@@ -4421,106 +4187,73 @@ def save_assignments(classroom_id):
     
     return redirect(url_for('assign_students_page', classroom_id=classroom_id, group_id=class_group_id))
 
+def layout_occupancy(classroom_id, class_group_id=None):
+    """
+    Students per workstation and today's present students of a classroom
+    (optionally one class group), shared by layout_view and api_layout_status.
+    One joined query for the assignments, one for attendance.
+    """
+    from datetime import date
+    
+    assignments = db.session.query(
+        WorkstationAssignment.workstation_id, Student.id, Student.class_group_id, Student.name,
+        Student.row_number, ClassGroup.name
+    ).join(Student, Student.id == WorkstationAssignment.student_id).join(
+        ClassGroup, ClassGroup.id == WorkstationAssignment.class_group_id
+    ).filter(ClassGroup.classroom_id == classroom_id)
+    
+    present = db.session.query(AttendanceRecord.student_id).join(
+        AttendanceSession, AttendanceSession.id == AttendanceRecord.attendance_session_id
+    ).filter(
+        AttendanceSession.classroom_id == classroom_id,
+        AttendanceSession.session_date == date.today(),
+        AttendanceRecord.status == 'present'
+    )
+    
+    if class_group_id:
+        assignments = assignments.filter(WorkstationAssignment.class_group_id == class_group_id)
+        present = present.filter(AttendanceSession.class_group_id == class_group_id)
+    
+    assignments_map = {}
+    for ws_id, student_id, group_id, name, row_number, group_name in assignments.order_by(
+            ClassGroup.id, WorkstationAssignment.id):
+        assignments_map.setdefault(ws_id, []).append({
+            'id': student_id,
+            'class_group_id': group_id,
+            'name': name,
+            'row_number': row_number,
+            'class_group_name': group_name,
+        })
+    
+    return assignments_map, [student_id for (student_id,) in present.distinct()]
+
 @app.route('/classroom/<int:classroom_id>/layout_view')
 def layout_view(classroom_id):
     """Public view of room layout (read-only)"""
     classroom = Classroom.query.get_or_404(classroom_id)
-    layout = ClassroomLayout.query.filter_by(classroom_id=classroom_id).first()
+    layout = get_layout(classroom_id)
     
     if not layout:
         flash('Esta sala ainda não possui um layout configurado', 'info')
         return redirect(url_for('classroom_detail', classroom_id=classroom_id))
     
     class_groups = ClassGroup.query.filter_by(classroom_id=classroom_id).all()
-    workstations_db = Workstation.query.filter_by(layout_id=layout.id).order_by(Workstation.number).all()
-    
-    # Convert workstations to JSON-serializable dictionaries
-    workstations = [ws.to_dict() for ws in workstations_db]
-    
-    # Get all assignments for all groups in this classroom
-    assignments_map = {}
-    present_students = set()
     
     # Get selected class group for filtering
     selected_group_id = request.args.get('group_id', type=int)
-    selected_group = None
+    selected_group = next((group for group in class_groups if group.id == selected_group_id), None)
     
-    if selected_group_id:
-        selected_group = ClassGroup.query.get(selected_group_id)
-        if selected_group and selected_group.classroom_id == classroom_id:
-            # Filter by selected group
-            assignments = WorkstationAssignment.query.filter_by(class_group_id=selected_group_id).all()
-            for assignment in assignments:
-                ws_id = assignment.workstation_id
-                if ws_id not in assignments_map:
-                    assignments_map[ws_id] = []
-                student_dict = assignment.student.to_dict()
-                student_dict['class_group_name'] = assignment.class_group.name
-                assignments_map[ws_id].append(student_dict)
-            
-            # Get today's attendance sessions for this group
-            from datetime import date
-            today = date.today()
-            sessions = AttendanceSession.query.filter_by(
-                classroom_id=classroom_id,
-                class_group_id=selected_group_id,
-                session_date=today
-            ).all()
-            
-            # Get present students from all sessions
-            for session in sessions:
-                records = AttendanceRecord.query.filter_by(
-                    attendance_session_id=session.id,
-                    status='present'
-                ).all()
-                for record in records:
-                    present_students.add(record.student_id)
-    else:
-        # Show all assignments from all groups
-        for group in class_groups:
-            assignments = WorkstationAssignment.query.filter_by(class_group_id=group.id).all()
-            for assignment in assignments:
-                ws_id = assignment.workstation_id
-                if ws_id not in assignments_map:
-                    assignments_map[ws_id] = []
-                student_dict = assignment.student.to_dict()
-                student_dict['class_group_name'] = assignment.class_group.name
-                assignments_map[ws_id].append(student_dict)
-        
-        # Get today's attendance sessions for all groups
-        from datetime import date
-        today = date.today()
-        sessions = AttendanceSession.query.filter_by(
-            classroom_id=classroom_id,
-            session_date=today
-        ).all()
-        
-        # Get present students from all sessions
-        for session in sessions:
-            records = AttendanceRecord.query.filter_by(
-                attendance_session_id=session.id,
-                status='present'
-            ).all()
-            for record in records:
-                present_students.add(record.student_id)
-    
-    # Parse layout data
-    layout_data = {}
-    if layout.layout_data:
-        try:
-            layout_data = json.loads(layout.layout_data)
-        except:
-            layout_data = {}
+    assignments_map, present_students = layout_occupancy(classroom_id, selected_group.id if selected_group else None)
     
     return render_template('layout_view.html',
                          classroom=classroom,
                          layout=layout,
-                         layout_data=layout_data,
+                         layout_data=layout.layout_data,
                          class_groups=class_groups,
-                         workstations=workstations,
+                         workstations=layout.workstations,
                          selected_group=selected_group,
                          assignments_map=assignments_map,
-                         present_students=list(present_students))
+                         present_students=present_students)
 
 # API endpoints for AJAX requests
 
@@ -4528,50 +4261,22 @@ def layout_view(classroom_id):
 def api_layout_status(classroom_id):
     """Get real-time layout status with attendance data"""
     classroom = Classroom.query.get_or_404(classroom_id)
-    layout = ClassroomLayout.query.filter_by(classroom_id=classroom_id).first()
+    layout = get_layout(classroom_id)
     
     if not layout:
         return jsonify({'success': False, 'error': 'Layout not found'}), 404
     
-    # Get selected class group
+    # Same model as layout_view; an unknown group or one from another room selects all groups
     selected_group_id = request.args.get('group_id', type=int)
+    if selected_group_id and not ClassGroup.query.filter_by(id=selected_group_id, classroom_id=classroom_id).count():
+        selected_group_id = None
     
-    assignments_map = {}
-    present_students = set()
-    
-    if selected_group_id:
-        selected_group = ClassGroup.query.get(selected_group_id)
-        if selected_group and selected_group.classroom_id == classroom_id:
-            assignments = WorkstationAssignment.query.filter_by(class_group_id=selected_group_id).all()
-            for assignment in assignments:
-                ws_id = assignment.workstation_id
-                if ws_id not in assignments_map:
-                    assignments_map[str(ws_id)] = []
-                student_dict = assignment.student.to_dict()
-                student_dict['class_group_name'] = assignment.class_group.name
-                assignments_map[str(ws_id)].append(student_dict)
-            
-            # Get today's attendance
-            from datetime import date
-            today = date.today()
-            sessions = AttendanceSession.query.filter_by(
-                classroom_id=classroom_id,
-                class_group_id=selected_group_id,
-                session_date=today
-            ).all()
-            
-            for session in sessions:
-                records = AttendanceRecord.query.filter_by(
-                    attendance_session_id=session.id,
-                    status='present'
-                ).all()
-                for record in records:
-                    present_students.add(record.student_id)
+    assignments_map, present_students = layout_occupancy(classroom_id, selected_group_id)
     
     return jsonify({
         'success': True,
         'assignments': assignments_map,
-        'present_students': list(present_students)
+        'present_students': present_students
     })
 
 @app.route('/api/classroom/<int:classroom_id>/class_groups')
@@ -4603,25 +4308,17 @@ def api_students(classroom_id, group_id):
 @app.route('/api/classroom/<int:classroom_id>/workstations')
 def api_workstations(classroom_id):
     """Get all workstations for a classroom"""
-    layout = ClassroomLayout.query.filter_by(classroom_id=classroom_id).first()
+    layout = get_layout(classroom_id)
     
     if not layout:
         return jsonify({'success': False, 'error': 'No layout found'}), 404
     
-    workstations = Workstation.query.filter_by(layout_id=layout.id).order_by(Workstation.number).all()
-    
-    layout_data = {}
-    if layout.layout_data:
-        try:
-            layout_data = json.loads(layout.layout_data)
-        except:
-            pass
-    
-    return jsonify({
-        'success': True,
-        'layout_data': layout_data,
-        'workstations': [ws.to_dict() for ws in workstations]
-    })
+    # Body serialized once per snapshot; clients revalidate with the content ETag
+    response = make_response(layout.api_body)
+    response.mimetype = 'application/json'
+    response.set_etag(layout.etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
 
 @app.route('/api/workstation/<int:workstation_id>/update_notes', methods=['POST'])
 @require_admin_auth
@@ -4633,8 +4330,10 @@ def update_workstation_notes(workstation_id):
         data = request.get_json()
         notes = data.get('notes', '')
         
+        classroom_id = workstation.layout.classroom_id
         workstation.notes = notes
         db.session.commit()
+        invalidate_layout(classroom_id)
         
         return jsonify({'success': True, 'message': 'Observações atualizadas'})
         
@@ -4648,7 +4347,7 @@ def update_workstation_notes(workstation_id):
 @require_admin_auth
 def download_class_group_excel(group_id):
     """Download the original Excel file for a class group"""
-    class_group = ClassGroup.query.get_or_404(group_id)
+    class_group = ClassGroup.query.options(db.undefer(ClassGroup.excel_data)).get_or_404(group_id)
     
     if not class_group.excel_data:
         flash('Arquivo Excel não encontrado', 'error')
@@ -4669,8 +4368,6 @@ def start_attendance(classroom_id):
     
     if request.method == 'POST':
         try:
-            from models import AttendanceSession, AttendanceRecord, WorkstationAssignment
-            
             class_group_id = int(request.form.get('class_group_id'))
             session_date_str = request.form.get('session_date')
             
@@ -4681,37 +4378,10 @@ def start_attendance(classroom_id):
             
             session_date = datetime.strptime(session_date_str, '%Y-%m-%d').date()
             
-            existing_session = AttendanceSession.query.filter_by(
-                classroom_id=classroom_id,
-                class_group_id=class_group_id,
-                session_date=session_date
-            ).first()
-            
-            if existing_session:
-                return redirect(url_for('attendance_page', session_id=existing_session.id))
-            
-            session = AttendanceSession(
-                classroom_id=classroom_id,
-                class_group_id=class_group_id,
-                session_date=session_date,
-                status='active',
-                created_by=current_user.name
-            )
-            db.session.add(session)
-            db.session.flush()
-            
-            students = Student.query.filter_by(class_group_id=class_group_id).all()
-            assignments = WorkstationAssignment.query.filter_by(class_group_id=class_group_id).all()
-            assignment_map = {a.student_id: a.workstation_id for a in assignments}
-            
-            for student in students:
-                record = AttendanceRecord(
-                    attendance_session_id=session.id,
-                    student_id=student.id,
-                    workstation_id=assignment_map.get(student.id),
-                    status='absent'
-                )
-                db.session.add(record)
+            # Records for the whole group are created with one INSERT ... SELECT
+            session, created = start_session(classroom_id, class_group_id, session_date, created_by=current_user.name)
+            if not created:
+                return redirect(url_for('attendance_page', session_id=session.id))
             
             db.session.commit()
             flash('Sessão de chamada iniciada com sucesso!', 'success')
@@ -4740,21 +4410,14 @@ def attendance_page(session_id):
     session = AttendanceSession.query.get_or_404(session_id)
     classroom = session.classroom
     class_group = session.class_group
-    layout = ClassroomLayout.query.filter_by(classroom_id=classroom.id).first()
+    layout = get_layout(classroom.id)
     
     if not layout:
         flash('Esta sala não possui layout configurado', 'error')
         return redirect(url_for('asset_management', classroom_id=classroom.id))
     
-    layout_data = {}
-    if layout.layout_data:
-        try:
-            layout_data = json.loads(layout.layout_data)
-        except:
-            layout_data = {}
-    
-    workstations_db = Workstation.query.filter_by(layout_id=layout.id).order_by(Workstation.number).all()
-    workstations = [ws.to_dict() for ws in workstations_db]
+    layout_data = layout.layout_data
+    workstations = layout.workstations
     records_db = AttendanceRecord.query.filter_by(attendance_session_id=session_id).all()
     
     # Convert records to dictionaries for JSON serialization
@@ -4787,7 +4450,7 @@ def update_attendance(session_id):
         status = data.get('status')
         workstation_id = data.get('workstation_id')
         
-        if status not in ['present', 'absent', 'unassigned']:
+        if status not in ATTENDANCE_STATUSES:
             return jsonify({'success': False, 'error': 'Status inválido'}), 400
         
         record = AttendanceRecord.query.filter_by(
@@ -4798,9 +4461,11 @@ def update_attendance(session_id):
         if not record:
             return jsonify({'success': False, 'error': 'Registro não encontrado'}), 404
         
+        old_status = record.status
         record.status = status
         record.workstation_id = int(workstation_id) if workstation_id else None
         record.updated_at = datetime.utcnow()
+        record.version = bump_attendance_version(session_id)
         
         if status == 'present' and not record.check_in_time:
             record.check_in_time = datetime.utcnow()
@@ -4808,12 +4473,19 @@ def update_attendance(session_id):
             record.check_in_time = None
             record.check_out_time = None
         
+        stats = StatChanges()
+        stats.status_changed(student_id, session.class_group_id, session.session_date,
+                             old_status, status, record.check_in_time)
+        stats.apply()
         db.session.commit()
         
+        record_data = record.to_dict()
+        publish_attendance_change(session, record.version)
+        
         return jsonify({
             'success': True,
             'message': 'Presença atualizada',
-            'record': record.to_dict()
+            'record': record_data
         })
         
     except Exception as e:
@@ -4822,28 +4494,252 @@ def update_attendance(session_id):
         logging.error(f"Error updating attendance: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+ATTENDANCE_STATUSES = ('present', 'absent', 'unassigned')
+ATTENDANCE_BULK_MAX = 500
+
+@app.route('/api/attendance/<int:session_id>/bulk', methods=['POST'])
+@require_teacher_or_admin
+def bulk_update_attendance(session_id):
+    """
+    Apply a batch of {student_id, status, workstation_id} changes in one transaction.
+
+    Each status gets a single UPDATE (workstations via CASE on student_id), all
+    under one new session version, which is returned as the cursor.
+    """
+    from sqlalchemy import case
+    
+    session = AttendanceSession.query.get_or_404(session_id)
+    try:
+        data = request.get_json(silent=True) or {}
+        changes = data.get('changes')
+        
+        if not isinstance(changes, list) or not changes:
+            return jsonify({'success': False, 'error': 'Nenhuma alteração enviada'}), 400
+        if len(changes) > ATTENDANCE_BULK_MAX:
+            return jsonify({'success': False, 'error': f'Máximo de {ATTENDANCE_BULK_MAX} alterações por envio'}), 400
+        
+        # Later changes for the same student win
+        latest = {}
+        for change in changes:
+            try:
+                student_id = int(change['student_id'])
+                workstation_id = int(change['workstation_id']) if change.get('workstation_id') else None
+            except (KeyError, TypeError, ValueError):
+                return jsonify({'success': False, 'error': 'Alteração inválida'}), 400
+            if change.get('status') not in ATTENDANCE_STATUSES:
+                return jsonify({'success': False, 'error': 'Status inválido'}), 400
+            latest[student_id] = (change['status'], workstation_id)
+        
+        current = {student_id: (status, check_in_time) for student_id, status, check_in_time in db.session.query(
+            AttendanceRecord.student_id, AttendanceRecord.status, AttendanceRecord.check_in_time).filter(
+            AttendanceRecord.attendance_session_id == session_id,
+            AttendanceRecord.student_id.in_(list(latest)))}
+        missing = sorted(set(latest) - set(current))
+        if missing:
+            return jsonify({'success': False, 'error': 'Registro não encontrado', 'student_ids': missing}), 404
+        
+        cursor = bump_attendance_version(session_id)
+        now = datetime.utcnow()
+        for status in ATTENDANCE_STATUSES:
+            students = {student_id: ws for student_id, (change_status, ws) in latest.items() if change_status == status}
+            if not students:
+                continue
+            values = {
+                AttendanceRecord.status: status,
+                AttendanceRecord.workstation_id: case(students, value=AttendanceRecord.student_id,
+                                                      else_=AttendanceRecord.workstation_id),
+                AttendanceRecord.updated_at: now,
+                AttendanceRecord.version: cursor,
+            }
+            if status == 'present':
+                values[AttendanceRecord.check_in_time] = db.func.coalesce(AttendanceRecord.check_in_time, now)
+            elif status == 'absent':
+                values[AttendanceRecord.check_in_time] = None
+                values[AttendanceRecord.check_out_time] = None
+            AttendanceRecord.query.filter(
+                AttendanceRecord.attendance_session_id == session_id,
+                AttendanceRecord.student_id.in_(list(students))
+            ).update(values, synchronize_session=False)
+        
+        stats = StatChanges()
+        for student_id, (status, _) in latest.items():
+            old_status, check_in_time = current[student_id]
+            stats.status_changed(student_id, session.class_group_id, session.session_date,
+                                 old_status, status, (check_in_time or now) if status == 'present' else None)
+        stats.apply()
+        db.session.commit()
+        
+        records = [r.to_dict() for r in attendance_changes(session_id, cursor - 1)]
+        publish_attendance_change(session, cursor)
+        
+        return jsonify({
+            'success': True,
+            'message': f'{len(latest)} presença(s) atualizada(s)',
+            'cursor': cursor,
+            'records': records
+        })
+        
+    except Exception as e:
+        db.session.rollback()
+        import logging
+        logging.error(f"Error bulk updating attendance: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+def bump_attendance_version(session_id):
+    """Next change version of a session; the row stays locked until the caller commits"""
+    db.session.query(AttendanceSession).filter_by(id=session_id).update(
+        {AttendanceSession.version: db.func.coalesce(AttendanceSession.version, 0) + 1},
+        synchronize_session=False)
+    return db.session.query(AttendanceSession.version).filter_by(id=session_id).scalar()
+
+def attendance_changes(session_id, since=None):
+    """Records of a session changed after the since cursor (all records without one)"""
+    from sqlalchemy.orm import joinedload
+    
+    query = AttendanceRecord.query.filter_by(attendance_session_id=session_id).options(
+        joinedload(AttendanceRecord.student), joinedload(AttendanceRecord.workstation))
+    if since is not None:
+        query = query.filter(AttendanceRecord.version > since)
+    return query.all()
+
+def publish_attendance_change(session, cursor):
+    """
+    Announce a committed change to the session and classroom event streams.
+    Only the new cursor is sent (pg_notify payloads are limited to 8000 bytes);
+    clients fetch the records with /status?since=<their cursor>.
+    """
+    message = {'session_id': session.id, 'cursor': cursor}
+    publish(f'attendance:{session.id}', message)
+    publish(f'classroom:{session.classroom_id}', message)
+
 @app.route('/api/attendance/<int:session_id>/status')
+@require_teacher_or_admin
 def get_attendance_status(session_id):
-    """Get current attendance status (for real-time updates)"""
-    from models import AttendanceSession, AttendanceRecord
+    """
+    Current attendance status (for real-time updates).
+
+    With ?since=<cursor> only records changed after that cursor are returned,
+    together with the new cursor; an unchanged session answers 304 to a
+    matching If-None-Match and an empty record list otherwise.
+    """
+    from models import AttendanceSession
     
-    session = AttendanceSession.query.get_or_404(session_id)
-    records = AttendanceRecord.query.filter_by(attendance_session_id=session_id).all()
+    row = db.session.query(AttendanceSession.version).filter_by(id=session_id).first()
+    if row is None:
+        return jsonify({'success': False, 'error': 'Sessão não encontrada'}), 404
+    version = row.version or 0
+    
+    since = request.args.get('since', type=int)
+    if since is not None and since > version:
+        since = None  # Cursor from another database state: send a full snapshot
+    etag = f'attendance-{session_id}-{version}'
+    if since is not None and request.if_none_match.contains(etag):
+        response = make_response('', 304)
+        response.set_etag(etag)
+        return response
     
-    return jsonify({
-        'success': True,
-        'session': session.to_dict(),
-        'records': [r.to_dict() for r in records]
-    })
+    if since is not None:
+        records = attendance_changes(session_id, since) if version > since else []
+        payload = {'success': True, 'cursor': version, 'records': [r.to_dict() for r in records]}
+    else:
+        session = AttendanceSession.query.get(session_id)
+        payload = {'success': True, 'cursor': version, 'session': session.to_dict(),
+                   'records': [r.to_dict() for r in attendance_changes(session_id)]}
+    
+    response = jsonify(payload)
+    if since is not None:
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+    return response
 
-@app.route('/attendance/<int:session_id>/export')
+# Server-Sent Events: one long-lived connection per page instead of polling
+SSE_KEEPALIVE_SECONDS = 15
+# Streams end after this long; EventSource reconnects (with Last-Event-ID) and frees the thread meanwhile
+SSE_MAX_SECONDS = int(os.environ.get("SSE_MAX_SECONDS", "300"))
+# Each open stream holds one gunicorn thread; keep this well below --threads so
+# ordinary requests are still served. Pages past the limit poll instead.
+SSE_MAX_STREAMS = int(os.environ.get("SSE_MAX_STREAMS", "8"))
+
+_sse_slots = threading.BoundedSemaphore(SSE_MAX_STREAMS)
+
+def streams_exhausted_response():
+    response = jsonify({'success': False, 'error': 'Muitas conexões abertas, tente novamente'})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(SSE_KEEPALIVE_SECONDS)
+    return response
+
+def event_stream(subscription, event_name, first_frames=()):
+    """
+    text/event-stream response relaying a subscription until SSE_MAX_SECONDS.
+    The caller holds one of the _sse_slots; it is released when the stream closes.
+    """
+    def generate():
+        yield 'retry: 3000\n\n'
+        yield from first_frames
+        deadline = time.monotonic() + SSE_MAX_SECONDS
+        while time.monotonic() < deadline:
+            message = subscription.get(timeout=SSE_KEEPALIVE_SECONDS)
+            if message is None:
+                yield ': keepalive\n\n'
+            elif message is RESYNC:
+                yield sse_event({}, event='resync')
+            else:
+                yield sse_event(message, event=event_name, event_id=message.get('cursor'))
+    
+    response = Response(generate(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    
+    def close():
+        subscription.close()
+        _sse_slots.release()
+    response.call_on_close(close)
+    return response
+
+@app.route('/api/attendance/<int:session_id>/events')
 @require_teacher_or_admin
-def export_attendance(session_id):
-    """Export attendance report to Excel"""
+def attendance_events(session_id):
+    """Attendance record changes of one session as Server-Sent Events"""
+    row = db.session.query(AttendanceSession.version).filter_by(id=session_id).first()
+    if row is None:
+        return jsonify({'success': False, 'error': 'Sessão não encontrada'}), 404
+    if not _sse_slots.acquire(blocking=False):
+        return streams_exhausted_response()
+    
+    try:
+        # Subscribe before reading the catch-up so no change falls in between
+        subscription = subscribe(f'attendance:{session_id}')
+        first_frames = []
+        since = request.headers.get('Last-Event-ID', type=int)
+        if since is None:
+            since = request.args.get('since', type=int)
+        version = db.session.query(AttendanceSession.version).filter_by(id=session_id).scalar() or 0
+        if since is not None and since != version:
+            records = attendance_changes(session_id, since if since < version else None)
+            first_frames.append(sse_event({'cursor': version, 'records': [r.to_dict() for r in records]},
+                                          event='attendance', event_id=version))
+    except Exception:
+        _sse_slots.release()
+        raise
+    return event_stream(subscription, 'attendance', first_frames)
+
+@app.route('/api/classroom/<int:classroom_id>/events')
+@require_teacher_or_admin
+def classroom_events(classroom_id):
+    """Attendance changes of every session in a classroom, for the layout view"""
+    Classroom.query.get_or_404(classroom_id)
+    if not _sse_slots.acquire(blocking=False):
+        return streams_exhausted_response()
+    return event_stream(subscribe(f'classroom:{classroom_id}'), 'attendance')
+
+@report_job('attendance_export')
+def build_attendance_export(params, output):
+    """Attendance sheet of one session as Excel"""
     from models import AttendanceSession, AttendanceRecord
     from openpyxl import Workbook
     from openpyxl.styles import Font, PatternFill, Alignment
     
+    session_id = params['session_id']
     session = AttendanceSession.query.get_or_404(session_id)
     records = AttendanceRecord.query.filter_by(attendance_session_id=session_id).order_by(AttendanceRecord.student_id).all()
     
@@ -4879,18 +4775,19 @@ def export_attendance(session_id):
     for col in range(1, 8):
         ws.column_dimensions[chr(64 + col)].width = 18
     
-    output = io.BytesIO()
     wb.save(output)
-    output.seek(0)
     
     filename = f"relatorio_presenca_{session.class_group.name}_{session.session_date.strftime('%Y%m%d')}.xlsx"
-    
-    return send_file(
-        output,
-        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-        as_attachment=True,
-        download_name=filename
-    )
+    return ReportArtifact(filename, XLSX_MIMETYPE)
+
+@app.route('/attendance/<int:session_id>/export')
+@require_teacher_or_admin
+def export_attendance(session_id):
+    """Export attendance report to Excel"""
+    AttendanceSession.query.get_or_404(session_id)
+    if wants_report_job():
+        return enqueue_report_response('attendance_export', {'session_id': session_id})
+    return send_report(build_attendance_export, {'session_id': session_id})
 
 @app.route('/classroom/<int:classroom_id>/attendance/reports')
 @require_teacher_or_admin
@@ -4905,6 +4802,7 @@ def attendance_reports(classroom_id):
     group_id = request.args.get('group_id', type=int)
     
     query = AttendanceSession.query.filter_by(classroom_id=classroom_id)
+    start_date_obj = end_date_obj = None
     
     if start_date:
         try:
@@ -4923,11 +4821,79 @@ def attendance_reports(classroom_id):
     if group_id:
         query = query.filter_by(class_group_id=group_id)
     
-    sessions = query.order_by(AttendanceSession.session_date.desc()).all()
+    page = paginate_keyset(query.options(db.joinedload(AttendanceSession.class_group)),
+                           (AttendanceSession.session_date, AttendanceSession.id),
+                           after=request.args.get('after'), before=request.args.get('before'),
+                           per_page=page_size(request.args.get('per_page')))
     class_groups = ClassGroup.query.filter_by(classroom_id=classroom_id).all()
     
+    # Present/absent counts: per session for this page, and totals for the whole filtered period
+    session_stats = attendance_status_counts(
+        AttendanceRecord.attendance_session_id.in_([s.id for s in page.items]), group_by_session=True
+    ) if page.items else {}
+    # Period totals come from the monthly attendance_stat rows (raw records only for partial months)
+    period_groups = [group.id for group in class_groups if not group_id or group.id == group_id]
+    period_stats = period_totals(period_groups, start_date_obj, end_date_obj)
+    period_stats['sessions'] = query.with_entities(AttendanceSession.id).order_by(None).count()
+    
     return render_template('attendance_reports.html',
                          classroom=classroom,
-                         sessions=sessions,
+                         sessions=page.items,
+                         page=page,
+                         session_stats=session_stats,
+                         period_stats=period_stats,
                          class_groups=class_groups,
-                         filters={'start_date': start_date, 'end_date': end_date, 'group_id': group_id})
\ No newline at end of file
+                         filters={'start_date': start_date, 'end_date': end_date, 'group_id': group_id})
+
+@app.route('/api/classroom/<int:classroom_id>/attendance_stats')
+@require_teacher_or_admin
+def api_attendance_stats(classroom_id):
+    """Attendance totals per student over a month range (?start=YYYY-MM&end=YYYY-MM&group_id=)"""
+    Classroom.query.get_or_404(classroom_id)
+    
+    months = {}
+    for param in ('start', 'end'):
+        value = request.args.get(param)
+        if value:
+            try:
+                months[param] = datetime.strptime(value, '%Y-%m').date()
+            except ValueError:
+                return jsonify({'success': False, 'error': f'Mês inválido: {value} (use AAAA-MM)'}), 400
+    
+    groups = ClassGroup.query.with_entities(ClassGroup.id, ClassGroup.name).filter_by(classroom_id=classroom_id)
+    group_id = request.args.get('group_id', type=int)
+    if group_id:
+        groups = groups.filter_by(id=group_id)
+    group_names = dict(groups.all())
+    
+    students = student_stats(group_names, months.get('start'), months.get('end')) if group_names else []
+    totals = {}
+    for row in students:
+        row['class_group_name'] = group_names[row['class_group_id']]
+        group_totals = totals.setdefault(row['class_group_id'], {
+            'class_group_id': row['class_group_id'], 'class_group_name': row['class_group_name'],
+            'students': 0, 'sessions': 0, 'presents': 0, 'absences': 0})
+        group_totals['students'] += 1
+        for key in ('sessions', 'presents', 'absences'):
+            group_totals[key] += row[key]
+    for group_totals in totals.values():
+        group_totals['attendance_rate'] = (round(100.0 * group_totals['presents'] / group_totals['sessions'], 1)
+                                           if group_totals['sessions'] else None)
+    
+    return jsonify({'success': True, 'groups': list(totals.values()), 'students': students})
+
+def attendance_status_counts(condition, group_by_session=False):
+    """Total/present/absent record counts matching condition, optionally per attendance session"""
+    columns = [
+        db.func.count(AttendanceRecord.id),
+        db.func.sum(db.case((AttendanceRecord.status == 'present', 1), else_=0)),
+        db.func.sum(db.case((AttendanceRecord.status == 'absent', 1), else_=0)),
+    ]
+    if group_by_session:
+        rows = db.session.query(AttendanceRecord.attendance_session_id, *columns).filter(condition).group_by(
+            AttendanceRecord.attendance_session_id
+        ).all()
+        return {session_id: {'total': total, 'present': present or 0, 'absent': absent or 0}
+                for session_id, total, present, absent in rows}
+    total, present, absent = db.session.query(*columns).filter(condition).one()
+    return {'total': total, 'present': present or 0, 'absent': absent or 0}
\ No newline at end of file
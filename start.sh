@@ -1,2 +1,5 @@
 #!/bin/bash
-uv run gunicorn --bind 0.0.0.0:5000 --reuse-port --reload main:app
+# Apply pending schema migrations once, so workers only read the schema version at boot
+# Threaded workers: attendance/layout pages keep a Server-Sent Events stream open.
+# Each stream holds a thread; SSE_MAX_STREAMS (default 8) per worker leaves the rest for requests
+uv run flask --app main migrate-db && AUTO_MIGRATE=0 uv run gunicorn --bind 0.0.0.0:5000 --reuse-port --reload --worker-class gthread --threads 16 main:app
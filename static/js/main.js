@@ -15,6 +15,9 @@ document.addEventListener('DOMContentLoaded', function() {
     
     // Initialize auto-save features
     initializeAutoSave();
+    
+    // Initialize background report downloads
+    initializeReportJobs();
 });
 
 // Initialize Bootstrap tooltips
@@ -125,6 +128,81 @@ function initializeLoadingStates() {
     });
 }
 
+// Background report jobs: links marked with data-report-job are rendered by the
+// server's job queue; poll the job and start the download once it is ready
+const REPORT_JOB_POLL_INTERVAL = 1500;
+
+function initializeReportJobs() {
+    document.querySelectorAll('a[data-report-job]').forEach(link => {
+        link.addEventListener('click', function(e) {
+            if (e.ctrlKey || e.metaKey || e.shiftKey) {
+                return;
+            }
+            e.preventDefault();
+            if (link.dataset.reportJobRunning) {
+                return;
+            }
+            startReportJob(link);
+        });
+    });
+}
+
+function startReportJob(link) {
+    const url = new URL(link.href, window.location.href);
+    url.searchParams.set('async', '1');
+    
+    link.dataset.reportJobRunning = '1';
+    link.classList.add('loading', 'disabled');
+    showNotification('Gerando relatório... o download começará automaticamente.', 'info', 4000);
+    
+    const finish = () => {
+        delete link.dataset.reportJobRunning;
+        link.classList.remove('loading', 'disabled');
+    };
+    
+    fetch(url, {headers: {'Accept': 'application/json'}, credentials: 'same-origin'})
+        .then(response => {
+            const contentType = response.headers.get('Content-Type') || '';
+            if (response.status !== 202 || !contentType.includes('application/json')) {
+                throw new Error('report job not accepted');
+            }
+            return response.json();
+        })
+        .then(job => pollReportJob(job, finish))
+        .catch(() => {
+            // Fall back to the synchronous download (also the answer for anonymous users)
+            finish();
+            window.location.href = link.href;
+        });
+}
+
+function pollReportJob(job, finish) {
+    if (job.status === 'done' && job.download_url) {
+        finish();
+        window.location.href = job.download_url;
+        return;
+    }
+    if (job.status === 'failed') {
+        finish();
+        showNotification(`Erro ao gerar relatório: ${job.error || 'erro desconhecido'}`, 'danger');
+        return;
+    }
+    setTimeout(() => {
+        fetch(job.status_url, {headers: {'Accept': 'application/json'}, credentials: 'same-origin', cache: 'no-store'})
+            .then(response => response.json().then(data => ({ok: response.ok, data})))
+            .then(({ok, data}) => {
+                if (!ok) {
+                    throw new Error(data.error);
+                }
+                pollReportJob(data, finish);
+            })
+            .catch(error => {
+                finish();
+                showNotification(error.message || 'Relatório não encontrado ou expirado', 'danger');
+            });
+    }, REPORT_JOB_POLL_INTERVAL);
+}
+
 // Confirmation dialogs
 function initializeConfirmationDialogs() {
     const confirmLinks = document.querySelectorAll('[data-confirm]');
@@ -1,5 +1,8 @@
 // Service Worker para PWA
 const CACHE_NAME = 'senai-salas-v1';
+// Classroom images with a content-hash version (?v=) never change, so they are cached at runtime
+const IMAGE_CACHE_NAME = 'senai-salas-images-v1';
+const IMAGE_CACHE_MAX_ENTRIES = 100;
 const urlsToCache = [
   '/',
   '/static/manifest.json',
@@ -21,8 +24,50 @@ self.addEventListener('install', function(event) {
   );
 });
 
+function isVersionedImage(request) {
+  if (request.method !== 'GET') {
+    return false;
+  }
+  var url = new URL(request.url);
+  return url.origin === self.location.origin &&
+    url.pathname.indexOf('/image/') === 0 &&
+    url.searchParams.has('v');
+}
+
+function trimImageCache(cache) {
+  return cache.keys().then(function(keys) {
+    if (keys.length > IMAGE_CACHE_MAX_ENTRIES) {
+      return cache.delete(keys[0]).then(function() {
+        return trimImageCache(cache);
+      });
+    }
+  });
+}
+
+function cachedImage(request) {
+  return caches.open(IMAGE_CACHE_NAME).then(function(cache) {
+    return cache.match(request).then(function(response) {
+      if (response) {
+        return response;
+      }
+      return fetch(request).then(function(networkResponse) {
+        if (networkResponse.ok) {
+          cache.put(request, networkResponse.clone()).then(function() {
+            return trimImageCache(cache);
+          });
+        }
+        return networkResponse;
+      });
+    });
+  });
+}
+
 // Fetch event
 self.addEventListener('fetch', function(event) {
+  if (isVersionedImage(event.request)) {
+    event.respondWith(cachedImage(event.request));
+    return;
+  }
   event.respondWith(
     caches.match(event.request)
       .then(function(response) {
@@ -42,7 +87,7 @@ self.addEventListener('activate', function(event) {
     caches.keys().then(function(cacheNames) {
       return Promise.all(
         cacheNames.map(function(cacheName) {
-          if (cacheName !== CACHE_NAME) {
+          if (cacheName !== CACHE_NAME && cacheName !== IMAGE_CACHE_NAME) {
             console.log('Deleting old cache:', cacheName);
             return caches.delete(cacheName);
           }
@@ -0,0 +1,141 @@
+import os
+import sys
+import tempfile
+from datetime import date
+
+_db_dir = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_db_dir, 'test.db')}"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from app import app, db
+import routes  # noqa: F401  (registers the views)
+from models import AttendanceRecord, AttendanceSession, ClassGroup, Classroom, Student
+
+
+@pytest.fixture
+def sessions():
+    """Two sessions of different groups: (session id, its student ids) for each"""
+    with app.app_context():
+        classroom = Classroom(name='Sala Chamada', capacity=20, block='B')
+        db.session.add(classroom)
+        db.session.flush()
+        result = []
+        for group_name, names in (('Turma A', ('Ana', 'Bruno', 'Carla')), ('Turma B', ('Diego',))):
+            group = ClassGroup(classroom_id=classroom.id, name=group_name)
+            db.session.add(group)
+            db.session.flush()
+            students = [Student(group.id, name) for name in names]
+            db.session.add_all(students)
+            session = AttendanceSession(classroom.id, group.id, date(2024, 5, 6))
+            db.session.add(session)
+            db.session.flush()
+            db.session.add_all([AttendanceRecord(session.id, student.id) for student in students])
+            result.append((session.id, [student.id for student in students]))
+        db.session.commit()
+    return result
+
+
+@pytest.fixture
+def client():
+    app.config['WTF_CSRF_ENABLED'] = False
+    client = app.test_client()
+    client.post('/login', data={'username': 'admin', 'password': 'senai103103'})
+    return client
+
+
+def _status(client, session_id, since=None, **kwargs):
+    url = f'/api/attendance/{session_id}/status'
+    if since is not None:
+        url += f'?since={since}'
+    return client.get(url, **kwargs)
+
+
+def _mark(client, session_id, student_id, status):
+    response = client.post(f'/api/attendance/{session_id}/update',
+                           json={'student_id': student_id, 'status': status})
+    assert response.status_code == 200
+    return response
+
+
+def test_since_cursor_returns_only_records_with_a_higher_version(client, sessions):
+    (session_id, (ana, bruno, carla)), _ = sessions
+    snapshot = _status(client, session_id).get_json()
+    assert {record['student_id'] for record in snapshot['records']} == {ana, bruno, carla}
+    start = snapshot['cursor']
+
+    _mark(client, session_id, ana, 'present')
+    after_ana = _status(client, session_id, start).get_json()['cursor']
+    _mark(client, session_id, carla, 'present')
+
+    changes = _status(client, session_id, start).get_json()
+    assert changes['cursor'] == after_ana + 1
+    assert sorted(record['student_id'] for record in changes['records']) == sorted([ana, carla])
+    assert 'session' not in changes
+
+    latest = _status(client, session_id, after_ana).get_json()
+    assert [(record['student_id'], record['status']) for record in latest['records']] == [(carla, 'present')]
+
+    current = _status(client, session_id, latest['cursor'])
+    assert current.get_json()['records'] == []
+    assert _status(client, session_id, latest['cursor'],
+                   headers={'If-None-Match': current.headers['ETag']}).status_code == 304
+
+
+def test_since_cursor_ahead_of_the_session_gets_a_full_snapshot(client, sessions):
+    (session_id, students), _ = sessions
+    _mark(client, session_id, students[0], 'present')
+    payload = _status(client, session_id, 999).get_json()
+    assert 'session' in payload
+    assert {record['student_id'] for record in payload['records']} == set(students)
+
+
+def _bulk(client, session_id, changes):
+    return client.post(f'/api/attendance/{session_id}/bulk', json={'changes': changes})
+
+
+def _session_state(session_id):
+    with app.app_context():
+        version = db.session.get(AttendanceSession, session_id).version
+        statuses = dict(db.session.query(AttendanceRecord.student_id, AttendanceRecord.status).filter_by(
+            attendance_session_id=session_id))
+    return version, statuses
+
+
+def test_bulk_rejects_students_of_another_session_without_applying_any_change(client, sessions):
+    (session_id, (ana, bruno, _)), (_, (diego,)) = sessions
+    before = _session_state(session_id)
+
+    response = _bulk(client, session_id, [
+        {'student_id': ana, 'status': 'present'},
+        {'student_id': diego, 'status': 'present'},
+        {'student_id': bruno, 'status': 'present'},
+    ])
+    assert response.status_code == 404
+    assert response.get_json()['student_ids'] == [diego]
+    assert _session_state(session_id) == before
+
+
+def test_bulk_rejects_an_unknown_session(client, sessions):
+    (session_id, (ana, _, _)), _ = sessions
+    response = _bulk(client, session_id + 1000, [{'student_id': ana, 'status': 'present'}])
+    assert response.status_code == 404
+    assert _session_state(session_id)[1][ana] == 'absent'
+
+
+def test_bulk_applies_own_students_under_one_cursor(client, sessions):
+    (session_id, (ana, bruno, carla)), (other_id, (diego,)) = sessions
+    other_before = _session_state(other_id)
+
+    response = _bulk(client, session_id, [
+        {'student_id': ana, 'status': 'present'},
+        {'student_id': bruno, 'status': 'present'},
+    ])
+    payload = response.get_json()
+    assert response.status_code == 200
+    assert sorted(record['student_id'] for record in payload['records']) == sorted([ana, bruno])
+    version, statuses = _session_state(session_id)
+    assert payload['cursor'] == version
+    assert statuses == {ana: 'present', bruno: 'present', carla: 'absent'}
+    assert _session_state(other_id) == other_before
@@ -0,0 +1,54 @@
+import io
+import os
+import sys
+import tempfile
+
+_db_dir = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_db_dir, 'test.db')}"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image
+
+from app import app, db
+import routes  # noqa: F401  (registers the views)
+from models import Classroom, ClassroomImageVariant
+
+
+def _png(color):
+    buffer = io.BytesIO()
+    Image.new('RGB', (1200, 800), color).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def _upload(client, classroom_id, color):
+    return client.post(f'/edit_classroom/{classroom_id}', data={
+        'name': 'Sala Teste',
+        'capacity': '20',
+        'image': (io.BytesIO(_png(color)), 'foto.png'),
+    }, content_type='multipart/form-data')
+
+
+def test_replacing_classroom_photo_replaces_variants():
+    app.config['WTF_CSRF_ENABLED'] = False
+    client = app.test_client()
+    client.post('/login', data={'username': 'admin', 'password': 'senai103103'})
+
+    with app.app_context():
+        classroom = Classroom(name='Sala Teste', capacity=20)
+        db.session.add(classroom)
+        db.session.commit()
+        classroom_id = classroom.id
+
+    _upload(client, classroom_id, 'red')
+    with app.app_context():
+        first_hash = db.session.get(Classroom, classroom_id).image_hash
+        first_count = ClassroomImageVariant.query.filter_by(classroom_id=classroom_id).count()
+    assert first_count > 0
+
+    _upload(client, classroom_id, 'blue')
+    with app.app_context():
+        classroom = db.session.get(Classroom, classroom_id)
+        variants = ClassroomImageVariant.query.filter_by(classroom_id=classroom_id).all()
+        assert classroom.image_hash != first_hash
+        assert len(variants) == first_count
+        assert {variant.source_hash for variant in variants} == {classroom.image_hash}
@@ -0,0 +1,105 @@
+import base64
+import json
+import os
+import sys
+import tempfile
+from datetime import datetime
+
+_db_dir = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_db_dir, 'test.db')}"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from app import app, db
+import routes  # noqa: F401  (registers the views)
+from models import Classroom, Incident
+from pagination import encode_cursor, paginate_keyset
+
+KEY = (Incident.created_at, Incident.id)
+TIE = datetime(2024, 3, 1, 8, 0)
+
+
+@pytest.fixture
+def classroom_id():
+    """A classroom with seven incidents, the five oldest sharing one created_at"""
+    with app.app_context():
+        classroom = Classroom(name='Sala Paginação', capacity=10, block='A')
+        db.session.add(classroom)
+        db.session.flush()
+        for index in range(7):
+            incident = Incident(classroom.id, 'Fulano', 'fulano@senai.br', f'Ocorrência {index}')
+            incident.created_at = TIE if index < 5 else datetime(2024, 3, 2, 8, index)
+            db.session.add(incident)
+        db.session.commit()
+        yield classroom.id
+
+
+def _query(classroom_id):
+    return Incident.query.filter_by(classroom_id=classroom_id)
+
+
+def _expected(classroom_id):
+    return [incident.id for incident in
+            _query(classroom_id).order_by(Incident.created_at.desc(), Incident.id.desc())]
+
+
+def _walk_forward(classroom_id, per_page):
+    pages = [paginate_keyset(_query(classroom_id), KEY, per_page=per_page)]
+    while pages[-1].has_next:
+        pages.append(paginate_keyset(_query(classroom_id), KEY, after=pages[-1].next_cursor, per_page=per_page))
+    return pages
+
+
+def test_pages_split_ties_on_the_sort_key_without_gaps_or_repeats(classroom_id):
+    pages = _walk_forward(classroom_id, per_page=2)
+    ids = [incident.id for page in pages for incident in page]
+    assert ids == _expected(classroom_id)
+    assert [len(page) for page in pages] == [2, 2, 2, 1]
+
+
+def test_last_page_has_no_next_cursor(classroom_id):
+    pages = _walk_forward(classroom_id, per_page=3)
+    last = pages[-1]
+    assert not last.has_next and last.has_prev
+    assert [incident.id for incident in last] == _expected(classroom_id)[-1:]
+
+    # An exact fit still ends there: no empty trailing page
+    exact = _walk_forward(classroom_id, per_page=7)
+    assert len(exact) == 1 and not exact[0].has_next and not exact[0].has_prev
+
+
+def test_before_cursor_walks_back_through_ties(classroom_id):
+    pages = _walk_forward(classroom_id, per_page=2)
+    page = pages[-1]
+    back = []
+    while page.has_prev:
+        page = paginate_keyset(_query(classroom_id), KEY, before=page.prev_cursor, per_page=2)
+        back.append([incident.id for incident in page])
+    assert back == [[incident.id for incident in page] for page in reversed(pages[:-1])]
+    assert not page.has_prev and page.has_next
+
+
+@pytest.mark.parametrize('cursor', [
+    'not-a-cursor!',
+    base64.urlsafe_b64encode(b'{"broken": ').decode(),
+    encode_cursor([TIE.isoformat()])[:-3],
+    encode_cursor([1, 2, 3]),
+    base64.urlsafe_b64encode(json.dumps([{'x': 1}, 5]).encode()).decode(),
+    base64.urlsafe_b64encode(json.dumps([{'dt': 'yesterday'}, 5]).encode()).decode(),
+])
+def test_invalid_cursor_falls_back_to_the_first_page(classroom_id, cursor):
+    first = paginate_keyset(_query(classroom_id), KEY, per_page=3)
+    for page in (paginate_keyset(_query(classroom_id), KEY, after=cursor, per_page=3),
+                 paginate_keyset(_query(classroom_id), KEY, before=cursor, per_page=3)):
+        assert [incident.id for incident in page] == [incident.id for incident in first]
+        assert not page.has_prev
+
+
+def test_listing_view_ignores_a_tampered_cursor(classroom_id):
+    app.config['WTF_CSRF_ENABLED'] = False
+    client = app.test_client()
+    client.post('/login', data={'username': 'admin', 'password': 'senai103103'})
+    response = client.get('/incidents_management?after=%%%tampered&per_page=2')
+    assert response.status_code == 200
+    assert 'Painel de Ocorrências' in response.get_data(as_text=True)
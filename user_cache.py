@@ -0,0 +1,93 @@
+"""
+Session user cache for the Flask-Login user_loader.
+
+Every authenticated request (including the attendance polling calls) used to
+load the User row. The loader now serves an immutable snapshot of the fields
+the views and templates read, kept in a small LRU for USER_CACHE_TTL seconds
+(default 30). Routes that change a user call invalidate_user() after the
+commit; the TTL bounds how long another gunicorn worker can serve a snapshot
+taken before the change.
+
+Code that writes to the user or needs the ORM relationship goes through
+current_user.record, which loads the row on first use in the request.
+"""
+import os
+
+from flask_login import UserMixin
+
+from app import db
+from data_cache import VersionedCache, snapshot
+from models import User
+
+USER_CACHE_TTL = int(os.environ.get("USER_CACHE_TTL", "30"))
+USER_CACHE_SIZE = int(os.environ.get("USER_CACHE_SIZE", "1024"))
+
+USER_FIELDS = ('id', 'username', 'name', 'email', 'role', 'is_active', 'first_login')
+
+# Single version: entries only go stale through invalidate_user() or the TTL
+_VERSION = 0
+
+user_cache = VersionedCache(max_entries=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+
+
+class CachedUser(UserMixin):
+    """Per-request current_user built from a cached snapshot of the User row"""
+
+    def __init__(self, row):
+        self._row = row
+        self._record = None
+
+    id = property(lambda self: self._row.id)
+    username = property(lambda self: self._row.username)
+    name = property(lambda self: self._row.name)
+    email = property(lambda self: self._row.email)
+    role = property(lambda self: self._row.role)
+    first_login = property(lambda self: self._row.first_login)
+
+    @property
+    def is_active(self):
+        return bool(self._row.is_active)
+
+    @property
+    def record(self):
+        """The User row, loaded once per request when it is actually needed"""
+        if self._record is None:
+            self._record = db.session.get(User, self._row.id)
+        return self._record
+
+    def is_admin(self):
+        return self.role == 'admin'
+
+    def is_teacher(self):
+        return self.role == 'teacher'
+
+    def get_id(self):
+        return str(self._row.id)
+
+    def __repr__(self):
+        return f'<CachedUser {self.username}>'
+
+
+def _load_row(user_id):
+    user = db.session.get(User, user_id)
+    return snapshot(user, USER_FIELDS) if user is not None else None
+
+
+def load_cached_user(user_id):
+    """CachedUser for the id stored in the session, or None for unknown users"""
+    try:
+        user_id = int(user_id)
+    except (TypeError, ValueError):
+        return None
+    row = user_cache.get(user_id, _VERSION)
+    if row is None:
+        row = _load_row(user_id)
+        if row is None:
+            return None
+        user_cache.set(user_id, _VERSION, row)
+    return CachedUser(row)
+
+
+def invalidate_user(user_id=None):
+    """Drop the cached snapshot of one user (or all users) after a committed change"""
+    user_cache.invalidate(user_id)
@@ -0,0 +1,233 @@
+"""
+Streaming XLSX writer for the Excel exports.
+
+Rows are serialized straight to SpreadsheetML and spooled to a temporary file
+per sheet (in memory while small, on disk beyond SPOOL_MAX_SIZE), keeping only
+the running maximum text length of each column. Column widths go in <cols>,
+ahead of the rows, so the sheet XML is assembled once all rows are known; the
+zip container is then produced chunk by chunk for a streamed response. Memory
+use does not grow with the number of rows.
+
+Only the standard library is needed; openpyxl is not involved.
+"""
+import re
+import tempfile
+import zipfile
+from xml.sax.saxutils import escape
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+SPOOL_MAX_SIZE = 1024 * 1024
+COPY_CHUNK_SIZE = 64 * 1024
+MAX_COLUMN_WIDTH = 50
+
+# Control characters are not allowed in XML 1.0 (openpyxl rejects them as well)
+_ILLEGAL_CHARACTERS = re.compile(r'[\000-\010\013\014\016-\037]')
+
+# Style index 1 in styles.xml: bold white text on blue, centered (the header row)
+HEADER_STYLE = 1
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+    '{sheets}'
+    '</Types>'
+)
+_SHEET_CONTENT_TYPE = (
+    '<Override PartName="/xl/worksheets/sheet{index}.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+)
+_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets>{sheets}</sheets></workbook>'
+)
+_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '{sheets}'
+    '<Relationship Id="rId{styles_id}" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>'
+    '</Relationships>'
+)
+_STYLES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<fonts count="2">'
+    '<font><sz val="11"/><name val="Calibri"/></font>'
+    '<font><b/><sz val="11"/><color rgb="FFFFFFFF"/><name val="Calibri"/></font>'
+    '</fonts>'
+    '<fills count="3">'
+    '<fill><patternFill patternType="none"/></fill>'
+    '<fill><patternFill patternType="gray125"/></fill>'
+    '<fill><patternFill patternType="solid"><fgColor rgb="FF366092"/><bgColor rgb="FF366092"/></patternFill></fill>'
+    '</fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="2">'
+    '<xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="0" fontId="1" fillId="2" borderId="0" xfId="0" applyFont="1" applyFill="1" applyAlignment="1">'
+    '<alignment horizontal="center"/></xf>'
+    '</cellXfs>'
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    '</styleSheet>'
+)
+_SHEET_HEAD = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+)
+
+
+def column_letter(index):
+    """Spreadsheet column name for a 1-based index (1 -> A, 27 -> AA)"""
+    letters = ''
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+def _text(value):
+    return escape(_ILLEGAL_CHARACTERS.sub('', str(value)))
+
+
+class SheetWriter:
+    """Append-only worksheet; rows are serialized as soon as they are added"""
+
+    def __init__(self, title):
+        self.title = title[:31]
+        self.row_count = 0
+        self.widths = []
+        self._letters = []
+        self._spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+
+    def append(self, values, style=None):
+        self.row_count += 1
+        row = self.row_count
+        style_attr = f' s="{style}"' if style else ''
+        cells = []
+        for col, value in enumerate(values):
+            if col >= len(self.widths):
+                self.widths.append(0)
+                self._letters.append(column_letter(col + 1))
+            if value is None or value == '':
+                continue
+            ref = f'{self._letters[col]}{row}'
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                cells.append(f'<c r="{ref}"{style_attr}><v>{value}</v></c>')
+            else:
+                cells.append(f'<c r="{ref}"{style_attr} t="inlineStr"><is><t xml:space="preserve">{_text(value)}</t></is></c>')
+            self.widths[col] = max(self.widths[col], len(str(value)))
+        self._spool.write(f'<row r="{row}">{"".join(cells)}</row>'.encode('utf-8'))
+
+    def append_header(self, headers):
+        self.append(headers, style=HEADER_STYLE)
+
+    def _head(self):
+        cols = ''.join(
+            f'<col min="{col}" max="{col}" width="{min(width + 2, MAX_COLUMN_WIDTH)}" customWidth="1"/>'
+            for col, width in enumerate(self.widths, 1)
+        )
+        return (_SHEET_HEAD + (f'<cols>{cols}</cols>' if cols else '') + '<sheetData>').encode('utf-8')
+
+    def xml_chunks(self):
+        """The complete sheet XML, read back from the spool in fixed-size chunks"""
+        yield self._head()
+        self._spool.seek(0)
+        while True:
+            chunk = self._spool.read(COPY_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+        yield b'</sheetData></worksheet>'
+
+    def close(self):
+        self._spool.close()
+
+
+class _ChunkSink:
+    """Write-only file object collecting the zip output between yields"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+class XlsxStreamWriter:
+    """
+    Workbook built from SheetWriters and emitted as a stream of bytes:
+
+        book = XlsxStreamWriter()
+        sheet = book.add_sheet('Salas', ['ID', 'Nome'])
+        sheet.append([1, 'Sala 1'])
+        return Response(book.stream(), mimetype=XLSX_MIMETYPE)
+    """
+
+    def __init__(self):
+        self.sheets = []
+
+    def add_sheet(self, title, headers=None):
+        sheet = SheetWriter(title)
+        if headers:
+            sheet.append_header(headers)
+        self.sheets.append(sheet)
+        return sheet
+
+    def _workbook_parts(self):
+        sheets = range(1, len(self.sheets) + 1)
+        yield '[Content_Types].xml', _CONTENT_TYPES.format(
+            sheets=''.join(_SHEET_CONTENT_TYPE.format(index=i) for i in sheets))
+        yield '_rels/.rels', _ROOT_RELS
+        yield 'xl/workbook.xml', _WORKBOOK.format(sheets=''.join(
+            f'<sheet name="{_text(sheet.title)}" sheetId="{i}" r:id="rId{i}"/>'
+            for i, sheet in zip(sheets, self.sheets)))
+        yield 'xl/_rels/workbook.xml.rels', _WORKBOOK_RELS.format(
+            styles_id=len(self.sheets) + 1,
+            sheets=''.join(
+                f'<Relationship Id="rId{i}" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet{i}.xml"/>'
+                for i in sheets))
+        yield 'xl/styles.xml', _STYLES
+
+    def stream(self):
+        """Generator of zip chunks; closes the spooled sheets when done"""
+        sink = _ChunkSink()
+        try:
+            with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+                for name, content in self._workbook_parts():
+                    archive.writestr(name, content)
+                yield sink.drain()
+                for index, sheet in enumerate(self.sheets, 1):
+                    with archive.open(f'xl/worksheets/sheet{index}.xml', 'w') as member:
+                        for chunk in sheet.xml_chunks():
+                            member.write(chunk)
+                            data = sink.drain()
+                            if data:
+                                yield data
+            yield sink.drain()
+        finally:
+            self.close()
+
+    def close(self):
+        for sheet in self.sheets:
+            sheet.close()